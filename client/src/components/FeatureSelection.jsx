@@ -356,29 +356,6 @@ export default function FeatureSelection() {
     }
   }
 
-  // Train model with specific features (skip_save=true for testing during feature selection)
-  const trainWithFeatures = async (features, skipSave = true) => {
-    const response = await fetch(`${ML_API_BASE}/train`, {
-      method: 'POST',
-      headers: { 'Content-Type': 'application/json' },
-      body: JSON.stringify({
-        data: data.data,
-        features: features,
-        target: 'target',
-        model_type: selectedModel,
-        test_size: 0.2,
-        skip_save: skipSave
-      })
-    })
-
-    if (!response.ok) {
-      const err = await response.json()
-      throw new Error(err.detail || 'Training failed')
-    }
-
-    return await response.json()
-  }
-
   // Run greedy forward feature selection
   const runFeatureSelection = async () => {
     if (!data?.data || data.data.length === 0) {
@@ -416,82 +393,82 @@ export default function FeatureSelection() {
     addLog(`📊 Model: ${AVAILABLE_MODELS.find(m => m.value === selectedModel)?.label}`, 'info')
 
     try {
-      for (let step = 0; step < featuresToTest.length; step++) {
-        if (isPaused) {
-          addLog('⏸️ Proses dijeda', 'warning')
-          break
-        }
+      // Server-side selection: data is preprocessed once and candidates are scored in parallel
+      const response = await fetch(`${ML_API_BASE}/feature-selection`, {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json' },
+        body: JSON.stringify({
+          data: data.data,
+          features: featuresToTest,
+          target: 'target',
+          model_type: selectedModel,
+          method: 'forward',
+          test_size: 0.2
+        })
+      })
 
-        setCurrentStep(step + 1)
-        addLog(`\n📍 Step ${step + 1}/${featuresToTest.length}: Mencari fitur terbaik berikutnya...`, 'step')
+      if (!response.ok) {
+        const err = await response.json()
+        throw new Error(err.detail || 'Feature selection failed')
+      }
 
-        let bestFeatureThisRound = null
-        let bestAccuracyThisRound = currentBest.accuracy
-        let bestMetricsThisRound = null
-        let bestModelIdThisRound = null
+      const reader = response.body.getReader()
+      const decoder = new TextDecoder()
+      let buffer = ''
 
-        // Try adding each remaining feature
-        for (const feature of remaining) {
-          const testFeatures = [...selected, feature]
-          
-          try {
-            addLog(`  Testing: +${feature} (total: ${testFeatures.length})`, 'test')
-            const result = await trainWithFeatures(testFeatures)
-            const accuracy = result.metrics.accuracy
-
-            if (accuracy > bestAccuracyThisRound) {
-              bestAccuracyThisRound = accuracy
-              bestFeatureThisRound = feature
-              bestMetricsThisRound = result.metrics
-              bestModelIdThisRound = result.model_id
-              addLog(`    ✨ Accuracy: ${(accuracy * 100).toFixed(2)}% (NEW BEST!)`, 'success')
-            } else {
-              addLog(`    📊 Accuracy: ${(accuracy * 100).toFixed(2)}%`, 'info')
-            }
-          } catch (err) {
-            addLog(`    ❌ Error: ${err.message}`, 'error')
-          }
-        }
+      const handleEvent = (event) => {
+        if (event.event === 'step') {
+          setCurrentStep(event.step)
+          addLog(`\n📍 Step ${event.step}/${featuresToTest.length}: ${event.candidates.length} kandidat diuji`, 'step')
 
-        if (bestFeatureThisRound) {
-          // Add the best feature
-          selected.push(bestFeatureThisRound)
-          remaining = remaining.filter(f => f !== bestFeatureThisRound)
-          
           const stepResult = {
-            step: step + 1,
-            addedFeature: bestFeatureThisRound,
-            features: [...selected],
-            accuracy: bestAccuracyThisRound,
-            metrics: bestMetricsThisRound,
-            modelId: bestModelIdThisRound,
-            improvement: bestAccuracyThisRound - currentBest.accuracy
+            step: event.step,
+            addedFeature: event.added,
+            features: [...event.features],
+            accuracy: event.score,
+            metrics: event.metrics,
+            modelId: null,
+            improvement: event.score - currentBest.accuracy
           }
-          
+
           results.push(stepResult)
+          selected = [...event.features]
+          remaining = remaining.filter(f => f !== event.added)
           setSelectionResults([...results])
           setCurrentFeatures([...selected])
           setRemainingFeatures([...remaining])
 
-          addLog(`\n✅ Step ${step + 1} selesai: Menambah "${bestFeatureThisRound}"`, 'success')
-          addLog(`   Akurasi: ${(bestAccuracyThisRound * 100).toFixed(2)}% (+${((bestAccuracyThisRound - currentBest.accuracy) * 100).toFixed(2)}%)`, 'success')
+          addLog(`\n✅ Step ${event.step} selesai: Menambah "${event.added}"`, 'success')
+          addLog(`   Akurasi: ${(event.score * 100).toFixed(2)}% (+${((event.score - currentBest.accuracy) * 100).toFixed(2)}%)`, 'success')
 
-          // Update current best if improved
-          if (bestAccuracyThisRound > currentBest.accuracy) {
+          if (event.score > currentBest.accuracy) {
             currentBest = {
-              accuracy: bestAccuracyThisRound,
+              accuracy: event.score,
               features: [...selected],
-              metrics: bestMetricsThisRound,
-              modelId: bestModelIdThisRound,
-              step: step + 1
+              metrics: event.metrics,
+              modelId: null,
+              step: event.step
             }
             setBestResult({ ...currentBest })
           }
-        } else {
+        } else if (event.event === 'stopped') {
           addLog(`\n⚠️ Tidak ada fitur yang meningkatkan akurasi, berhenti.`, 'warning')
-          break
+        } else if (event.event === 'error') {
+          throw new Error(event.detail)
+        }
+      }
+
+      while (true) {
+        const { done, value } = await reader.read()
+        if (done) break
+        buffer += decoder.decode(value, { stream: true })
+        const lines = buffer.split('\n')
+        buffer = lines.pop()
+        for (const line of lines) {
+          if (line.trim()) handleEvent(JSON.parse(line))
         }
       }
+      if (buffer.trim()) handleEvent(JSON.parse(buffer))
 
       addLog(`\n🏆 Feature Selection selesai!`, 'complete')
       addLog(`📊 Best Accuracy: ${(currentBest.accuracy * 100).toFixed(2)}%`, 'complete')
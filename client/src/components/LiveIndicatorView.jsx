@@ -222,60 +222,51 @@ export default function LiveIndicatorView() {
       const allPredictions = []
       const errors = []
       
-      // Run prediction for each selected model
-      let idx = 0
-      for (const modelId of selectedModelIds) {
-        idx++
-        const model = trainedModels.find(m => m.id === modelId)
+      // Run prediction for all selected models in one request
+      setPredictingStatus(`Prediksi ${selectedModelIds.length} model...`)
+
+      const response = await fetch(`${ML_API_BASE}/predict/batch`, {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json' },
+        body: JSON.stringify({
+          data: [indicatorData.data],
+          model_ids: selectedModelIds
+        })
+      })
+
+      const batch = await response.json()
+      console.log('Batch prediction result:', batch)
+
+      if (!response.ok) {
+        throw new Error(batch.detail || batch.error || 'Batch prediction failed')
+      }
+
+      for (const result of batch.results) {
+        const model = trainedModels.find(m => m.id === result.model_id)
         if (!model) {
-          console.warn(`Model not found: ${modelId}`)
+          console.warn(`Model not found: ${result.model_id}`)
           continue
         }
 
-        setPredictingStatus(`Prediksi ${idx}/${selectedModelIds.length}: ${model.model_name}...`)
-
-        try {
-          console.log(`Predicting with ${model.model_name}, features:`, model.features)
-          console.log('Indicator data sample:', Object.fromEntries(
-            model.features.map(f => [f, indicatorData.data[f]])
-          ))
-          
-          const response = await fetch(`${ML_API_BASE}/predict`, {
-            method: 'POST',
-            headers: { 'Content-Type': 'application/json' },
-            body: JSON.stringify({
-              data: [indicatorData.data],
-              features: model.features,
-              model_id: modelId
-            })
-          })
-
-          const result = await response.json()
-          console.log(`Prediction from ${model.model_name}:`, result)
+        if (result.error) {
+          errors.push(`${model.model_name}: ${result.error}`)
+          continue
+        }
 
-          if (!response.ok) {
-            errors.push(`${model.model_name}: ${result.detail || result.error || 'Unknown error'}`)
-            continue
-          }
+        if (result.predictions?.length > 0) {
+          const predValue = result.predictions[0]
+          const label = getPredictionLabel(predValue)
+          console.log(`Model ${model.model_name}: value=${predValue}, label=${label}`)
 
-          if (result.predictions?.length > 0) {
-            const predValue = result.predictions[0]
-            const label = getPredictionLabel(predValue)
-            console.log(`Model ${model.model_name}: value=${predValue}, label=${label}`)
-            
-            allPredictions.push({
-              modelId,
-              model,
-              predictedValue: predValue,
-              probabilities: result.probabilities?.[0] || null,
-              label: label
-            })
-          } else {
-            errors.push(`${model.model_name}: No predictions returned`)
-          }
-        } catch (err) {
-          console.error(`Prediction error for ${model.model_name}:`, err)
-          errors.push(`${model.model_name}: ${err.message}`)
+          allPredictions.push({
+            modelId: result.model_id,
+            model,
+            predictedValue: predValue,
+            probabilities: result.probabilities?.[0] || null,
+            label: label
+          })
+        } else {
+          errors.push(`${model.model_name}: No predictions returned`)
         }
       }
 
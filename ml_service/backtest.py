@@ -0,0 +1,170 @@
+"""Walk-forward backtests: date windows, per-window preprocessing and fits"""
+
+import time
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+from joblib import Parallel, delayed
+from sklearn.metrics import roc_auc_score
+
+from estimators import AVAILABLE_MODELS, holdout_metrics, load_model_class, predict_arrays
+from scheduler import thread_limited_params
+
+
+def backtest_windows(dates: np.ndarray, mode: str, train_periods: int, test_periods: int,
+                     step: int, gap: int) -> List[Dict[str, Any]]:
+    """Walk-forward windows over sorted row dates as row ranges [start, end)"""
+    unique_dates = np.unique(dates)
+    bounds = np.searchsorted(dates, unique_dates)  # First row of each distinct date
+    bounds = np.append(bounds, len(dates))
+    
+    windows = []
+    test_start = train_periods + gap
+    while test_start < len(unique_dates):
+        test_end = min(test_start + test_periods, len(unique_dates))
+        train_end = test_start - gap
+        train_start = 0 if mode == "expanding" else train_end - train_periods
+        windows.append({
+            "window": len(windows),
+            "train_rows": (int(bounds[train_start]), int(bounds[train_end])),
+            "test_rows": (int(bounds[test_start]), int(bounds[test_end])),
+            "train_start": pd.Timestamp(unique_dates[train_start]).isoformat(),
+            "train_end": pd.Timestamp(unique_dates[train_end - 1]).isoformat(),
+            "test_start": pd.Timestamp(unique_dates[test_start]).isoformat(),
+            "test_end": pd.Timestamp(unique_dates[test_end - 1]).isoformat()
+        })
+        test_start += step
+    return windows
+
+
+def _window_preprocessing(X_train: np.ndarray):
+    """Median fill values and standardization taken from one window's training rows only"""
+    fill = np.nan_to_num(pd.DataFrame(X_train).median().to_numpy(), nan=0.0)
+    filled = np.where(np.isnan(X_train), fill, X_train)
+    mean = filled.mean(axis=0)
+    scale = filled.std(axis=0)
+    scale[scale == 0] = 1.0
+    return fill, mean, scale
+
+
+def _apply_window_preprocessing(X: np.ndarray, preprocessing) -> np.ndarray:
+    fill, mean, scale = preprocessing
+    return (np.where(np.isnan(X), fill, X) - mean) / scale
+
+
+def _window_result(window: Dict[str, Any], model, X_test, y_test, refit: str, started: float):
+    """Per-window event with holdout metrics of model on the window's test rows"""
+    predictions, probabilities = predict_arrays({"label_encoder": None}, X_test, model)
+    metrics = holdout_metrics(y_test, predictions)
+    if probabilities is not None and probabilities.shape[1] == 2 and len(np.unique(y_test)) == 2:
+        metrics["roc_auc"] = float(roc_auc_score(y_test, probabilities[:, 1]))
+    
+    return {
+        "event": "window",
+        **{k: v for k, v in window.items() if k not in ("train_rows", "test_rows")},
+        "train_samples": window["train_rows"][1] - window["train_rows"][0],
+        "test_samples": len(y_test),
+        "refit": refit,
+        "metrics": metrics,
+        "fit_time": time.perf_counter() - started,
+        "_predictions": predictions
+    }
+
+
+def _backtest_window(model_class, params, X, y, window: Dict[str, Any]):
+    """Fit one walk-forward window from scratch and score its test rows"""
+    started = time.perf_counter()
+    (train_start, train_end), (test_start, test_end) = window["train_rows"], window["test_rows"]
+    try:
+        preprocessing = _window_preprocessing(X[train_start:train_end])
+        model = model_class(**params)
+        model.fit(_apply_window_preprocessing(X[train_start:train_end], preprocessing), y[train_start:train_end])
+        return _window_result(
+            window, model, _apply_window_preprocessing(X[test_start:test_end], preprocessing),
+            y[test_start:test_end], "full", started
+        )
+    except Exception as e:
+        return {"event": "window", "window": window["window"], "error": str(e)}
+
+
+def _incremental_backtest(model_class, params, X, y, windows: List[Dict[str, Any]]):
+    """Expanding windows for partial_fit models: fit the first window, then feed only new rows.
+
+    Preprocessing statistics come from the first training window and stay fixed,
+    so every update sees features on the same scale.
+    """
+    model = None
+    preprocessing = None
+    fitted_until = 0
+    for window in windows:
+        started = time.perf_counter()
+        (_, train_end), (test_start, test_end) = window["train_rows"], window["test_rows"]
+        try:
+            if model is None:
+                preprocessing = _window_preprocessing(X[:train_end])
+                model = model_class(**params)
+                model.fit(_apply_window_preprocessing(X[:train_end], preprocessing), y[:train_end])
+                refit = "full"
+            elif train_end > fitted_until:
+                model.partial_fit(_apply_window_preprocessing(X[fitted_until:train_end], preprocessing), y[fitted_until:train_end])
+                refit = "incremental"
+            else:
+                refit = "none"
+            fitted_until = train_end
+            yield _window_result(
+                window, model, _apply_window_preprocessing(X[test_start:test_end], preprocessing),
+                y[test_start:test_end], refit, started
+            )
+        except Exception as e:
+            yield {"event": "window", "window": window["window"], "error": str(e)}
+
+
+def run_backtest(request, X: np.ndarray, y: np.ndarray, windows: List[Dict[str, Any]],
+                 n_jobs: Optional[int] = None):
+    """Generator yielding each window's event in order, then a summary with mean and pooled metrics.
+
+    request is the /backtest BacktestRequest; n_jobs overrides request.n_jobs,
+    e.g. with the cores of a lease.
+    """
+    n_jobs = n_jobs or request.n_jobs
+    model_class = load_model_class(request.model_type)
+    params = AVAILABLE_MODELS[request.model_type]["params"].copy()
+    if request.custom_params:
+        params.update(request.custom_params)
+    
+    incremental = (
+        request.warm_start and request.mode == "expanding"
+        and hasattr(model_class(**params), "partial_fit")
+    )
+    if incremental:
+        events = _incremental_backtest(model_class, params, X, y, windows)
+    else:
+        # Windows already run in parallel, so keep each window fit single-threaded
+        if n_jobs != 1:
+            params = thread_limited_params(request.model_type, params, 1)
+        events = Parallel(n_jobs=n_jobs, return_as="generator")(
+            delayed(_backtest_window)(model_class, params, X, y, window) for window in windows
+        )
+    
+    pooled_true = []
+    pooled_pred = []
+    scored = []
+    for event in events:
+        if "error" not in event:
+            predictions = event.pop("_predictions")
+            test_start, test_end = windows[event["window"]]["test_rows"]
+            pooled_true.append(y[test_start:test_end])
+            pooled_pred.append(predictions)
+            scored.append(event["metrics"])
+        yield event
+    
+    summary = {"event": "done", "windows": len(windows), "scored_windows": len(scored), "mean": None, "pooled": None}
+    if scored:
+        keys = dict.fromkeys(key for metrics in scored for key in metrics)
+        summary["mean"] = {
+            key: float(np.mean([m[key] for m in scored if key in m]))
+            for key in keys
+        }
+        summary["pooled"] = holdout_metrics(np.concatenate(pooled_true), np.concatenate(pooled_pred))
+    yield summary
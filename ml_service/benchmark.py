@@ -0,0 +1,407 @@
+"""Benchmark harness for the ML service.
+
+Generates synthetic indicator-style datasets, times /train, /compare and
+/predict for every model in AVAILABLE_MODELS through the HTTP app (TestClient)
+and through direct function calls, and writes latency percentiles, throughput
+and peak RSS as JSON. Runs offline on CPU only.
+
+    python benchmark.py --sizes 1000x10,10000x50 --output results.json
+    python benchmark.py --preset full --baseline baseline.json --threshold 0.2
+"""
+import argparse
+import io
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+PRESETS = {
+    "quick": "1000x10,10000x20",
+    "standard": "1000x10,10000x50,100000x100",
+    "full": "1000x10,10000x50,100000x100,1000000x200"
+}
+
+# Models whose fit grows faster than linearly in rows are skipped above these sizes
+ROW_LIMITS = {
+    "svm": 20000,
+    "svm_linear": 20000,
+    "knn": 200000,
+    "mlp": 200000,
+    "gradient_boosting": 200000,
+    "adaboost": 200000,
+    "qda": 1000000
+}
+
+BASE_FEATURES = [
+    "ret_1", "ret_5", "ret_10", "ret_20", "vol_10", "vol_20", "rsi_14",
+    "sma_ratio_5_20", "sma_ratio_20_50", "bb_position", "volume_ratio", "range_pct"
+]
+
+
+def parse_sizes(text):
+    """"1000x10,10000x50" -> [(1000, 10), (10000, 50)]"""
+    sizes = []
+    for item in text.split(","):
+        rows, features = item.lower().split("x")
+        sizes.append((int(float(rows)), int(features)))
+    return sizes
+
+
+def make_dataset(rows, n_features, seed=42):
+    """Random-walk prices per ticker turned into indicator-like features and a next-bar direction"""
+    rng = np.random.default_rng(seed)
+    bars = 500
+    tickers = max(1, rows // bars)
+    ticker = np.repeat(np.arange(tickers), bars)[:rows]
+    if len(ticker) < rows:
+        ticker = np.concatenate([ticker, np.full(rows - len(ticker), tickers)])
+    
+    returns = rng.normal(0, 0.02, rows)
+    close = 100 * np.exp(pd.Series(returns).groupby(ticker).cumsum())
+    volume = pd.Series(rng.lognormal(12, 0.5, rows))
+    high = close * (1 + np.abs(rng.normal(0, 0.01, rows)))
+    low = close * (1 - np.abs(rng.normal(0, 0.01, rows)))
+    grouped = close.groupby(ticker)
+    
+    def rolling(series, window, how):
+        return getattr(series.groupby(ticker).rolling(window), how)().reset_index(level=0, drop=True)
+    
+    delta = grouped.diff()
+    gain = rolling(delta.clip(lower=0), 14, "mean")
+    loss = rolling(-delta.clip(upper=0), 14, "mean")
+    sma_5, sma_20, sma_50 = (rolling(close, w, "mean") for w in (5, 20, 50))
+    std_20 = rolling(close, 20, "std")
+    
+    base = pd.DataFrame({
+        "ret_1": grouped.pct_change(1),
+        "ret_5": grouped.pct_change(5),
+        "ret_10": grouped.pct_change(10),
+        "ret_20": grouped.pct_change(20),
+        "vol_10": rolling(pd.Series(returns), 10, "std"),
+        "vol_20": rolling(pd.Series(returns), 20, "std"),
+        "rsi_14": 100 - 100 / (1 + gain / loss.replace(0, np.nan)),
+        "sma_ratio_5_20": sma_5 / sma_20,
+        "sma_ratio_20_50": sma_20 / sma_50,
+        "bb_position": (close - sma_20) / (2 * std_20),
+        "volume_ratio": volume / rolling(volume, 20, "mean"),
+        "range_pct": (high - low) / close
+    })
+    
+    # Extra columns are noisy mixes of the base indicators, like derived screens
+    columns = {}
+    for i in range(n_features):
+        if i < len(BASE_FEATURES):
+            columns[BASE_FEATURES[i]] = base[BASE_FEATURES[i]].to_numpy()
+        else:
+            weights = rng.normal(size=len(BASE_FEATURES))
+            mixed = np.nan_to_num(base.to_numpy()) @ weights
+            columns[f"f_{i}"] = mixed + rng.normal(0, mixed.std() or 1.0, rows)
+    
+    frame = pd.DataFrame(columns)
+    future = pd.Series(returns).groupby(ticker).shift(-1).fillna(0).to_numpy()
+    signal = np.nan_to_num(base["ret_5"].to_numpy() * 5 + base["bb_position"].to_numpy() * 0.01)
+    frame["target"] = (future + signal * 0.01 > 0).astype(np.int64)
+    return frame
+
+
+def npz_body(frame, request):
+    """Binary /train-style body: columns plus the request fields in __request__"""
+    buffer = io.BytesIO()
+    np.savez(buffer, __request__=np.array(json.dumps(request)), **{c: frame[c].to_numpy() for c in frame.columns})
+    return buffer.getvalue()
+
+
+class PeakRSS:
+    """Samples this process's resident set size in the background and keeps the peak"""
+    
+    def __init__(self, interval=0.01):
+        self.interval = interval
+        self.peak = 0
+        self._stop = threading.Event()
+        self._thread = None
+    
+    @staticmethod
+    def current():
+        try:
+            with open("/proc/self/status") as f:
+                for line in f:
+                    if line.startswith("VmRSS:"):
+                        return int(line.split()[1]) * 1024
+        except OSError:
+            pass
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+    
+    def _run(self):
+        while not self._stop.is_set():
+            self.peak = max(self.peak, self.current())
+            self._stop.wait(self.interval)
+    
+    def __enter__(self):
+        self.peak = self.current()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        return self
+    
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self.peak = max(self.peak, self.current())
+
+
+def summarize(latencies, rows):
+    values = np.asarray(latencies) * 1000
+    p50 = float(np.percentile(values, 50))
+    return {
+        "latency_ms": {
+            "min": float(values.min()),
+            "p50": p50,
+            "p90": float(np.percentile(values, 90)),
+            "p99": float(np.percentile(values, 99)),
+            "mean": float(values.mean())
+        },
+        "throughput_rows_per_s": rows / (p50 / 1000) if p50 > 0 else None
+    }
+
+
+def time_case(fn, repeats, rows, before=None):
+    """Run fn repeats times; returns latency summary and peak RSS, or the first error"""
+    latencies = []
+    with PeakRSS() as rss:
+        for _ in range(repeats):
+            if before is not None:
+                before()
+            started = time.perf_counter()
+            try:
+                result = fn()
+            except Exception as e:
+                return {"error": f"{type(e).__name__}: {e}"}
+            latencies.append(time.perf_counter() - started)
+    return {
+        **summarize(latencies, rows),
+        "repeats": repeats,
+        "peak_rss_mb": rss.peak / 2 ** 20,
+        "result": result
+    }
+
+
+def environment():
+    versions = {}
+    for module in ("numpy", "pandas", "sklearn", "xgboost", "lightgbm", "catboost", "fastapi", "pydantic", "joblib"):
+        try:
+            versions[module] = __import__(module).__version__
+        except Exception:
+            versions[module] = None
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "HEAD"], cwd=SCRIPT_DIR, capture_output=True, text=True, timeout=5
+        ).stdout.strip() or None
+    except Exception:
+        commit = None
+    return {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "versions": versions,
+        "commit": commit,
+        "started_at": datetime.now().isoformat()
+    }
+
+
+def run_benchmarks(args):
+    sys.path.insert(0, SCRIPT_DIR)
+    import main
+    from fastapi.testclient import TestClient
+    
+    client = TestClient(main.app)
+    models = args.models.split(",") if args.models else list(main.AVAILABLE_MODELS)
+    modes = ["testclient", "direct"] if args.mode == "both" else [args.mode]
+    endpoints = args.endpoints.split(",")
+    cases = []
+    
+    def record(case, outcome):
+        outcome.pop("result", None)
+        case.update(outcome)
+        case["key"] = f"{case['endpoint']}|{case['mode']}|{case['model_type']}|{case['rows']}x{case['features']}"
+        cases.append(case)
+        status = case.get("error") or f"p50 {case['latency_ms']['p50']:.1f} ms"
+        print(f"{case['key']:<60} {status}", flush=True)
+    
+    for rows, n_features in parse_sizes(args.sizes):
+        frame = make_dataset(rows, n_features, args.seed)
+        features = [c for c in frame.columns if c != "target"]
+        eligible = [m for m in models if args.no_limits or rows <= ROW_LIMITS.get(m, rows)]
+        for model_type in models:
+            if model_type not in eligible:
+                cases.append({
+                    "key": f"*|*|{model_type}|{rows}x{n_features}", "model_type": model_type,
+                    "rows": rows, "features": n_features, "skipped": f"over ROW_LIMITS ({ROW_LIMITS[model_type]} rows)"
+                })
+        
+        train_fields = {
+            "features": features, "target": "target", "skip_save": True,
+            "cross_validation": not args.no_cv, "cv_folds": args.cv_folds
+        }
+        
+        for model_type in eligible:
+            base = {"model_type": model_type, "rows": rows, "features": n_features}
+            
+            if "train" in endpoints:
+                fields = {**train_fields, "model_type": model_type}
+                for mode in modes:
+                    if mode == "testclient":
+                        body = npz_body(frame, fields)
+                        
+                        def call():
+                            response = client.post("/train", content=body, headers={"content-type": "application/x-npz"})
+                            if response.status_code != 200:
+                                raise RuntimeError(f"HTTP {response.status_code}: {response.text[:200]}")
+                    else:
+                        def call():
+                            request = main.TrainRequest(**fields)
+                            request._frame = frame
+                            main.run_training(request)
+                    record({**base, "endpoint": "train", "mode": mode},
+                           time_case(call, args.train_repeats, rows, main.result_cache.clear))
+            
+            if "predict" in endpoints:
+                # One stored model per size and type, fitted outside the timings
+                setup = main.TrainRequest(**{**train_fields, "model_type": model_type,
+                                             "skip_save": False, "cross_validation": False})
+                setup._frame = frame
+                try:
+                    model_id = main.run_training(setup)["model_id"]
+                except Exception as e:
+                    record({**base, "endpoint": "predict", "mode": "setup"}, {"error": f"{type(e).__name__}: {e}"})
+                    continue
+                
+                single = json.loads(frame[features].head(1).to_json(orient="records"))
+                batch = frame[features].head(args.predict_rows)
+                for mode in modes:
+                    for label, payload_rows in (("predict_one", 1), ("predict_batch", len(batch))):
+                        if mode == "testclient" and payload_rows == 1:
+                            def call():
+                                response = client.post("/predict", json={"data": single, "features": features, "model_id": model_id})
+                                if response.status_code != 200:
+                                    raise RuntimeError(f"HTTP {response.status_code}: {response.text[:200]}")
+                        elif mode == "testclient":
+                            body = npz_body(batch, {"features": features, "model_id": model_id})
+                            
+                            def call():
+                                response = client.post("/predict", content=body, headers={"content-type": "application/x-npz"})
+                                if response.status_code != 200:
+                                    raise RuntimeError(f"HTTP {response.status_code}: {response.text[:200]}")
+                        elif payload_rows == 1:
+                            def call():
+                                main.predict(main.PredictRequest(data=single, features=features, model_id=model_id))
+                        else:
+                            def call():
+                                request = main.PredictRequest(features=features, model_id=model_id)
+                                request._frame = batch
+                                main.predict(request)
+                        record({**base, "endpoint": label, "mode": mode},
+                               time_case(call, args.predict_repeats, payload_rows))
+                del main.trained_models[model_id]
+        
+        if "compare" in endpoints and eligible:
+            fields = {"features": features, "target": "target", "models": eligible}
+            base = {"model_type": "all", "rows": rows, "features": n_features}
+            for mode in modes:
+                if mode == "testclient":
+                    body = npz_body(frame, fields)
+                    
+                    def call():
+                        response = client.post("/compare", content=body, headers={"content-type": "application/x-npz"})
+                        if response.status_code != 200:
+                            raise RuntimeError(f"HTTP {response.status_code}: {response.text[:200]}")
+                        return response.json()["results"]
+                else:
+                    def call():
+                        request = main.CompareModelsRequest(**fields)
+                        request._frame = frame
+                        return main.compare_models(request)["results"]
+                outcome = time_case(call, args.train_repeats, rows, main.result_cache.clear)
+                if "result" in outcome:
+                    outcome["models"] = {r["model_type"]: r.get("fit_time", r.get("error")) for r in outcome["result"]}
+                record({**base, "endpoint": "compare", "mode": mode}, outcome)
+    
+    return cases
+
+
+def compare_to_baseline(cases, baseline, threshold, min_ms):
+    """Cases whose p50 latency grew by more than threshold (and min_ms) over the baseline"""
+    previous = {case["key"]: case for case in baseline.get("cases", []) if "latency_ms" in case}
+    regressions = []
+    for case in cases:
+        before = previous.get(case["key"])
+        if before is None or "latency_ms" not in case:
+            continue
+        old, new = before["latency_ms"]["p50"], case["latency_ms"]["p50"]
+        case["baseline_p50_ms"] = old
+        case["change"] = (new - old) / old if old else None
+        if old and new > old * (1 + threshold) and new - old > min_ms:
+            regressions.append({"key": case["key"], "baseline_p50_ms": old, "p50_ms": new, "change": case["change"]})
+    return regressions
+
+
+def main_cli(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the ML service endpoints on synthetic data")
+    parser.add_argument("--preset", choices=sorted(PRESETS), default="quick", help="Dataset sizes when --sizes is not given")
+    parser.add_argument("--sizes", help="Comma-separated ROWSxFEATURES, e.g. 1000x10,100000x100")
+    parser.add_argument("--models", help="Comma-separated model ids (default: every AVAILABLE_MODELS entry)")
+    parser.add_argument("--endpoints", default="train,predict,compare")
+    parser.add_argument("--mode", choices=["testclient", "direct", "both"], default="both")
+    parser.add_argument("--train-repeats", type=int, default=1)
+    parser.add_argument("--predict-repeats", type=int, default=50)
+    parser.add_argument("--predict-rows", type=int, default=1000, help="Rows per batch prediction")
+    parser.add_argument("--cv-folds", type=int, default=5)
+    parser.add_argument("--no-cv", action="store_true", help="Train without cross-validation")
+    parser.add_argument("--no-limits", action="store_true", help="Ignore ROW_LIMITS for slow models")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", default="benchmark_results.json")
+    parser.add_argument("--baseline", help="Earlier results JSON to compare p50 latencies against")
+    parser.add_argument("--threshold", type=float, default=0.2, help="Allowed p50 slowdown, 0.2 = 20%%")
+    parser.add_argument("--min-ms", type=float, default=2.0, help="Ignore slowdowns smaller than this")
+    parser.add_argument("--save-baseline", action="store_true", help="Also write the results to --baseline")
+    parser.add_argument("--workdir", help="Where saved models and catboost logs go (default: a temp dir)")
+    args = parser.parse_args(argv)
+    args.sizes = args.sizes or PRESETS[args.preset]
+    output = os.path.abspath(args.output)
+    baseline_path = os.path.abspath(args.baseline) if args.baseline else None
+    
+    # Keep model files and training logs out of the source tree
+    os.chdir(args.workdir or tempfile.mkdtemp(prefix="ml_benchmark_"))
+    
+    results = {"environment": environment(), "settings": vars(args), "cases": run_benchmarks(args)}
+    
+    regressions = []
+    if baseline_path and os.path.exists(baseline_path) and not args.save_baseline:
+        with open(baseline_path) as f:
+            regressions = compare_to_baseline(results["cases"], json.load(f), args.threshold, args.min_ms)
+        results["regressions"] = regressions
+    
+    with open(output, "w") as f:
+        json.dump(results, f, indent=2, default=str)
+    if baseline_path and args.save_baseline:
+        with open(baseline_path, "w") as f:
+            json.dump(results, f, indent=2, default=str)
+    print(f"Wrote {output}")
+    
+    for regression in regressions:
+        print(f"REGRESSION {regression['key']}: {regression['baseline_p50_ms']:.1f} ms -> "
+              f"{regression['p50_ms']:.1f} ms ({regression['change']:+.0%})")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main_cli())
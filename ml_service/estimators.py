@@ -0,0 +1,224 @@
+"""Model catalog: estimator configs, lazy class imports and shared predict/metric helpers"""
+
+import importlib
+import importlib.util
+import time
+from datetime import datetime
+from typing import Any, Dict
+
+import numpy as np
+from sklearn.metrics import accuracy_score, f1_score, precision_score, recall_score
+
+
+# Estimator modules are imported on first use (see load_model_class); optional
+# backends are only checked for installation here so startup stays cheap
+XGBOOST_AVAILABLE = importlib.util.find_spec("xgboost") is not None
+LIGHTGBM_AVAILABLE = importlib.util.find_spec("lightgbm") is not None
+CATBOOST_AVAILABLE = importlib.util.find_spec("catboost") is not None
+
+
+# Available models configuration
+AVAILABLE_MODELS = {
+    "random_forest": {
+        "name": "Random Forest",
+        "import": "sklearn.ensemble.RandomForestClassifier",
+        "params": {"n_estimators": 100, "max_depth": 10, "random_state": 42, "n_jobs": -1},
+        "description": "Ensemble of decision trees with bagging"
+    },
+    "extra_trees": {
+        "name": "Extra Trees",
+        "import": "sklearn.ensemble.ExtraTreesClassifier",
+        "params": {"n_estimators": 100, "max_depth": 10, "random_state": 42, "n_jobs": -1},
+        "description": "Extremely randomized trees"
+    },
+    "gradient_boosting": {
+        "name": "Gradient Boosting",
+        "import": "sklearn.ensemble.GradientBoostingClassifier",
+        "params": {"n_estimators": 100, "max_depth": 5, "learning_rate": 0.1, "random_state": 42},
+        "description": "Sequential ensemble with gradient descent"
+    },
+    "adaboost": {
+        "name": "AdaBoost",
+        "import": "sklearn.ensemble.AdaBoostClassifier",
+        "params": {"n_estimators": 100, "learning_rate": 0.1, "random_state": 42, "algorithm": "SAMME"},
+        "description": "Adaptive boosting algorithm"
+    },
+    "bagging": {
+        "name": "Bagging Classifier",
+        "import": "sklearn.ensemble.BaggingClassifier",
+        "params": {"n_estimators": 50, "random_state": 42, "n_jobs": -1},
+        "description": "Bootstrap aggregating"
+    },
+    "decision_tree": {
+        "name": "Decision Tree",
+        "import": "sklearn.tree.DecisionTreeClassifier",
+        "params": {"max_depth": 10, "random_state": 42},
+        "description": "Single decision tree classifier"
+    },
+    "logistic_regression": {
+        "name": "Logistic Regression",
+        "import": "sklearn.linear_model.LogisticRegression",
+        "params": {"max_iter": 1000, "random_state": 42, "n_jobs": -1},
+        "description": "Linear model for classification"
+    },
+    "ridge_classifier": {
+        "name": "Ridge Classifier",
+        "import": "sklearn.linear_model.RidgeClassifier",
+        "params": {"random_state": 42},
+        "description": "Ridge regression for classification"
+    },
+    "sgd_classifier": {
+        "name": "SGD Classifier",
+        "import": "sklearn.linear_model.SGDClassifier",
+        "params": {"max_iter": 1000, "random_state": 42, "n_jobs": -1},
+        "description": "Stochastic Gradient Descent"
+    },
+    "svm": {
+        "name": "Support Vector Machine",
+        "import": "sklearn.svm.SVC",
+        "params": {"kernel": "rbf", "probability": True, "random_state": 42},
+        "description": "Support Vector Classifier with RBF kernel"
+    },
+    "svm_linear": {
+        "name": "SVM Linear",
+        "import": "sklearn.svm.SVC",
+        "params": {"kernel": "linear", "probability": True, "random_state": 42},
+        "description": "Support Vector Classifier with linear kernel"
+    },
+    "knn": {
+        "name": "K-Nearest Neighbors",
+        "import": "sklearn.neighbors.KNeighborsClassifier",
+        "params": {"n_neighbors": 5, "n_jobs": -1},
+        "description": "Instance-based learning"
+    },
+    "naive_bayes": {
+        "name": "Naive Bayes",
+        "import": "sklearn.naive_bayes.GaussianNB",
+        "params": {},
+        "description": "Gaussian Naive Bayes"
+    },
+    "mlp": {
+        "name": "Neural Network (MLP)",
+        "import": "sklearn.neural_network.MLPClassifier",
+        "params": {"hidden_layer_sizes": (100, 50), "max_iter": 500, "random_state": 42},
+        "description": "Multi-layer Perceptron"
+    },
+    "lda": {
+        "name": "Linear Discriminant Analysis",
+        "import": "sklearn.discriminant_analysis.LinearDiscriminantAnalysis",
+        "params": {},
+        "description": "Linear Discriminant Analysis"
+    },
+    "qda": {
+        "name": "Quadratic Discriminant Analysis",
+        "import": "sklearn.discriminant_analysis.QuadraticDiscriminantAnalysis",
+        "params": {},
+        "description": "Quadratic Discriminant Analysis"
+    }
+}
+
+# Models whose predict() is exactly the argmax of predict_proba(), by class name
+PROBA_ARGMAX_MODELS = frozenset({
+    "RandomForestClassifier",
+    "ExtraTreesClassifier",
+    "BaggingClassifier",
+    "DecisionTreeClassifier",
+    "LogisticRegression",
+    "GaussianNB"
+})
+
+
+# How /models/{model_id}/update folds new rows into each model type
+INCREMENTAL_UPDATES = {
+    "sgd_classifier": "partial_fit",
+    "naive_bayes": "partial_fit",
+    "mlp": "partial_fit",
+    "xgboost": "boosting",
+    "lightgbm": "boosting",
+    "catboost": "boosting"
+}
+
+# Boosters that stop adding trees once the validation score stops improving, and the
+# parameter holding each model's tree count when it differs from n_estimators
+EARLY_STOPPING_MODELS = frozenset({"xgboost", "lightgbm", "catboost"})
+ESTIMATOR_COUNT_PARAMS = {"catboost": "iterations"}
+
+# Add XGBoost if available
+if XGBOOST_AVAILABLE:
+    AVAILABLE_MODELS["xgboost"] = {
+        "name": "XGBoost",
+        "import": "xgboost.XGBClassifier",
+        "params": {"n_estimators": 100, "max_depth": 6, "learning_rate": 0.1, "random_state": 42, "n_jobs": -1, "eval_metric": "logloss"},
+        "description": "Extreme Gradient Boosting"
+    }
+
+# Add LightGBM if available
+if LIGHTGBM_AVAILABLE:
+    AVAILABLE_MODELS["lightgbm"] = {
+        "name": "LightGBM",
+        "import": "lightgbm.LGBMClassifier",
+        "params": {"n_estimators": 100, "max_depth": 6, "learning_rate": 0.1, "random_state": 42, "n_jobs": -1, "verbose": -1},
+        "description": "Light Gradient Boosting Machine"
+    }
+
+# Add CatBoost if available
+if CATBOOST_AVAILABLE:
+    AVAILABLE_MODELS["catboost"] = {
+        "name": "CatBoost",
+        "import": "catboost.CatBoostClassifier",
+        "params": {"iterations": 100, "depth": 6, "learning_rate": 0.1, "random_state": 42, "verbose": False},
+        "description": "Categorical Boosting"
+    }
+
+
+model_classes = {}
+import_report = {}
+
+
+def load_model_class(model_type: str):
+    """Estimator class for a model type, importing its module the first time it is used"""
+    model_class = model_classes.get(model_type)
+    if model_class is None:
+        module_name, class_name = AVAILABLE_MODELS[model_type]["import"].rsplit(".", 1)
+        started = time.perf_counter()
+        model_class = getattr(importlib.import_module(module_name), class_name)
+        import_report[model_type] = {
+            "module": module_name,
+            "import_seconds": time.perf_counter() - started,
+            "imported_at": datetime.now().isoformat()
+        }
+        model_classes[model_type] = model_class
+    return model_class
+
+
+def holdout_metrics(y_test, y_pred):
+    """Weighted holdout metrics in the same shape /compare reports them"""
+    return {
+        "accuracy": float(accuracy_score(y_test, y_pred)),
+        "precision": float(precision_score(y_test, y_pred, average='weighted', zero_division=0)),
+        "recall": float(recall_score(y_test, y_pred, average='weighted', zero_division=0)),
+        "f1_score": float(f1_score(y_test, y_pred, average='weighted', zero_division=0))
+    }
+
+
+def predict_arrays(model_data: Dict[str, Any], X_scaled, model=None):
+    """Predicted labels (decoded) and class probabilities as arrays for a scaled matrix"""
+    model = model if model is not None else model_data["model"]
+    
+    if type(model).__name__ in PROBA_ARGMAX_MODELS:
+        # predict() is argmax of predict_proba() here, so one pass over the trees gives both
+        probabilities = model.predict_proba(X_scaled)
+        predictions = model.classes_[np.argmax(probabilities, axis=1)]
+    else:
+        predictions = model.predict(X_scaled)
+        
+        # Get probabilities if available
+        probabilities = None
+        if hasattr(model, 'predict_proba'):
+            probabilities = model.predict_proba(X_scaled)
+    
+    # Decode labels if needed
+    if model_data["label_encoder"]:
+        predictions = model_data["label_encoder"].inverse_transform(predictions)
+    
+    return predictions, probabilities
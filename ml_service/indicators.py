@@ -0,0 +1,464 @@
+"""Technical indicators from OHLCV bars: batched array kernels and per-bar live state"""
+
+from collections import deque
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+from fastapi import HTTPException
+from numpy.lib.stride_tricks import sliding_window_view
+from pydantic import BaseModel
+from scipy.signal import lfilter
+
+
+class IndicatorOptions(BaseModel):
+    ticker_column: Optional[str] = "ticker"  # None when every row belongs to one series
+    date_column: Optional[str] = "date"  # Bars are ordered by this within each ticker when present
+    open_column: str = "open"
+    high_column: str = "high"
+    low_column: str = "low"
+    close_column: str = "close"
+    volume_column: str = "volume"
+    names: Optional[List[str]] = None  # Indicator columns to add, defaults to INDICATOR_COLUMNS
+    lag: int = 0  # Shift indicators this many bars back (1 gives each bar the previous bar's values)
+    up_threshold: Optional[float] = None  # Add a target: 1 when the bar's return % reaches this
+    down_threshold: Optional[float] = None  # ... 0 when it falls to this, -1 in between
+    include_neutral: bool = False  # Keep -1 target rows instead of dropping them
+
+
+# Indicator features computed from raw OHLCV bars, named like the rows
+# generateRegressionDataset builds in lib/indicatorService.js
+INDICATOR_COLUMNS = [
+    "sma5", "sma10", "sma20", "sma50", "ema5", "ema10", "ema12", "ema21", "ema26", "ema21High", "ema21Low",
+    "rsi", "rsi7", "rsi21", "macd", "macdSignal", "macdHistogram",
+    "bbUpper", "bbMiddle", "bbLower", "bbWidth", "stochK", "stochD", "atr", "atrPercent", "obv",
+    "williamsR", "cci", "mfi", "roc", "momentum", "pricePosition", "volumeRatio",
+    "closePosition", "bodyRangeRatio", "upperWickRatio", "lowerWickRatio", "return1d", "return3d", "return5d",
+    "distFromSMA5", "distFromSMA20", "distFromSMA50", "distFromEMA21",
+    "deltaRSI", "deltaRSI7", "deltaRSI21", "deltaMACDHist", "deltaStochK", "deltaCCI", "deltaMFI"
+]
+
+# The kernels below work on (tickers, bars) arrays with each ticker's bars
+# left-aligned and NaN-padded, so one call covers the whole universe. Values
+# before an indicator's warm-up period are NaN, like the JS nulls.
+
+
+def _shift(x: np.ndarray, bars: int) -> np.ndarray:
+    out = np.full_like(x, np.nan)
+    if bars < x.shape[1]:
+        out[:, bars:] = x[:, :x.shape[1] - bars]
+    return out
+
+
+def _rolling_sum(x: np.ndarray, window: int, start: int = 0) -> np.ndarray:
+    """Sum of the last `window` values from bar start + window - 1 on, via one cumulative sum"""
+    out = np.full_like(x, np.nan)
+    first = start + window - 1
+    if first >= x.shape[1]:
+        return out
+    total = np.cumsum(x[:, start:], axis=1)
+    out[:, first] = total[:, window - 1]
+    out[:, first + 1:] = total[:, window:] - total[:, :-window]
+    return out
+
+
+def _rolling_mean(x: np.ndarray, window: int, start: int = 0) -> np.ndarray:
+    return _rolling_sum(x, window, start) / window
+
+
+def _rolling_std(x: np.ndarray, window: int) -> np.ndarray:
+    """Population standard deviation, centred on each ticker's first value to keep the sums small"""
+    centred = x - x[:, :1]
+    mean = _rolling_mean(centred, window)
+    variance = _rolling_mean(centred * centred, window) - mean * mean
+    return np.sqrt(np.maximum(variance, 0))
+
+
+def _rolling_extreme(x: np.ndarray, window: int, ufunc) -> np.ndarray:
+    """Rolling max/min in O(n) whatever the window (van Herk/Gil-Werman block prefix and suffix scans)"""
+    rows, n = x.shape
+    out = np.full_like(x, np.nan)
+    if window > n:
+        return out
+    padded = np.concatenate([x, np.full((rows, -n % window), np.nan)], axis=1).reshape(rows, -1, window)
+    prefix = ufunc.accumulate(padded, axis=2).reshape(rows, -1)
+    suffix = ufunc.accumulate(padded[:, :, ::-1], axis=2)[:, :, ::-1].reshape(rows, -1)
+    out[:, window - 1:] = ufunc(suffix[:, :n - window + 1], prefix[:, window - 1:n])
+    return out
+
+
+def _ema(x: np.ndarray, period: int, start: int = 0, alpha: Optional[float] = None) -> np.ndarray:
+    """Exponential average seeded with the SMA of its first period values (Wilder's with alpha=1/period)"""
+    alpha = 2 / (period + 1) if alpha is None else alpha
+    out = np.full_like(x, np.nan)
+    first = start + period - 1
+    if first >= x.shape[1]:
+        return out
+    seed = x[:, start:first + 1].mean(axis=1)
+    out[:, first] = seed
+    if first + 1 < x.shape[1]:
+        out[:, first + 1:], _ = lfilter([alpha], [1, alpha - 1], x[:, first + 1:], axis=1,
+                                        zi=((1 - alpha) * seed)[:, None])
+    return out
+
+
+def _rsi(close: np.ndarray, period: int) -> np.ndarray:
+    change = np.diff(close, axis=1, prepend=np.nan)
+    average_gain = _ema(np.maximum(change, 0), period, start=1, alpha=1 / period)
+    average_loss = _ema(np.maximum(-change, 0), period, start=1, alpha=1 / period)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        rsi = 100 - 100 / (1 + average_gain / average_loss)
+    return np.where(average_loss == 0, 100.0, rsi)
+
+
+def _percent(numerator: np.ndarray, denominator: np.ndarray) -> np.ndarray:
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return numerator / denominator * 100
+
+
+def indicator_kernels(open_: np.ndarray, high: np.ndarray, low: np.ndarray, close: np.ndarray,
+                      volume: np.ndarray) -> Dict[str, np.ndarray]:
+    """Every INDICATOR_COLUMNS series for (tickers, bars) OHLCV arrays, each in O(bars) per ticker"""
+    out = {}
+    for period in (5, 10, 20, 50):
+        out[f"sma{period}"] = _rolling_mean(close, period)
+    for period in (5, 10, 12, 21, 26):
+        out[f"ema{period}"] = _ema(close, period)
+    out["ema21High"] = _ema(high, 21)
+    out["ema21Low"] = _ema(low, 21)
+    
+    out["rsi"] = _rsi(close, 14)
+    out["rsi7"] = _rsi(close, 7)
+    out["rsi21"] = _rsi(close, 21)
+    
+    out["macd"] = out["ema12"] - out["ema26"]
+    out["macdSignal"] = _ema(out["macd"], 9, start=25)
+    out["macdHistogram"] = out["macd"] - out["macdSignal"]
+    
+    deviation = _rolling_std(close, 20)
+    out["bbMiddle"] = out["sma20"]
+    out["bbUpper"] = out["sma20"] + 2 * deviation
+    out["bbLower"] = out["sma20"] - 2 * deviation
+    out["bbWidth"] = _percent(out["bbUpper"] - out["bbLower"], out["bbMiddle"])
+    
+    highest14 = _rolling_extreme(high, 14, np.maximum)
+    lowest14 = _rolling_extreme(low, 14, np.minimum)
+    stoch_range = highest14 - lowest14
+    out["stochK"] = np.where(stoch_range == 0, 0.0, _percent(close - lowest14, stoch_range))
+    out["stochD"] = _rolling_mean(out["stochK"], 3, start=13)
+    out["williamsR"] = -_percent(highest14 - close, stoch_range)
+    
+    highest20 = _rolling_extreme(high, 20, np.maximum)
+    lowest20 = _rolling_extreme(low, 20, np.minimum)
+    out["pricePosition"] = _percent(close - lowest20, highest20 - lowest20)
+    
+    previous_close = _shift(close, 1)
+    true_range = np.fmax(high - low, np.fmax(np.abs(high - previous_close), np.abs(low - previous_close)))
+    true_range[:, 0] = np.nan
+    out["atr"] = _ema(true_range, 14, start=1, alpha=1 / 14)
+    out["atrPercent"] = _percent(out["atr"], close)
+    
+    direction = np.sign(np.diff(close, axis=1, prepend=close[:, :1]))
+    out["obv"] = np.cumsum(direction * volume, axis=1)
+    
+    # CCI's mean absolute deviation is taken around each window's own mean, which
+    # no running sum can update, so it reads every window through a strided view
+    typical = (high + low + close) / 3
+    typical_mean = _rolling_mean(typical, 20)
+    out["cci"] = np.full_like(close, np.nan)
+    if close.shape[1] >= 20:
+        windows = sliding_window_view(typical, 20, axis=1)
+        mean_deviation = np.abs(windows - typical_mean[:, 19:, None]).mean(axis=2)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            out["cci"][:, 19:] = np.where(
+                mean_deviation == 0, 0.0, (typical[:, 19:] - typical_mean[:, 19:]) / (0.015 * mean_deviation)
+            )
+    
+    flow = typical * volume
+    typical_change = np.diff(typical, axis=1, prepend=np.nan)
+    positive_flow = _rolling_sum(np.where(typical_change > 0, flow, 0.0), 14, start=1)
+    negative_flow = _rolling_sum(np.where(typical_change < 0, flow, 0.0), 14, start=1)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        out["mfi"] = np.where(negative_flow == 0, 100.0, 100 - 100 / (1 + positive_flow / negative_flow))
+    out["mfi"][np.isnan(positive_flow)] = np.nan
+    
+    out["roc"] = _percent(close - _shift(close, 12), _shift(close, 12))
+    out["momentum"] = close - _shift(close, 10)
+    average_volume = _rolling_mean(volume, 20)
+    out["volumeRatio"] = np.where(average_volume == 0, 1.0, volume / np.where(average_volume == 0, 1, average_volume))
+    
+    bar_range = high - low
+    safe_range = np.where(bar_range > 0, bar_range, 1)
+    out["closePosition"] = np.where(bar_range > 0, (close - low) / safe_range, 0.5)
+    out["bodyRangeRatio"] = np.where(bar_range > 0, np.abs(close - open_) / safe_range, 0)
+    out["upperWickRatio"] = np.where(bar_range > 0, (high - np.maximum(open_, close)) / safe_range, 0)
+    out["lowerWickRatio"] = np.where(bar_range > 0, (np.minimum(open_, close) - low) / safe_range, 0)
+    for days in (1, 3, 5):
+        out[f"return{days}d"] = _percent(close - _shift(close, days), _shift(close, days))
+    
+    for name, base in (("SMA5", "sma5"), ("SMA20", "sma20"), ("SMA50", "sma50"), ("EMA21", "ema21")):
+        out[f"distFrom{name}"] = _percent(close - out[base], out[base])
+    for name, base in (("RSI", "rsi"), ("RSI7", "rsi7"), ("RSI21", "rsi21"), ("MACDHist", "macdHistogram"),
+                       ("StochK", "stochK"), ("CCI", "cci"), ("MFI", "mfi")):
+        out[f"delta{name}"] = out[base] - _shift(out[base], 1)
+    return out
+
+
+def compute_indicators(df: pd.DataFrame, options: IndicatorOptions) -> pd.DataFrame:
+    """Add indicator columns to OHLCV rows, computing every ticker in one batch of array kernels"""
+    names = options.names or INDICATOR_COLUMNS
+    unknown = [name for name in names if name not in INDICATOR_COLUMNS]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown indicators: {unknown}")
+    ohlcv = [options.open_column, options.high_column, options.low_column, options.close_column, options.volume_column]
+    missing = [c for c in ohlcv if c not in df.columns]
+    if options.ticker_column is not None and options.ticker_column not in df.columns:
+        missing.append(options.ticker_column)
+    if missing:
+        raise HTTPException(status_code=400, detail=f"Missing OHLCV columns: {missing}")
+    if len(df) == 0:
+        return df.assign(**{name: np.nan for name in names})
+    
+    # Scatter each ticker's bars, in date order, into one left-aligned row of a (tickers, bars) grid
+    if options.ticker_column is not None:
+        codes, _ = pd.factorize(df[options.ticker_column])
+    else:
+        codes = np.zeros(len(df), dtype=np.intp)
+    if options.date_column is not None and options.date_column in df.columns:
+        order = np.lexsort((pd.to_datetime(df[options.date_column]).to_numpy(), codes))
+    else:
+        order = np.argsort(codes, kind="stable")
+    counts = np.bincount(codes)
+    sorted_codes = codes[order]
+    bar = np.arange(len(df)) - np.repeat(np.cumsum(counts) - counts, counts)
+    
+    def grid(column):
+        values = np.full((len(counts), counts.max()), np.nan)
+        values[sorted_codes, bar] = df[column].to_numpy(dtype=np.float64, na_value=np.nan)[order]
+        return values
+    
+    open_, high, low, close, volume = (grid(c) for c in ohlcv)
+    series = indicator_kernels(open_, high, low, close, np.nan_to_num(volume))
+    
+    # Grid cell of every input row, so each column comes back with a single take
+    cell = np.empty(len(df), dtype=np.intp)
+    cell[order] = sorted_codes * close.shape[1] + bar
+    added = {}
+    for name in names:
+        lagged = _shift(series[name], options.lag) if options.lag else series[name]
+        added[name] = lagged.ravel().take(cell)
+    
+    if options.up_threshold is not None or options.down_threshold is not None:
+        # Like generateRegressionDataset: the bar's own return against the previous close
+        change = _percent(close - _shift(close, 1), _shift(close, 1)).ravel().take(cell)
+        up = options.up_threshold if options.up_threshold is not None else np.inf
+        down = options.down_threshold if options.down_threshold is not None else -np.inf
+        target = np.where(change >= up, 1.0, np.where(change <= down, 0.0, -1.0))
+        target[np.isnan(change)] = np.nan
+        added["priceChangePercent"] = change
+        added["target"] = target
+    
+    out = pd.concat([df.drop(columns=[c for c in added if c in df.columns]).reset_index(drop=True),
+                     pd.DataFrame(added)], axis=1)
+    if "target" in added:
+        keep = out["target"].notna() & (options.include_neutral | (out["target"] != -1))
+        out = out[keep.to_numpy()].reset_index(drop=True)
+        out["target"] = out["target"].astype(np.int64)
+    return out
+
+
+class _LiveEMA:
+    """Running counterpart of _ema: seeded with the SMA of the first period values"""
+    
+    def __init__(self, period: int, alpha: Optional[float] = None):
+        self.period = period
+        self.alpha = 2 / (period + 1) if alpha is None else alpha
+        self.count = 0
+        self.total = 0.0
+        self.value = np.nan
+    
+    def update(self, x: float) -> float:
+        self.count += 1
+        if self.count < self.period:
+            self.total += x
+        elif self.count == self.period:
+            self.value = (self.total + x) / self.period
+        else:
+            self.value = self.alpha * x + (1 - self.alpha) * self.value
+        return self.value
+
+
+class _LiveWindow:
+    """Running counterpart of _rolling_sum"""
+    
+    def __init__(self, size: int):
+        self.size = size
+        self.values = deque()
+        self.total = 0.0
+    
+    def update(self, x: float) -> float:
+        self.values.append(x)
+        self.total += x
+        if len(self.values) > self.size:
+            self.total -= self.values.popleft()
+        return self.total if len(self.values) == self.size else np.nan
+
+
+class _LiveExtreme:
+    """Running counterpart of _rolling_extreme: a monotonic deque, amortized O(1) per value"""
+    
+    def __init__(self, size: int, maximum: bool):
+        self.size = size
+        self.maximum = maximum
+        self.items = deque()  # (index, value), values strictly decreasing (max) or increasing (min)
+        self.count = 0
+    
+    def update(self, x: float) -> float:
+        while self.items and (self.items[-1][1] <= x if self.maximum else self.items[-1][1] >= x):
+            self.items.pop()
+        self.items.append((self.count, x))
+        if self.items[0][0] <= self.count - self.size:
+            self.items.popleft()
+        self.count += 1
+        return self.items[0][1] if self.count >= self.size else np.nan
+
+
+class LiveIndicatorState:
+    """One ticker's indicators, updated per bar in O(1) to the values compute_indicators gives"""
+    
+    def __init__(self):
+        self.bars = 0
+        self.closes = deque(maxlen=13)  # Current close and the 12 before it, for ROC
+        self.sma = {period: _LiveWindow(period) for period in (5, 10, 20, 50)}
+        self.ema = {period: _LiveEMA(period) for period in (5, 10, 12, 21, 26)}
+        self.ema_high = _LiveEMA(21)
+        self.ema_low = _LiveEMA(21)
+        self.rsi = {period: (_LiveEMA(period, 1 / period), _LiveEMA(period, 1 / period)) for period in (7, 14, 21)}
+        self.macd_signal = _LiveEMA(9)
+        self.centre = None  # First close; Bollinger sums are kept relative to it as in _rolling_std
+        self.centred = _LiveWindow(20)
+        self.centred_squares = _LiveWindow(20)
+        self.highest = {period: _LiveExtreme(period, True) for period in (14, 20)}
+        self.lowest = {period: _LiveExtreme(period, False) for period in (14, 20)}
+        self.stoch_d = _LiveWindow(3)
+        self.atr = _LiveEMA(14, 1 / 14)
+        self.obv = 0.0
+        self.typical = deque(maxlen=20)
+        self.typical_sum = _LiveWindow(20)
+        self.positive_flow = _LiveWindow(14)
+        self.negative_flow = _LiveWindow(14)
+        self.volume = _LiveWindow(20)
+        self.previous = None  # Last bar's row
+    
+    def update(self, bar: Dict[str, Any]) -> Dict[str, Any]:
+        """Advance by one bar and return its row: the bar's fields plus every INDICATOR_COLUMNS value"""
+        missing = [field for field in ("open", "high", "low", "close") if bar.get(field) is None]
+        if missing:
+            raise ValueError(f"Bar is missing {missing}")
+        open_, high, low, close = (np.float64(bar[field]) for field in ("open", "high", "low", "close"))
+        volume = np.float64(bar.get("volume") or 0)
+        previous = self.previous
+        previous_close = previous["close"] if previous else np.nan
+        self.closes.append(close)
+        out = {}
+        
+        with np.errstate(divide="ignore", invalid="ignore"):
+            for period, window in self.sma.items():
+                out[f"sma{period}"] = window.update(close) / period
+            for period, average in self.ema.items():
+                out[f"ema{period}"] = average.update(close)
+            out["ema21High"] = self.ema_high.update(high)
+            out["ema21Low"] = self.ema_low.update(low)
+            
+            for period, (gain, loss) in self.rsi.items():
+                name = "rsi" if period == 14 else f"rsi{period}"
+                if previous is None:
+                    out[name] = np.nan
+                    continue
+                average_gain = gain.update(max(close - previous_close, 0))
+                average_loss = loss.update(max(previous_close - close, 0))
+                out[name] = 100.0 if average_loss == 0 else 100 - 100 / (1 + average_gain / average_loss)
+            
+            out["macd"] = out["ema12"] - out["ema26"]
+            out["macdSignal"] = self.macd_signal.update(out["macd"]) if not np.isnan(out["macd"]) else np.nan
+            out["macdHistogram"] = out["macd"] - out["macdSignal"]
+            
+            if self.centre is None:
+                self.centre = close
+            centred = close - self.centre
+            mean = self.centred.update(centred) / 20
+            variance = self.centred_squares.update(centred * centred) / 20 - mean * mean
+            deviation = np.sqrt(max(variance, 0)) if not np.isnan(variance) else np.nan
+            out["bbMiddle"] = out["sma20"]
+            out["bbUpper"] = out["sma20"] + 2 * deviation
+            out["bbLower"] = out["sma20"] - 2 * deviation
+            out["bbWidth"] = _percent(out["bbUpper"] - out["bbLower"], out["bbMiddle"])
+            
+            highest14, lowest14 = self.highest[14].update(high), self.lowest[14].update(low)
+            stoch_range = highest14 - lowest14
+            out["stochK"] = 0.0 if stoch_range == 0 else _percent(close - lowest14, stoch_range)
+            out["stochD"] = self.stoch_d.update(out["stochK"]) / 3 if self.bars >= 13 else np.nan
+            out["williamsR"] = -_percent(highest14 - close, stoch_range)
+            highest20, lowest20 = self.highest[20].update(high), self.lowest[20].update(low)
+            out["pricePosition"] = _percent(close - lowest20, highest20 - lowest20)
+            
+            if previous is None:
+                out["atr"] = np.nan
+            else:
+                true_range = max(high - low, abs(high - previous_close), abs(low - previous_close))
+                out["atr"] = self.atr.update(true_range)
+            out["atrPercent"] = _percent(out["atr"], close)
+            
+            if previous is not None:
+                self.obv += np.sign(close - previous_close) * volume
+            out["obv"] = self.obv
+            
+            # CCI's mean deviation re-reads its 20 values: constant work per bar
+            typical = (high + low + close) / 3
+            self.typical.append(typical)
+            typical_mean = self.typical_sum.update(typical) / 20
+            if np.isnan(typical_mean):
+                out["cci"] = np.nan
+            else:
+                mean_deviation = sum(abs(value - typical_mean) for value in self.typical) / 20
+                out["cci"] = 0.0 if mean_deviation == 0 else (typical - typical_mean) / (0.015 * mean_deviation)
+            
+            if previous is None:
+                out["mfi"] = np.nan
+            else:
+                typical_change = typical - previous["typical"]
+                flow = typical * volume
+                positive_flow = self.positive_flow.update(flow if typical_change > 0 else 0.0)
+                negative_flow = self.negative_flow.update(flow if typical_change < 0 else 0.0)
+                if np.isnan(positive_flow):
+                    out["mfi"] = np.nan
+                else:
+                    out["mfi"] = 100.0 if negative_flow == 0 else 100 - 100 / (1 + positive_flow / negative_flow)
+            
+            def close_back(bars):
+                return self.closes[-1 - bars] if len(self.closes) > bars else np.nan
+            
+            out["roc"] = _percent(close - close_back(12), close_back(12))
+            out["momentum"] = close - close_back(10)
+            average_volume = self.volume.update(volume) / 20
+            out["volumeRatio"] = 1.0 if average_volume == 0 else volume / average_volume
+            
+            bar_range = high - low
+            out["closePosition"] = (close - low) / bar_range if bar_range > 0 else 0.5
+            out["bodyRangeRatio"] = abs(close - open_) / bar_range if bar_range > 0 else 0.0
+            out["upperWickRatio"] = (high - max(open_, close)) / bar_range if bar_range > 0 else 0.0
+            out["lowerWickRatio"] = (min(open_, close) - low) / bar_range if bar_range > 0 else 0.0
+            for days in (1, 3, 5):
+                out[f"return{days}d"] = _percent(close - close_back(days), close_back(days))
+            
+            for name, base in (("SMA5", "sma5"), ("SMA20", "sma20"), ("SMA50", "sma50"), ("EMA21", "ema21")):
+                out[f"distFrom{name}"] = _percent(close - out[base], out[base])
+            for name, base in (("RSI", "rsi"), ("RSI7", "rsi7"), ("RSI21", "rsi21"), ("MACDHist", "macdHistogram"),
+                               ("StochK", "stochK"), ("CCI", "cci"), ("MFI", "mfi")):
+                out[f"delta{name}"] = out[base] - previous[base] if previous else np.nan
+        
+        self.bars += 1
+        self.previous = {**out, "close": close, "typical": typical}
+        row = {**bar, "open": open_, "high": high, "low": low, "close": close, "volume": volume}
+        row.update((name, float(out[name])) for name in INDICATOR_COLUMNS)
+        return row
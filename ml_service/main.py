@@ -1,58 +1,67 @@
-from fastapi import FastAPI, HTTPException
+import time
+MODULE_LOAD_STARTED = time.perf_counter()
+
+from fastapi import FastAPI, HTTPException, Request, Depends, WebSocket, WebSocketDisconnect
+from fastapi.concurrency import run_in_threadpool
+from fastapi.exceptions import RequestValidationError
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
+from fastapi.responses import Response, StreamingResponse
+from pydantic import BaseModel, PrivateAttr, ValidationError
 from typing import List, Dict, Any, Optional
 import numpy as np
 import pandas as pd
-from sklearn.model_selection import train_test_split, cross_val_score, StratifiedKFold
+from sklearn.model_selection import train_test_split, StratifiedKFold
 from sklearn.preprocessing import StandardScaler, LabelEncoder
 from sklearn.metrics import (
     accuracy_score, precision_score, recall_score, f1_score,
     confusion_matrix, classification_report, roc_auc_score
 )
 from sklearn.impute import SimpleImputer
+from sklearn.utils.metaestimators import available_if
 import joblib
+from joblib import Parallel, delayed
+from threadpoolctl import threadpool_limits
 import os
+import io
+import copy
+import re
 import json
+import hashlib
+import importlib
+import importlib.util
+import uuid
+import queue
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager, contextmanager
+import contextvars
+import tracemalloc
+import asyncio
 from datetime import datetime
 
-# Import all ML models
-from sklearn.ensemble import (
-    RandomForestClassifier,
-    GradientBoostingClassifier,
-    AdaBoostClassifier,
-    ExtraTreesClassifier,
-    BaggingClassifier,
-    VotingClassifier
+from model_store import ModelStore, NATIVE_MODEL_FORMATS, model_summary, parse_compress
+from scheduler import CoreScheduler, run_in_processes, thread_limited_params
+from estimators import (
+    AVAILABLE_MODELS, CATBOOST_AVAILABLE, ESTIMATOR_COUNT_PARAMS, INCREMENTAL_UPDATES, LIGHTGBM_AVAILABLE,
+    PROBA_ARGMAX_MODELS, XGBOOST_AVAILABLE, holdout_metrics, import_report, load_model_class, predict_arrays
 )
-from sklearn.tree import DecisionTreeClassifier
-from sklearn.linear_model import LogisticRegression, RidgeClassifier, SGDClassifier
-from sklearn.svm import SVC
-from sklearn.neighbors import KNeighborsClassifier
-from sklearn.naive_bayes import GaussianNB
-from sklearn.neural_network import MLPClassifier
-from sklearn.discriminant_analysis import LinearDiscriminantAnalysis, QuadraticDiscriminantAnalysis
-
-# XGBoost, LightGBM, CatBoost
-try:
-    from xgboost import XGBClassifier
-    XGBOOST_AVAILABLE = True
-except ImportError:
-    XGBOOST_AVAILABLE = False
-
-try:
-    from lightgbm import LGBMClassifier
-    LIGHTGBM_AVAILABLE = True
-except ImportError:
-    LIGHTGBM_AVAILABLE = False
-
-try:
-    from catboost import CatBoostClassifier
-    CATBOOST_AVAILABLE = True
-except ImportError:
-    CATBOOST_AVAILABLE = False
-
-app = FastAPI(title="Stock ML Service", version="1.0.0")
+from indicators import INDICATOR_COLUMNS, IndicatorOptions, LiveIndicatorState, compute_indicators
+from backtest import backtest_windows, run_backtest
+from tuning import SEARCH_SPACES, run_tuning, validate_search_space
+
+# Arrow IPC request bodies
+PYARROW_AVAILABLE = importlib.util.find_spec("pyarrow") is not None
+
+
+@asynccontextmanager
+async def lifespan(app):
+    # Preloading runs in the background so the server accepts traffic right away
+    threading.Thread(target=preload_models, name="model-preload", daemon=True).start()
+    yield
+
+
+app = FastAPI(title="Stock ML Service", version="1.0.0", lifespan=lifespan)
 
 # Enable CORS
 app.add_middleware(
@@ -63,140 +72,356 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Store trained models in memory
-trained_models = {}
-model_history = []
-
-# Available models configuration
-AVAILABLE_MODELS = {
-    "random_forest": {
-        "name": "Random Forest",
-        "class": RandomForestClassifier,
-        "params": {"n_estimators": 100, "max_depth": 10, "random_state": 42, "n_jobs": -1},
-        "description": "Ensemble of decision trees with bagging"
-    },
-    "extra_trees": {
-        "name": "Extra Trees",
-        "class": ExtraTreesClassifier,
-        "params": {"n_estimators": 100, "max_depth": 10, "random_state": 42, "n_jobs": -1},
-        "description": "Extremely randomized trees"
-    },
-    "gradient_boosting": {
-        "name": "Gradient Boosting",
-        "class": GradientBoostingClassifier,
-        "params": {"n_estimators": 100, "max_depth": 5, "learning_rate": 0.1, "random_state": 42},
-        "description": "Sequential ensemble with gradient descent"
-    },
-    "adaboost": {
-        "name": "AdaBoost",
-        "class": AdaBoostClassifier,
-        "params": {"n_estimators": 100, "learning_rate": 0.1, "random_state": 42, "algorithm": "SAMME"},
-        "description": "Adaptive boosting algorithm"
-    },
-    "bagging": {
-        "name": "Bagging Classifier",
-        "class": BaggingClassifier,
-        "params": {"n_estimators": 50, "random_state": 42, "n_jobs": -1},
-        "description": "Bootstrap aggregating"
-    },
-    "decision_tree": {
-        "name": "Decision Tree",
-        "class": DecisionTreeClassifier,
-        "params": {"max_depth": 10, "random_state": 42},
-        "description": "Single decision tree classifier"
-    },
-    "logistic_regression": {
-        "name": "Logistic Regression",
-        "class": LogisticRegression,
-        "params": {"max_iter": 1000, "random_state": 42, "n_jobs": -1},
-        "description": "Linear model for classification"
-    },
-    "ridge_classifier": {
-        "name": "Ridge Classifier",
-        "class": RidgeClassifier,
-        "params": {"random_state": 42},
-        "description": "Ridge regression for classification"
-    },
-    "sgd_classifier": {
-        "name": "SGD Classifier",
-        "class": SGDClassifier,
-        "params": {"max_iter": 1000, "random_state": 42, "n_jobs": -1},
-        "description": "Stochastic Gradient Descent"
-    },
-    "svm": {
-        "name": "Support Vector Machine",
-        "class": SVC,
-        "params": {"kernel": "rbf", "probability": True, "random_state": 42},
-        "description": "Support Vector Classifier with RBF kernel"
-    },
-    "svm_linear": {
-        "name": "SVM Linear",
-        "class": SVC,
-        "params": {"kernel": "linear", "probability": True, "random_state": 42},
-        "description": "Support Vector Classifier with linear kernel"
-    },
-    "knn": {
-        "name": "K-Nearest Neighbors",
-        "class": KNeighborsClassifier,
-        "params": {"n_neighbors": 5, "n_jobs": -1},
-        "description": "Instance-based learning"
-    },
-    "naive_bayes": {
-        "name": "Naive Bayes",
-        "class": GaussianNB,
-        "params": {},
-        "description": "Gaussian Naive Bayes"
-    },
-    "mlp": {
-        "name": "Neural Network (MLP)",
-        "class": MLPClassifier,
-        "params": {"hidden_layer_sizes": (100, 50), "max_iter": 500, "random_state": 42},
-        "description": "Multi-layer Perceptron"
-    },
-    "lda": {
-        "name": "Linear Discriminant Analysis",
-        "class": LinearDiscriminantAnalysis,
-        "params": {},
-        "description": "Linear Discriminant Analysis"
-    },
-    "qda": {
-        "name": "Quadratic Discriminant Analysis",
-        "class": QuadraticDiscriminantAnalysis,
-        "params": {},
-        "description": "Quadratic Discriminant Analysis"
-    }
-}
+# Instrumentation: X-Timing response headers on every request (otherwise only when a
+# request sends "X-Timing: 1"), and histogram buckets for the /metrics endpoint
+TIMING_HEADERS = os.environ.get("TIMING_HEADERS", "0") == "1"
+SECONDS_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+BYTES_BUCKETS = tuple(1024 * 4 ** i for i in range(11))
+ROWS_BUCKETS = (1, 10, 100, 1000, 10000, 100000, 1000000, 10000000)
 
-# Add XGBoost if available
-if XGBOOST_AVAILABLE:
-    AVAILABLE_MODELS["xgboost"] = {
-        "name": "XGBoost",
-        "class": XGBClassifier,
-        "params": {"n_estimators": 100, "max_depth": 6, "learning_rate": 0.1, "random_state": 42, "n_jobs": -1, "eval_metric": "logloss"},
-        "description": "Extreme Gradient Boosting"
-    }
 
-# Add LightGBM if available
-if LIGHTGBM_AVAILABLE:
-    AVAILABLE_MODELS["lightgbm"] = {
-        "name": "LightGBM",
-        "class": LGBMClassifier,
-        "params": {"n_estimators": 100, "max_depth": 6, "learning_rate": 0.1, "random_state": 42, "n_jobs": -1, "verbose": -1},
-        "description": "Light Gradient Boosting Machine"
-    }
+def _label_value(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
 
-# Add CatBoost if available
-if CATBOOST_AVAILABLE:
-    AVAILABLE_MODELS["catboost"] = {
-        "name": "CatBoost",
-        "class": CatBoostClassifier,
-        "params": {"iterations": 100, "depth": 6, "learning_rate": 0.1, "random_state": 42, "verbose": False},
-        "description": "Categorical Boosting"
-    }
 
+class Histogram:
+    """Prometheus histogram with cumulative buckets per label combination"""
+    
+    def __init__(self, name: str, help_text: str, labelnames: tuple, buckets: tuple):
+        self.name = name
+        self.help_text = help_text
+        self.labelnames = labelnames
+        self.buckets = buckets
+        self._series = {}  # label values -> [bucket counts..., sum, count]
+        self._lock = threading.Lock()
+    
+    def observe(self, value: float, *labels):
+        index = next((i for i, bound in enumerate(self.buckets) if value <= bound), len(self.buckets))
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [0] * (len(self.buckets) + 3)
+            series[index] += 1
+            series[-2] += value
+            series[-1] += 1
+    
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = {labels: list(values) for labels, values in self._series.items()}
+        for labels, values in sorted(series.items()):
+            label_text = ",".join(f'{k}="{_label_value(v)}"' for k, v in zip(self.labelnames, labels))
+            prefix = label_text + "," if label_text else ""
+            cumulative = 0
+            for bound, count in zip(self.buckets + ("+Inf",), values):
+                cumulative += count
+                lines.append(f'{self.name}_bucket{{{prefix}le="{bound}"}} {cumulative}')
+            lines.append(f"{self.name}_sum{{{label_text}}} {values[-2]}")
+            lines.append(f"{self.name}_count{{{label_text}}} {values[-1]}")
+        return lines
+
+
+STAGE_SECONDS = Histogram(
+    "ml_stage_seconds", "Time spent in one processing stage of a request",
+    ("endpoint", "stage", "model_type"), SECONDS_BUCKETS
+)
+REQUEST_SECONDS = Histogram(
+    "ml_request_seconds", "Request latency until the response starts",
+    ("endpoint", "method", "status"), SECONDS_BUCKETS
+)
+REQUEST_BYTES = Histogram("ml_request_bytes", "Request body size", ("endpoint",), BYTES_BUCKETS)
+REQUEST_ROWS = Histogram("ml_request_rows", "Rows in the frame a request resolved", ("endpoint",), ROWS_BUCKETS)
+
+# Per-request state for stage(): the ASGI scope (for the route label) and accumulated timings
+request_context = contextvars.ContextVar("request_context", default=None)
+
+
+def _endpoint_label_for(scope) -> str:
+    """Route template (e.g. /models/{model_id}) so labels stay low-cardinality"""
+    route = scope.get("route")
+    return route.path if route is not None else "unmatched"
+
+
+def _endpoint_label() -> str:
+    context = request_context.get()
+    return _endpoint_label_for(context["scope"]) if context is not None else "background"
+
+
+def record_stage(name: str, seconds: float, model_type: Optional[str] = None, endpoint: Optional[str] = None):
+    """Record a stage measured elsewhere, e.g. a fit timed inside a worker process"""
+    STAGE_SECONDS.observe(seconds, endpoint or _endpoint_label(), name, model_type or "")
+    context = request_context.get()
+    if context is not None:
+        context["timings"][name] = context["timings"].get(name, 0.0) + seconds
+
+
+@contextmanager
+def stage(name: str, model_type: Optional[str] = None, memory: Optional[Dict[str, float]] = None):
+    """Time a block as one stage of the current request (or of background work).
+
+    With a memory dict, also stores the peak MB the block allocated under
+    tracemalloc, which sees NumPy buffers but not native booster memory.
+    """
+    traced = memory is not None and not tracemalloc.is_tracing()
+    if traced:
+        tracemalloc.start()
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_stage(name, time.perf_counter() - started, model_type)
+        if traced and tracemalloc.is_tracing():
+            memory[name] = round(max(memory.get(name, 0.0), tracemalloc.get_traced_memory()[1] / 2 ** 20), 3)
+            tracemalloc.stop()
+
+
+def observe_rows(rows: int):
+    REQUEST_ROWS.observe(rows, _endpoint_label())
+
+
+@app.middleware("http")
+async def instrument_requests(request: Request, call_next):
+    """Record latency and body size per route; add X-Timing with per-stage milliseconds on request"""
+    context = {"scope": request.scope, "timings": {}}
+    token = request_context.set(context)
+    started = time.perf_counter()
+    try:
+        response = await call_next(request)
+    finally:
+        request_context.reset(token)
+    elapsed = time.perf_counter() - started
+    
+    endpoint = _endpoint_label_for(request.scope)
+    REQUEST_SECONDS.observe(elapsed, endpoint, request.method, str(response.status_code))
+    content_length = request.headers.get("content-length")
+    if content_length and content_length.isdigit():
+        REQUEST_BYTES.observe(int(content_length), endpoint)
+    
+    if TIMING_HEADERS or request.headers.get("x-timing") == "1":
+        stages = [f"{name};dur={seconds * 1000:.2f}" for name, seconds in context["timings"].items()]
+        response.headers["X-Timing"] = ", ".join(stages + [f"total;dur={elapsed * 1000:.2f}"])
+    return response
+
+
+MODELS_DIR = "saved_models"
+MODEL_MEMORY_BUDGET_MB = float(os.environ.get("MODEL_MEMORY_BUDGET_MB", "2048"))
+MODEL_EVICTION_POLICY = os.environ.get("MODEL_EVICTION_POLICY", "lru")  # lru or lfu
+MODEL_MMAP_MIN_MB = float(os.environ.get("MODEL_MMAP_MIN_MB", "64"))
+
+# Multi-worker serving: WEB_WORKERS uvicorn processes share models through a versioned manifest
+# in MODELS_DIR (on by default with more than one worker); each worker sees other workers'
+# changes within REGISTRY_POLL_SECONDS and maps shared model files read-only
+WEB_WORKERS = int(os.environ.get("WEB_WORKERS", "1"))
+SHARED_MODELS = os.environ.get("SHARED_MODELS", "1" if WEB_WORKERS > 1 else "0") == "1"
+REGISTRY_POLL_SECONDS = float(os.environ.get("REGISTRY_POLL_SECONDS", "1"))
+
+# Model files: joblib compression of the pickled entry ("0" for none, a zlib level, or
+# "<codec>:<level>" such as "lz4:3"); compressed files cannot be memory-mapped.
+# save-all/load-all read and write MODEL_IO_WORKERS files at a time
+MODEL_COMPRESS = os.environ.get("MODEL_COMPRESS", "0")
+MODEL_IO_WORKERS = int(os.environ.get("MODEL_IO_WORKERS", "8"))
+
+# Store trained models in memory, spilling to disk beyond the memory budget
+trained_models = ModelStore(
+    MODELS_DIR,
+    MODEL_MEMORY_BUDGET_MB * 1024 * 1024,
+    MODEL_EVICTION_POLICY,
+    MODEL_MMAP_MIN_MB * 1024 * 1024,
+    shared=SHARED_MODELS,
+    poll_seconds=REGISTRY_POLL_SECONDS,
+    compress=parse_compress(MODEL_COMPRESS),
+    # A predict batcher holds its model; let it go with the resident entry
+    on_drop=lambda model_id: _forget_predict_batcher(model_id)
+)
+
+# Uploaded datasets kept in columnar form, keyed by content hash (least recently used first)
+DATASETS_DIR = os.environ.get("DATASETS_DIR", "saved_datasets")
+DATASET_CACHE_SIZE = int(os.environ.get("DATASET_CACHE_SIZE", "8"))
+datasets = OrderedDict()
+datasets_lock = threading.Lock()
+
+# Low-latency /predict: inline requests up to this many rows use the compiled NumPy path,
+# and concurrent requests for one model are merged after waiting this long (0 = no wait)
+FAST_PREDICT_MAX_ROWS = int(os.environ.get("FAST_PREDICT_MAX_ROWS", "64"))
+PREDICT_BATCH_WINDOW_MS = float(os.environ.get("PREDICT_BATCH_WINDOW_MS", "0"))
+predict_batchers = {}
+predict_batchers_lock = threading.Lock()
+
+# Process-parallel /compare: cores shared by concurrent fits and per-model timeout in seconds
+COMPARE_CPU_BUDGET = int(os.environ.get("COMPARE_CPU_BUDGET", os.cpu_count() or 1))
+COMPARE_MODEL_TIMEOUT = float(os.environ.get("COMPARE_MODEL_TIMEOUT", "300"))
+
+# /tune: default seconds a search may run before unfinished trials are stopped
+TUNE_TIME_BUDGET = float(os.environ.get("TUNE_TIME_BUDGET", "300"))
+
+# Cross-validation: cores shared by the fold fits (and the holdout fit run alongside them)
+CV_CPU_BUDGET = int(os.environ.get("CV_CPU_BUDGET", os.cpu_count() or 1))
+
+# Lean training: rows per StandardScaler.partial_fit chunk when scaling the float32 matrix
+LEAN_CHUNK_ROWS = int(os.environ.get("LEAN_CHUNK_ROWS", "16384"))
+
+# Out-of-core training: source_path files must sit under SOURCE_ROOT and are read this many
+# rows at a time into float32 memmaps kept in SOURCE_CACHE_DIR (the newest SOURCE_CACHE_KEEP
+# survive); imputation medians come from a uniform sample of SOURCE_SAMPLE_ROWS rows
+SOURCE_ROOT = os.environ.get("SOURCE_ROOT", "data")
+SOURCE_CHUNK_ROWS = int(os.environ.get("SOURCE_CHUNK_ROWS", "250000"))
+SOURCE_SAMPLE_ROWS = int(os.environ.get("SOURCE_SAMPLE_ROWS", "1000000"))
+SOURCE_CACHE_DIR = os.environ.get("SOURCE_CACHE_DIR", os.path.join(DATASETS_DIR, "sources"))
+SOURCE_CACHE_KEEP = int(os.environ.get("SOURCE_CACHE_KEEP", "4"))
+sources_lock = threading.Lock()
+
+# Background training jobs: worker threads, queued-job limit and finished jobs kept for polling
+JOB_WORKERS = int(os.environ.get("JOB_WORKERS", "2"))
+JOB_QUEUE_DEPTH = int(os.environ.get("JOB_QUEUE_DEPTH", "32"))
+JOB_HISTORY_LIMIT = int(os.environ.get("JOB_HISTORY_LIMIT", "100"))
+jobs = OrderedDict()
+jobs_lock = threading.Lock()
+job_queue = queue.PriorityQueue()
+job_workers = []
+
+# Memoized fit results: entries kept and seconds before an entry expires (0 = never)
+RESULT_CACHE_SIZE = int(os.environ.get("RESULT_CACHE_SIZE", "256"))
+RESULT_CACHE_TTL = float(os.environ.get("RESULT_CACHE_TTL", "3600"))
+
+
+class ResultCache:
+    """Bounded, expiring memo of fit results keyed by content fingerprints.
+
+    Entries are grouped by kind (train, cv, compare, subset) for the hit/miss
+    counters; keys already include the kind so kinds never collide.
+    """
+
+    def __init__(self, max_entries: int, ttl: float):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()  # key -> (stored_at, kind, value), least recent first
+        self._lock = threading.Lock()
+        self.hits = {}
+        self.misses = {}
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, kind: str, key: str, usable=None):
+        """Cached value for key, or None; usable(value) can reject an entry as a miss"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and self.ttl > 0 and time.monotonic() - entry[0] > self.ttl:
+                del self._entries[key]
+                self.expirations += 1
+                entry = None
+            if entry is None or (usable is not None and not usable(entry[2])):
+                self.misses[kind] = self.misses.get(kind, 0) + 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits[kind] = self.hits.get(kind, 0) + 1
+            return entry[2]
+
+    def put(self, kind: str, key: str, value):
+        with self._lock:
+            if self.max_entries <= 0:
+                return
+            self._entries[key] = (time.monotonic(), kind, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def discard(self, predicate):
+        """Drop every entry whose value matches predicate(value)"""
+        with self._lock:
+            for key in [k for k, (_, _, value) in self._entries.items() if predicate(value)]:
+                del self._entries[key]
+
+    def clear(self) -> int:
+        with self._lock:
+            count = len(self._entries)
+            self._entries.clear()
+            return count
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            entries = {}
+            for _, kind, _ in self._entries.values():
+                entries[kind] = entries.get(kind, 0) + 1
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl,
+                "entries_by_kind": entries,
+                "hits": dict(self.hits),
+                "misses": dict(self.misses),
+                "evictions": self.evictions,
+                "expirations": self.expirations
+            }
+
+
+result_cache = ResultCache(RESULT_CACHE_SIZE, RESULT_CACHE_TTL)
+
+# CPU scheduler: cores on the box, cores kept back for /predict traffic, the most cores one
+# lease takes when a request does not ask for fewer, and seconds to wait for a lease (then 503)
+CPU_TOTAL = int(os.environ.get("CPU_TOTAL", os.cpu_count() or 1))
+PREDICT_RESERVED_CORES = int(os.environ.get("PREDICT_RESERVED_CORES", "1" if CPU_TOTAL > 2 else "0"))
+CPU_LEASE_MAX = int(os.environ.get("CPU_LEASE_MAX", "0")) or None
+CPU_LEASE_TIMEOUT = float(os.environ.get("CPU_LEASE_TIMEOUT", "300"))
+cpu_scheduler = CoreScheduler(CPU_TOTAL, PREDICT_RESERVED_CORES, CPU_LEASE_MAX, CPU_LEASE_TIMEOUT)
 
-class TrainRequest(BaseModel):
-    data: List[Dict[str, Any]]
+
+def leased(cores: Optional[int], make_events):
+    """Generator running make_events(granted_cores) while holding a core lease.
+
+    The lease is taken when iteration starts, so a streamed response only
+    holds cores while it is being produced.
+    """
+    with cpu_scheduler.lease(cores) as lease:
+        yield from make_events(lease["cores"])
+
+
+# Model types to import (and, with WARMUP_FIT, fit once on a tiny dataset) after startup:
+# a comma-separated list of model ids, "all", or empty for fully lazy imports
+PRELOAD_MODELS = os.environ.get("PRELOAD_MODELS", "")
+WARMUP_FIT = os.environ.get("WARMUP_FIT", "0") == "1"
+# Also load saved models (newest first, up to the memory budget) for a warm restart
+PRELOAD_SAVED_MODELS = os.environ.get("PRELOAD_SAVED_MODELS", "0") == "1"
+preload_status = {"status": "idle", "models": [], "errors": {}}
+
+
+def preload_models():
+    """Import the PRELOAD_MODELS estimators and optionally warm them up with a tiny fit"""
+    if PRELOAD_MODELS.strip() == "all":
+        model_types = list(AVAILABLE_MODELS)
+    else:
+        model_types = [m.strip() for m in PRELOAD_MODELS.split(",") if m.strip() in AVAILABLE_MODELS]
+    
+    preload_status.update({"status": "running", "models": model_types})
+    rng = np.random.default_rng(42)
+    X = rng.normal(size=(40, 4))
+    y = np.arange(40) % 2
+    
+    for model_type in model_types:
+        try:
+            model_class = load_model_class(model_type)
+            if WARMUP_FIT:
+                started = time.perf_counter()
+                params = thread_limited_params(model_type, AVAILABLE_MODELS[model_type]["params"], 1)
+                model_class(**params).fit(X, y)
+                import_report[model_type]["warmup_seconds"] = time.perf_counter() - started
+        except Exception as e:
+            preload_status["errors"][model_type] = str(e)
+    
+    if PRELOAD_SAVED_MODELS:
+        preload_status["saved_models"] = load_saved_models()
+    
+    preload_status["status"] = "done"
+
+
+class RowsRequest(BaseModel):
+    data: Optional[List[Dict[str, Any]]] = None
+    dataset_id: Optional[str] = None  # Use a dataset uploaded via /datasets instead of data
+    indicators: Optional[IndicatorOptions] = None  # Compute indicator features from OHLCV columns first
+    _frame: Optional[pd.DataFrame] = PrivateAttr(default=None)  # Decoded binary body columns
+
+
+class TrainRequest(RowsRequest):
     features: List[str]
     target: str
     model_type: str
@@ -206,20 +431,116 @@ class TrainRequest(BaseModel):
     custom_params: Optional[Dict[str, Any]] = None
     model_name: Optional[str] = None  # Custom name for the model
     skip_save: bool = False  # If True, don't save model to memory (for feature selection testing)
+    cv_n_jobs: Optional[int] = None  # Cores for CV fits, defaults to CV_CPU_BUDGET
+    fold_ensemble: bool = False  # Save the CV fold models (fit on the training split) as one averaged model
+    lean: bool = False  # Build one float32 matrix, impute/scale it in place and split by row ranges
+    source_path: Optional[str] = None  # Train out of core from a Parquet/CSV/.npy file under SOURCE_ROOT (no CV)
+    epochs: int = 1  # Passes over the chunks for partial_fit models trained from source_path
+    profile_memory: bool = False  # Report each stage's peak allocated MB (always on when lean)
+
+
+class IndicatorsRequest(RowsRequest):
+    indicators: IndicatorOptions = IndicatorOptions()
+    latest_only: bool = False  # Return only each ticker's most recent bar
+    save_as_dataset: bool = False  # Store the rows as a dataset instead of returning them
+    name: Optional[str] = None  # Dataset name when saving as a dataset
 
 
-class PredictRequest(BaseModel):
-    data: List[Dict[str, Any]]
+class PredictRequest(RowsRequest):
     features: List[str]
     model_id: str
 
 
-class CompareModelsRequest(BaseModel):
-    data: List[Dict[str, Any]]
+class BatchPredictRequest(RowsRequest):
+    model_ids: List[str]
+
+
+class ScoreUniverseRequest(RowsRequest):
+    model_ids: List[str]
+    ticker_column: str = "ticker"
+    rank_class: Optional[Any] = None  # Class whose probability ranks rows, defaults to each model's last class
+    top_k: Optional[int] = None  # Keep only the best k rows per ranking
+    threshold: Optional[float] = None  # Keep only rows whose ranking probability reaches this
+    include_probabilities: bool = False  # Add every class probability to each ranked row
+
+
+class CompareModelsRequest(RowsRequest):
     features: List[str]
     target: str
     models: List[str]
     test_size: float = 0.2
+    max_workers: Optional[int] = None  # Concurrent fits, defaults to COMPARE_CPU_BUDGET
+    timeout: Optional[float] = None  # Per-model seconds, defaults to COMPARE_MODEL_TIMEOUT
+    stream: bool = False  # Stream each result as NDJSON as soon as its model finishes
+    lean: bool = False  # Build one float32 matrix, impute/scale it in place and split by row ranges
+    source_path: Optional[str] = None  # Compare out of core on a Parquet/CSV/.npy file under SOURCE_ROOT
+
+
+class FeatureSelectionRequest(RowsRequest):
+    features: List[str]
+    target: str
+    model_type: str
+    method: str = "forward"  # forward, backward or recursive
+    test_size: float = 0.2
+    max_features: Optional[int] = None  # Stop forward selection at this many features
+    min_features: int = 1  # Stop backward/recursive elimination at this many features
+    min_improvement: float = 0.0  # Forward selection stops when no candidate beats this gain
+    custom_params: Optional[Dict[str, Any]] = None
+    n_jobs: int = -1  # Parallel candidate evaluations
+    stream: bool = True  # Stream NDJSON progress events instead of one JSON response
+
+
+class BacktestRequest(RowsRequest):
+    features: List[str]
+    target: str
+    model_type: str
+    date_column: str = "date"
+    mode: str = "expanding"  # expanding or rolling training window
+    train_periods: int = 252  # Distinct dates in the first (expanding) or every (rolling) training window
+    test_periods: int = 21  # Distinct dates scored per window
+    step: Optional[int] = None  # Dates between window starts, defaults to test_periods
+    gap: int = 0  # Dates left out between training and test to avoid label overlap
+    custom_params: Optional[Dict[str, Any]] = None
+    warm_start: bool = True  # Update partial_fit models with new rows instead of refitting (expanding only)
+    n_jobs: int = -1  # Parallel window fits
+    stream: bool = True  # Stream NDJSON per-window events instead of one JSON response
+
+
+class TuneRequest(RowsRequest):
+    features: List[str]
+    target: str
+    model_type: str
+    search_space: Optional[Dict[str, Any]] = None  # Overrides SEARCH_SPACES for this model
+    custom_params: Optional[Dict[str, Any]] = None  # Fixed params applied under every sampled config
+    method: str = "halving"  # halving (one bracket) or hyperband (several brackets)
+    resource: str = "rows"  # Budget grown per rung: training rows or number of estimators
+    n_candidates: int = 27  # Configs in the first rung of a halving search
+    eta: int = 3  # Keep 1/eta of the configs and grow the resource eta-fold per rung
+    min_resource: Optional[int] = None  # Rows or estimators in the first rung
+    max_estimators: int = 1000  # Tree cap for early-stopped boosters and the estimators resource
+    early_stopping_rounds: int = 50  # xgboost, lightgbm and catboost only; 0 disables
+    metric: str = "accuracy"  # accuracy, precision, recall or f1_score on the validation rows
+    test_size: float = 0.2
+    validation_size: float = 0.25  # Share of the training split that scores trials
+    time_budget: Optional[float] = None  # Search seconds, defaults to TUNE_TIME_BUDGET
+    max_workers: Optional[int] = None  # Concurrent trials, defaults to COMPARE_CPU_BUDGET
+    seed: int = 42
+    cross_validation: bool = False  # Cross-validate the final fit of the best config
+    cv_folds: int = 5
+    model_name: Optional[str] = None
+    stream: bool = True  # Stream NDJSON trial events instead of one JSON response
+
+
+class ModelUpdateRequest(RowsRequest):
+    eval_size: float = 0.2  # Latest share of the new rows held out to compare old and new model
+    boost_rounds: int = 10  # Trees added to xgboost, lightgbm and catboost models
+    update_preprocessing: Optional[bool] = None  # Default: on for partial_fit models, off for boosters
+
+
+class DatasetRequest(BaseModel):
+    data: Optional[List[Dict[str, Any]]] = None
+    name: Optional[str] = None
+    _frame: Optional[pd.DataFrame] = PrivateAttr(default=None)
 
 
 class FeatureImportanceRequest(BaseModel):
@@ -227,6 +548,552 @@ class FeatureImportanceRequest(BaseModel):
     top_n: int = 20
 
 
+def prepare_training_data(df: pd.DataFrame, features: List[str], target: str, model_type: Optional[str] = None,
+                          memory: Optional[Dict[str, float]] = None):
+    """Validate, impute, encode and scale a training frame.
+
+    Returns (X_scaled, y, imputer, scaler, label_encoder, original_classes).
+    memory collects each stage's peak allocation, as stage() describes.
+    Imputation and scaling are column-wise, so any column subset of X_scaled
+    equals what preprocessing that subset on its own would produce.
+    """
+    # Validate features and target
+    missing_features = [f for f in features if f not in df.columns]
+    if missing_features:
+        raise HTTPException(status_code=400, detail=f"Missing features: {missing_features}")
+    
+    if target not in df.columns:
+        raise HTTPException(status_code=400, detail=f"Target column not found: {target}")
+    
+    # Prepare features and target
+    X = df[features].copy()
+    y = df[target].copy()
+    
+    # Handle missing values
+    with stage("impute", model_type, memory):
+        imputer = SimpleImputer(strategy='median')
+        X = pd.DataFrame(imputer.fit_transform(X), columns=features)
+    
+    # Remove rows where target is null
+    mask = y.notna()
+    X = X[mask.values]
+    y = y[mask]
+    
+    # Encode target if needed
+    label_encoder = None
+    if y.dtype == 'object' or isinstance(y.iloc[0], str):
+        label_encoder = LabelEncoder()
+        original_classes = y.unique().tolist()
+        y = label_encoder.fit_transform(y)
+    else:
+        original_classes = sorted(y.unique().tolist())
+    
+    # Scale features
+    with stage("scale", model_type, memory):
+        scaler = StandardScaler()
+        X_scaled = scaler.fit_transform(X)
+    
+    return X_scaled, y, imputer, scaler, label_encoder, original_classes
+
+
+def median_imputer(features: List[str], medians: np.ndarray) -> SimpleImputer:
+    """Fitted median SimpleImputer with the given statistics, for medians computed elsewhere"""
+    # The median of a one-row frame is that row, so fitting on the medians reproduces them
+    imputer = SimpleImputer(strategy='median')
+    imputer.fit(pd.DataFrame([medians], columns=features))
+    return imputer
+
+
+def prepare_lean_training_data(df: pd.DataFrame, features: List[str], target: str, test_size: float,
+                               model_type: Optional[str] = None, memory: Optional[Dict[str, float]] = None):
+    """prepare_training_data into one C-contiguous float32 matrix, imputed and scaled in place.
+
+    The split is drawn on row indices first and rows are written in split
+    order, so X_scaled[:n_train] and X_scaled[n_train:] are the training and
+    holdout sets as views. Columns are converted one at a time, keeping peak
+    memory near one float32 matrix instead of several float64 copies.
+    Returns (X_scaled, y, n_train, imputer, scaler, label_encoder, original_classes).
+    """
+    missing_features = [f for f in features if f not in df.columns]
+    if missing_features:
+        raise HTTPException(status_code=400, detail=f"Missing features: {missing_features}")
+    
+    if target not in df.columns:
+        raise HTTPException(status_code=400, detail=f"Target column not found: {target}")
+    
+    # Encode the target rows that will be kept
+    mask = df[target].notna().to_numpy()
+    y = df[target][mask]
+    label_encoder = None
+    if y.dtype == 'object' or isinstance(y.iloc[0], str):
+        label_encoder = LabelEncoder()
+        original_classes = y.unique().tolist()
+        y = label_encoder.fit_transform(y)
+    else:
+        original_classes = sorted(y.unique().tolist())
+        y = y.to_numpy()
+    
+    with stage("split", model_type, memory):
+        train_idx, test_idx = train_test_split(
+            np.arange(len(y)), test_size=test_size, random_state=42, stratify=y
+        )
+        split_order = np.concatenate([train_idx, test_idx])
+        order = np.flatnonzero(mask)[split_order]
+        y = y[split_order]
+    
+    # Medians come from every row, as the imputer in prepare_training_data sees them
+    with stage("impute", model_type, memory):
+        X_scaled = np.empty((len(order), len(features)), dtype=np.float32)
+        medians = np.empty(len(features))
+        for j, feature in enumerate(features):
+            column = df[feature].to_numpy(dtype=np.float32, na_value=np.nan)
+            medians[j] = np.nanmedian(column) if not np.isnan(column).all() else np.nan
+            column = column[order]
+            column[np.isnan(column)] = medians[j]
+            X_scaled[:, j] = column
+        imputer = median_imputer(features, medians)
+    
+    with stage("scale", model_type, memory):
+        scaler = StandardScaler()
+        for start in range(0, len(X_scaled), LEAN_CHUNK_ROWS):
+            scaler.partial_fit(pd.DataFrame(X_scaled[start:start + LEAN_CHUNK_ROWS], columns=features, copy=False))
+        X_scaled -= scaler.mean_.astype(np.float32)
+        X_scaled /= scaler.scale_.astype(np.float32)
+    
+    return X_scaled, y, len(train_idx), imputer, scaler, label_encoder, original_classes
+
+
+def _dataset_path(dataset_id: str, ext: str) -> str:
+    if not re.fullmatch(r"ds_[0-9a-f]+", dataset_id):
+        raise HTTPException(status_code=400, detail=f"Invalid dataset id: {dataset_id}")
+    return os.path.join(DATASETS_DIR, f"{dataset_id}.{ext}")
+
+
+def _cache_dataset(dataset_id: str, entry: Dict[str, Any]):
+    """Insert into the in-memory dataset cache, evicting the least recently used"""
+    with datasets_lock:
+        datasets[dataset_id] = entry
+        datasets.move_to_end(dataset_id)
+        while len(datasets) > DATASET_CACHE_SIZE:
+            datasets.popitem(last=False)
+
+
+def register_dataset(df: pd.DataFrame, name: Optional[str] = None) -> Dict[str, Any]:
+    """Store a frame column-wise in memory and on disk under its content hash"""
+    digest = hashlib.sha256(json.dumps([str(c) for c in df.columns]).encode())
+    digest.update(pd.util.hash_pandas_object(df, index=False).values.tobytes())
+    dataset_id = f"ds_{digest.hexdigest()[:24]}"
+    
+    with datasets_lock:
+        cached = datasets.get(dataset_id)
+    if cached is not None:
+        return {**cached["info"], "created": False}
+    
+    info = {
+        "dataset_id": dataset_id,
+        "name": name,
+        "rows": len(df),
+        "columns": [str(c) for c in df.columns],
+        "nbytes": int(df.memory_usage(index=False, deep=True).sum()),
+        "created_at": datetime.now().isoformat()
+    }
+    
+    # Spill to disk so the dataset survives eviction and restarts
+    created = not os.path.exists(_dataset_path(dataset_id, "joblib"))
+    if created:
+        os.makedirs(DATASETS_DIR, exist_ok=True)
+        joblib.dump({c: df[c].to_numpy() for c in df.columns}, _dataset_path(dataset_id, "joblib"))
+        with open(_dataset_path(dataset_id, "json"), "w") as f:
+            json.dump(info, f)
+    else:
+        with open(_dataset_path(dataset_id, "json")) as f:
+            info = json.load(f)
+    
+    _cache_dataset(dataset_id, {"frame": df.reset_index(drop=True), "info": info})
+    return {**info, "created": created}
+
+
+def get_dataset(dataset_id: str) -> pd.DataFrame:
+    """Fetch a registered dataset from memory, falling back to its disk copy"""
+    with datasets_lock:
+        cached = datasets.get(dataset_id)
+        if cached is not None:
+            datasets.move_to_end(dataset_id)
+            return cached["frame"]
+    
+    filepath = _dataset_path(dataset_id, "joblib")
+    if not os.path.exists(filepath):
+        raise HTTPException(status_code=404, detail=f"Dataset not found: {dataset_id}")
+    
+    df = pd.DataFrame(joblib.load(filepath))
+    with open(_dataset_path(dataset_id, "json")) as f:
+        info = json.load(f)
+    _cache_dataset(dataset_id, {"frame": df, "info": info})
+    return df
+
+
+def request_frame(request) -> pd.DataFrame:
+    """Resolve the binary body, registered dataset or inline rows a request refers to"""
+    with stage("frame"):
+        if request._frame is not None:
+            df = request._frame
+        elif request.dataset_id:
+            df = get_dataset(request.dataset_id)
+        elif request.data is None:
+            raise HTTPException(status_code=400, detail="Either data or dataset_id is required")
+        else:
+            df = pd.DataFrame(request.data)
+    if request.indicators is not None:
+        with stage("indicators"):
+            df = compute_indicators(df, request.indicators)
+    observe_rows(len(df))
+    return df
+
+
+def resolve_source_path(path: str) -> str:
+    """Absolute path of a server-local data source, which must sit under SOURCE_ROOT"""
+    root = os.path.realpath(SOURCE_ROOT)
+    resolved = os.path.realpath(os.path.join(root, path))
+    if os.path.commonpath([root, resolved]) != root:
+        raise HTTPException(status_code=400, detail=f"Source path must be inside {SOURCE_ROOT}: {path}")
+    if not os.path.exists(resolved):
+        raise HTTPException(status_code=404, detail=f"Source not found: {path}")
+    return resolved
+
+
+def _source_format(path: str) -> str:
+    if os.path.isdir(path):
+        return "npy_dir"
+    ext = os.path.splitext(path)[1].lower()
+    if ext in (".parquet", ".pq"):
+        if not PYARROW_AVAILABLE:
+            raise HTTPException(status_code=400, detail="Reading Parquet requires pyarrow")
+        return "parquet"
+    if ext in (".csv", ".gz", ".bz2", ".zip", ".xz"):
+        return "csv"
+    if ext == ".npy":
+        return "npy"
+    raise HTTPException(status_code=400, detail=f"Unsupported source format: {ext or path}")
+
+
+def _npy_columns(path: str, fmt: str) -> Dict[str, np.ndarray]:
+    """Memory-mapped columns of a structured .npy file or a directory of <column>.npy files"""
+    if fmt == "npy_dir":
+        return {
+            filename[:-4]: np.load(os.path.join(path, filename), mmap_mode="r")
+            for filename in sorted(os.listdir(path)) if filename.endswith(".npy")
+        }
+    array = np.load(path, mmap_mode="r")
+    if array.dtype.names is None:
+        raise HTTPException(status_code=400, detail="A .npy source must be a structured array with named fields")
+    return {name: array[name] for name in array.dtype.names}
+
+
+def source_columns(path: str) -> List[str]:
+    """Column names of a data source, read from its schema without loading rows"""
+    fmt = _source_format(path)
+    if fmt == "parquet":
+        return importlib.import_module("pyarrow.parquet").ParquetFile(path).schema_arrow.names
+    if fmt == "csv":
+        return [str(c) for c in pd.read_csv(path, nrows=0).columns]
+    return list(_npy_columns(path, fmt))
+
+
+def iter_source_chunks(path: str, columns: List[str]):
+    """Yield frames of only the given columns, SOURCE_CHUNK_ROWS rows at a time.
+
+    Parquet is read batch by batch, CSV with pandas' chunked reader, and .npy
+    columns are memory-mapped and sliced, so memory stays at one chunk.
+    """
+    fmt = _source_format(path)
+    if fmt == "parquet":
+        parquet_file = importlib.import_module("pyarrow.parquet").ParquetFile(path)
+        for batch in parquet_file.iter_batches(batch_size=SOURCE_CHUNK_ROWS, columns=columns):
+            yield batch.to_pandas()
+    elif fmt == "csv":
+        with pd.read_csv(path, usecols=columns, chunksize=SOURCE_CHUNK_ROWS) as reader:
+            yield from reader
+    else:
+        arrays = _npy_columns(path, fmt)
+        rows = len(arrays[columns[0]])
+        for start in range(0, rows, SOURCE_CHUNK_ROWS):
+            yield pd.DataFrame({c: arrays[c][start:start + SOURCE_CHUNK_ROWS] for c in columns})
+
+
+def source_fingerprint(path: str) -> str:
+    """Identity of a source from its path, sizes and modification times"""
+    files = [os.path.join(path, f) for f in sorted(os.listdir(path))] if os.path.isdir(path) else [path]
+    stats = [(f, os.stat(f).st_size, os.stat(f).st_mtime_ns) for f in files]
+    return hashlib.sha256(json.dumps(stats).encode()).hexdigest()[:24]
+
+
+def _prune_source_cache():
+    """Delete materialized sources beyond the SOURCE_CACHE_KEEP most recently used"""
+    metas = sorted(
+        (f for f in os.listdir(SOURCE_CACHE_DIR) if f.endswith(".json")),
+        key=lambda f: os.path.getmtime(os.path.join(SOURCE_CACHE_DIR, f)), reverse=True
+    )
+    for meta in metas[SOURCE_CACHE_KEEP:]:
+        key = meta[:-5]
+        for filename in os.listdir(SOURCE_CACHE_DIR):
+            if filename.startswith(key + "."):
+                os.remove(os.path.join(SOURCE_CACHE_DIR, filename))
+
+
+def _open_materialized(base: str) -> Dict[str, Any]:
+    with open(base + ".json") as f:
+        meta = json.load(f)
+    features = len(meta["features"])
+    return {
+        **meta,
+        **joblib.load(base + ".joblib"),
+        "X_train": np.memmap(base + ".train.f32", dtype=np.float32, mode="r", shape=(meta["train_rows"], features)),
+        "X_test": np.memmap(base + ".test.f32", dtype=np.float32, mode="r", shape=(meta["test_rows"], features))
+    }
+
+
+def materialize_source(path: str, features: List[str], target: str, test_size: float) -> Dict[str, Any]:
+    """Stream a source into imputed, scaled float32 train/test memmaps on disk.
+
+    One pass reads the projected columns chunk by chunk, drops rows without a
+    target, sends random rows of each class to the holdout so every class
+    keeps a test_size share of its rows seen so far (a stratified split) and
+    keeps a uniform row sample for the imputation medians. Two passes over the
+    memmaps then impute and fit the scaler, and scale in place. Results are
+    reused while the source file is unchanged. Returns X_train, X_test,
+    y_train, y_test, imputer, scaler, label_encoder, original_classes and rows.
+    """
+    columns = source_columns(path)
+    missing_features = [f for f in features if f not in columns]
+    if missing_features:
+        raise HTTPException(status_code=400, detail=f"Missing features: {missing_features}")
+    
+    if target not in columns:
+        raise HTTPException(status_code=400, detail=f"Target column not found: {target}")
+    
+    key = hashlib.sha256(json.dumps(
+        [source_fingerprint(path), features, target, test_size, "stratified"]
+    ).encode()).hexdigest()[:24]
+    base = os.path.join(SOURCE_CACHE_DIR, key)
+    with sources_lock:
+        os.makedirs(SOURCE_CACHE_DIR, exist_ok=True)
+        if os.path.exists(base + ".json"):
+            os.utime(base + ".json")
+        else:
+            try:
+                _write_materialized(base, path, features, target, test_size)
+            except BaseException:
+                # Never leave half-written matrices behind
+                for filename in os.listdir(SOURCE_CACHE_DIR):
+                    if filename.startswith(os.path.basename(base) + "."):
+                        os.remove(os.path.join(SOURCE_CACHE_DIR, filename))
+                raise
+            _prune_source_cache()
+        return _open_materialized(base)
+
+
+def _write_materialized(base: str, path: str, features: List[str], target: str, test_size: float):
+    """Write base.{train,test}.f32, base.joblib and finally base.json for materialize_source"""
+    rng = np.random.default_rng(42)
+    labels = {}  # label -> provisional code, in order of appearance
+    seen, held = {}, {}  # provisional code -> rows so far, of which in the holdout
+    y_parts = {"train": [], "test": []}
+    sample = np.empty((0, len(features)), dtype=np.float32)
+    sample_keys = np.empty(0)
+    with open(base + ".train.f32", "wb") as train_file, open(base + ".test.f32", "wb") as test_file:
+        for chunk in iter_source_chunks(path, features + [target]):
+            chunk = chunk[chunk[target].notna()]
+            if chunk.empty:
+                continue
+            for label in chunk[target].unique().tolist():
+                labels.setdefault(label, len(labels))
+            codes = chunk[target].map(labels).to_numpy(dtype=np.int64)
+            X = chunk[features].to_numpy(dtype=np.float32, na_value=np.nan)
+            
+            # Keep the rows with the smallest random keys: a uniform sample of unknown length
+            sample = np.concatenate([sample, X])
+            sample_keys = np.concatenate([sample_keys, rng.random(len(X))])
+            if len(sample) > SOURCE_SAMPLE_ROWS:
+                keep = np.argpartition(sample_keys, SOURCE_SAMPLE_ROWS)[:SOURCE_SAMPLE_ROWS]
+                sample, sample_keys = sample[keep], sample_keys[keep]
+            
+            # Top each class's holdout up to test_size of its rows, picking the chunk's rows at random
+            is_test = np.zeros(len(X), dtype=bool)
+            for code in np.unique(codes):
+                rows = rng.permutation(np.flatnonzero(codes == code))
+                seen[code] = seen.get(code, 0) + len(rows)
+                take = int(round(seen[code] * test_size)) - held.get(code, 0)
+                is_test[rows[:take]] = True
+                held[code] = held.get(code, 0) + take
+            train_file.write(X[~is_test].tobytes())
+            test_file.write(X[is_test].tobytes())
+            y_parts["train"].append(codes[~is_test])
+            y_parts["test"].append(codes[is_test])
+    
+    train_rows = sum(len(part) for part in y_parts["train"])
+    test_rows = sum(len(part) for part in y_parts["test"])
+    if not train_rows or not test_rows:
+        raise HTTPException(status_code=400, detail="Source has too few labelled rows to split")
+    
+    # Encode the target the way prepare_training_data does
+    label_encoder = None
+    ordered = list(labels)
+    if isinstance(ordered[0], str):
+        label_encoder = LabelEncoder().fit(ordered)
+        original_classes = ordered
+        lookup = label_encoder.transform(ordered)
+    else:
+        original_classes = sorted(ordered)
+        lookup = np.asarray(ordered)
+    y_train = lookup[np.concatenate(y_parts["train"])]
+    y_test = lookup[np.concatenate(y_parts["test"])]
+    
+    medians = np.array([
+        np.nanmedian(sample[:, j]) if not np.isnan(sample[:, j]).all() else np.nan
+        for j in range(len(features))
+    ])
+    imputer = median_imputer(features, medians)
+    del sample
+    
+    # Impute and fit the scaler on every row, then scale in place
+    scaler = StandardScaler()
+    matrices = [
+        np.memmap(f"{base}.{split}.f32", dtype=np.float32, mode="r+", shape=(rows, len(features)))
+        for split, rows in (("train", train_rows), ("test", test_rows))
+    ]
+    fill = np.nan_to_num(medians).astype(np.float32)
+    for X in matrices:
+        for start in range(0, len(X), SOURCE_CHUNK_ROWS):
+            block = X[start:start + SOURCE_CHUNK_ROWS]
+            np.copyto(block, fill, where=np.isnan(block))
+            scaler.partial_fit(pd.DataFrame(block, columns=features, copy=False))
+    for X in matrices:
+        for start in range(0, len(X), SOURCE_CHUNK_ROWS):
+            block = X[start:start + SOURCE_CHUNK_ROWS]
+            block -= scaler.mean_.astype(np.float32)
+            block /= scaler.scale_.astype(np.float32)
+        X.flush()
+    del matrices
+    
+    joblib.dump({
+        "y_train": y_train,
+        "y_test": y_test,
+        "imputer": imputer,
+        "scaler": scaler,
+        "label_encoder": label_encoder,
+        "original_classes": original_classes
+    }, base + ".joblib")
+    with open(base + ".json", "w") as f:
+        json.dump({
+            "source": path,
+            "features": features,
+            "target": target,
+            "rows": train_rows + test_rows,
+            "train_rows": train_rows,
+            "test_rows": test_rows
+        }, f)
+
+
+def fit_in_chunks(model, X, y, epochs: int):
+    """Train a partial_fit model over row chunks of a (memory-mapped) matrix, in shuffled chunk order"""
+    classes = np.unique(y)
+    starts = np.arange(0, len(X), SOURCE_CHUNK_ROWS)
+    rng = np.random.default_rng(42)
+    for _ in range(max(1, epochs)):
+        for start in rng.permutation(starts):
+            model.partial_fit(X[start:start + SOURCE_CHUNK_ROWS], y[start:start + SOURCE_CHUNK_ROWS], classes=classes)
+    return model
+
+
+def predict_in_chunks(predict, X):
+    """Apply predict or predict_proba to row chunks of X so only one chunk's output is built at a time"""
+    if len(X) <= SOURCE_CHUNK_ROWS:
+        return predict(X)
+    return np.concatenate([predict(X[start:start + SOURCE_CHUNK_ROWS]) for start in range(0, len(X), SOURCE_CHUNK_ROWS)])
+
+
+def data_fingerprint(df: pd.DataFrame, columns: List[str]) -> str:
+    """Content hash of the given columns only, so unrelated columns do not change it"""
+    present = [c for c in columns if c in df.columns]
+    digest = hashlib.sha256(json.dumps([str(c) for c in present]).encode())
+    if present:
+        digest.update(pd.util.hash_pandas_object(df[present], index=False).values.tobytes())
+    return digest.hexdigest()
+
+
+def fit_fingerprint(kind: str, data_hash: str, **settings) -> str:
+    """Result cache key from the data hash and every setting that changes a fit's outcome"""
+    payload = json.dumps({"kind": kind, "data": data_hash, **settings}, sort_keys=True, default=str)
+    return f"{kind}:{hashlib.sha256(payload.encode()).hexdigest()}"
+
+
+def _decode_npz(body: bytes):
+    """Columns from a NumPy .npz bundle; request fields are JSON in its __request__ entry.
+
+    Bundles are loaded without pickle, so text columns (tickers, dates, string
+    labels) must be fixed-width unicode arrays such as np.array(values, dtype=str)
+    rather than object arrays; byte-string columns are decoded as ASCII.
+    """
+    columns = {}
+    with np.load(io.BytesIO(body), allow_pickle=False) as bundle:
+        params = json.loads(str(bundle["__request__"])) if "__request__" in bundle.files else {}
+        for name in bundle.files:
+            if name == "__request__":
+                continue
+            try:
+                column = bundle[name]
+            except ValueError:
+                raise ValueError(f"column {name!r} is an object array; send text as fixed-width unicode (dtype '<U')")
+            columns[name] = column.astype(str) if column.dtype.kind == "S" else column
+    return pd.DataFrame(columns, copy=False), params
+
+
+def _decode_arrow(body: bytes):
+    """Columns from an Arrow IPC stream; request fields are JSON in the b"request" schema metadata"""
+    import pyarrow as pa
+    
+    table = pa.ipc.open_stream(pa.py_buffer(body)).read_all()
+    metadata = table.schema.metadata or {}
+    params = json.loads(metadata.get(b"request", b"{}"))
+    return table.to_pandas(), params
+
+
+# Binary request bodies by Content-Type; anything else is parsed as JSON
+BINARY_DECODERS = {
+    "application/x-npz": _decode_npz,
+}
+if PYARROW_AVAILABLE:
+    BINARY_DECODERS["application/vnd.apache.arrow.stream"] = _decode_arrow
+
+
+def ingest_body(model_class):
+    """Dependency parsing a request body as JSON or as a binary columnar bundle.
+
+    Binary bodies skip per-cell pydantic validation: their columns are decoded
+    straight into a DataFrame that request_frame hands to the endpoint.
+    """
+    async def parse(http_request: Request):
+        content_type = http_request.headers.get("content-type", "application/json").split(";")[0].strip().lower()
+        body = await http_request.body()
+        
+        try:
+            with stage("parse"):
+                if content_type in BINARY_DECODERS:
+                    frame, params = await run_in_threadpool(BINARY_DECODERS[content_type], body)
+                    parsed = model_class.model_validate(params)
+                    parsed._frame = frame
+                else:
+                    parsed = model_class.model_validate_json(body)
+        except ValidationError as e:
+            raise RequestValidationError(e.errors())
+        except Exception as e:
+            raise HTTPException(status_code=400, detail=f"Could not decode {content_type} body: {e}")
+        
+        return parsed
+    
+    return parse
+
+
 @app.get("/")
 def read_root():
     return {"message": "Stock ML Service is running", "version": "1.0.0"}
@@ -241,96 +1108,449 @@ def get_available_models():
             "id": key,
             "name": config["name"],
             "description": config["description"],
-            "default_params": config["params"]
+            "default_params": config["params"],
+            "search_space": SEARCH_SPACES.get(key, {})
         })
     return {"models": models, "total": len(models)}
 
 
+@app.get("/startup-report")
+def get_startup_report():
+    """Module load time, backend availability and per-model import/warm-up costs"""
+    return {
+        "module_load_seconds": MODULE_LOAD_SECONDS,
+        "backends": {
+            "xgboost": XGBOOST_AVAILABLE,
+            "lightgbm": LIGHTGBM_AVAILABLE,
+            "catboost": CATBOOST_AVAILABLE,
+            "pyarrow": PYARROW_AVAILABLE
+        },
+        "imported_models": import_report,
+        "preload": preload_status
+    }
+
+
+@app.get("/scheduler")
+def get_scheduler_stats():
+    """Core leases held and waited for by training work, and the capacity kept for /predict"""
+    return cpu_scheduler.stats()
+
+
+@app.get("/cache")
+def get_cache_stats():
+    """Result cache size, hit/miss counters and evictions"""
+    return result_cache.stats()
+
+
+@app.delete("/cache")
+def clear_cache():
+    """Drop every cached fit result"""
+    return {"success": True, "cleared": result_cache.clear()}
+
+
+@app.get("/metrics")
+def get_metrics():
+    """Prometheus scrape endpoint: stage and request histograms plus model, cache and job gauges"""
+    cache = result_cache.stats()
+    cpu = cpu_scheduler.stats()
+    with jobs_lock:
+        job_states = {}
+        for job in jobs.values():
+            job_states[job["status"]] = job_states.get(job["status"], 0) + 1
+    
+    gauges = [
+        ("ml_resident_models", "Trained models held in memory", {}, len(trained_models)),
+        ("ml_resident_model_bytes", "Estimated bytes of resident models", {}, trained_models.resident_bytes()),
+        ("ml_model_memory_budget_bytes", "Memory budget for resident models", {}, trained_models.budget_bytes),
+        ("ml_saved_models", "Models saved on disk", {}, len(trained_models.saved_ids())),
+        ("ml_cached_datasets", "Datasets held in memory", {}, len(datasets)),
+        ("ml_result_cache_entries", "Entries in the fit result cache", {}, cache["entries"]),
+        ("ml_job_queue_depth", "Training jobs waiting for a worker", {}, job_queue.qsize()),
+        ("ml_cpu_capacity_cores", "Cores the scheduler leases to training work", {}, cpu["capacity"]),
+        ("ml_cpu_reserved_cores", "Cores kept back for /predict", {}, cpu["reserved_for_predict"]),
+        ("ml_cpu_leased_cores", "Cores currently leased", {}, cpu["leased"]),
+        ("ml_cpu_lease_waiters", "Requests waiting for a core lease", {}, cpu["waiting"])
+    ]
+    gauges += [("ml_jobs", "Training jobs by status", {"status": status}, count) for status, count in job_states.items()]
+    counters = [("ml_result_cache_hits_total", "Result cache hits", {"kind": kind}, count) for kind, count in cache["hits"].items()]
+    counters += [("ml_result_cache_misses_total", "Result cache misses", {"kind": kind}, count) for kind, count in cache["misses"].items()]
+    counters += [
+        ("ml_cpu_leases_total", "Core leases granted", {}, cpu["granted"]),
+        ("ml_cpu_lease_timeouts_total", "Requests refused after waiting for cores", {}, cpu["timeouts"])
+    ]
+    
+    lines = []
+    for metric_type, samples in (("gauge", gauges), ("counter", counters)):
+        described = set()
+        for name, help_text, labels, value in samples:
+            if name not in described:
+                described.add(name)
+                lines += [f"# HELP {name} {help_text}", f"# TYPE {name} {metric_type}"]
+            label_text = ",".join(f'{k}="{_label_value(v)}"' for k, v in labels.items())
+            lines.append(f"{name}{{{label_text}}} {value}" if label_text else f"{name} {value}")
+    
+    for histogram in (REQUEST_SECONDS, REQUEST_BYTES, REQUEST_ROWS, STAGE_SECONDS):
+        lines += histogram.render()
+    
+    return Response("\n".join(lines) + "\n", media_type="text/plain; version=0.0.4")
+
+
 @app.get("/trained-models")
 def get_trained_models():
     """Get list of trained models"""
     models = []
-    for model_id, model_data in trained_models.items():
-        models.append({
-            "id": model_id,
-            "model_type": model_data["model_type"],
-            "model_name": model_data["model_name"],
-            "features": model_data["features"],
-            "target": model_data["target"],
-            "metrics": model_data["metrics"],
-            "trained_at": model_data["trained_at"]
-        })
-    return {"models": models}
+    for model_id in trained_models:
+        try:
+            models.append({**model_summary(model_id, trained_models[model_id]), "resident": True})
+        except KeyError:
+            pass
+    
+    listed = {model["id"] for model in models}
+    for model_id in trained_models.saved_ids():
+        if model_id not in listed:
+            models.append({**trained_models.saved_summary(model_id), "resident": False})
+    
+    return {
+        "models": models,
+        "resident_count": len(listed),
+        "resident_bytes": trained_models.resident_bytes(),
+        "memory_budget_bytes": trained_models.budget_bytes
+    }
 
 
-@app.post("/train")
-def train_model(request: TrainRequest):
-    """Train a machine learning model"""
+@app.post("/datasets")
+def upload_dataset(request: DatasetRequest = Depends(ingest_body(DatasetRequest))):
+    """Register a dataset once so later requests can reference it by dataset_id"""
     try:
-        # Validate model type
-        if request.model_type not in AVAILABLE_MODELS:
-            raise HTTPException(status_code=400, detail=f"Unknown model type: {request.model_type}")
+        df = request._frame if request._frame is not None else pd.DataFrame(request.data or [])
+        if df.empty:
+            raise HTTPException(status_code=400, detail="Dataset is empty")
         
-        # Convert data to DataFrame
-        df = pd.DataFrame(request.data)
-        
-        # Validate features and target
-        missing_features = [f for f in request.features if f not in df.columns]
-        if missing_features:
-            raise HTTPException(status_code=400, detail=f"Missing features: {missing_features}")
-        
-        if request.target not in df.columns:
-            raise HTTPException(status_code=400, detail=f"Target column not found: {request.target}")
-        
-        # Prepare features and target
-        X = df[request.features].copy()
-        y = df[request.target].copy()
-        
-        # Handle missing values
-        imputer = SimpleImputer(strategy='median')
-        X = pd.DataFrame(imputer.fit_transform(X), columns=request.features)
-        
-        # Remove rows where target is null
-        mask = y.notna()
-        X = X[mask]
-        y = y[mask]
-        
-        # Encode target if needed
-        label_encoder = None
-        original_classes = None
-        if y.dtype == 'object' or isinstance(y.iloc[0], str):
-            label_encoder = LabelEncoder()
-            original_classes = y.unique().tolist()
-            y = label_encoder.fit_transform(y)
-        else:
-            original_classes = sorted(y.unique().tolist())
-        
-        # Scale features
-        scaler = StandardScaler()
-        X_scaled = scaler.fit_transform(X)
+        info = register_dataset(df, request.name)
+        return {"success": True, **info}
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.get("/datasets")
+def list_datasets():
+    """List datasets held in memory or spilled to disk"""
+    found = {}
+    if os.path.isdir(DATASETS_DIR):
+        for filename in sorted(os.listdir(DATASETS_DIR)):
+            if filename.endswith(".json"):
+                with open(os.path.join(DATASETS_DIR, filename)) as f:
+                    info = json.load(f)
+                found[info["dataset_id"]] = {**info, "in_memory": False}
+    
+    with datasets_lock:
+        for dataset_id, entry in datasets.items():
+            found[dataset_id] = {**entry["info"], "in_memory": True}
+    
+    return {"datasets": list(found.values()), "total": len(found)}
+
+
+@app.get("/datasets/{dataset_id}")
+def get_dataset_info(dataset_id: str):
+    """Get metadata for a registered dataset"""
+    with datasets_lock:
+        cached = datasets.get(dataset_id)
+    if cached is not None:
+        return {**cached["info"], "in_memory": True}
+    
+    filepath = _dataset_path(dataset_id, "json")
+    if not os.path.exists(filepath):
+        raise HTTPException(status_code=404, detail=f"Dataset not found: {dataset_id}")
+    
+    with open(filepath) as f:
+        return {**json.load(f), "in_memory": False}
+
+
+@app.delete("/datasets/{dataset_id}")
+def delete_dataset(dataset_id: str):
+    """Delete a registered dataset from memory and disk"""
+    with datasets_lock:
+        removed = datasets.pop(dataset_id, None) is not None
+    
+    for ext in ("joblib", "json"):
+        filepath = _dataset_path(dataset_id, ext)
+        if os.path.exists(filepath):
+            os.remove(filepath)
+            removed = True
+    
+    if not removed:
+        raise HTTPException(status_code=404, detail=f"Dataset not found: {dataset_id}")
+    
+    return {"success": True, "message": f"Dataset {dataset_id} deleted"}
+
+
+class FoldEnsemble:
+    """Cross-validation fold models served as one classifier by averaging their probabilities"""
+    
+    def __init__(self, models: List[Any], classes: np.ndarray):
+        self.models = models
+        self.classes_ = classes
+    
+    @available_if(lambda self: all(hasattr(m, "predict_proba") for m in self.models))
+    def predict_proba(self, X):
+        probabilities = np.zeros((len(X), len(self.classes_)))
+        for model in self.models:
+            probabilities[:, np.searchsorted(self.classes_, model.classes_)] += model.predict_proba(X)
+        return probabilities / len(self.models)
+    
+    def predict(self, X):
+        if hasattr(self, "predict_proba"):
+            return self.classes_[np.argmax(self.predict_proba(X), axis=1)]
         
-        # Split data
-        X_train, X_test, y_train, y_test = train_test_split(
-            X_scaled, y, test_size=request.test_size, random_state=42, stratify=y
+        # Majority vote for models without probabilities
+        votes = np.zeros((len(X), len(self.classes_)), dtype=int)
+        rows = np.arange(len(X))
+        for model in self.models:
+            votes[rows, np.searchsorted(self.classes_, model.predict(X))] += 1
+        return self.classes_[np.argmax(votes, axis=1)]
+    
+    @property
+    def feature_importances_(self):
+        if not all(hasattr(m, "feature_importances_") for m in self.models):
+            raise AttributeError("feature_importances_")
+        return np.mean([m.feature_importances_ for m in self.models], axis=0)
+    
+    @property
+    def coef_(self):
+        if not all(hasattr(m, "coef_") for m in self.models):
+            raise AttributeError("coef_")
+        return np.mean([m.coef_ for m in self.models], axis=0)
+
+
+def _fit_fold(model_class, params, fit_params, X, y, train_idx, val_idx):
+    """Fit on one fold's rows; returns the model and its predictions/probabilities on val_idx"""
+    model = model_class(**fit_params)
+    model.fit(X if train_idx is None else X[train_idx], y if train_idx is None else y[train_idx])
+    if "n_jobs" in params:
+        model.set_params(n_jobs=params["n_jobs"])
+    if val_idx is None:
+        return model, None, None
+    
+    X_val = X[val_idx]
+    probabilities = None
+    if hasattr(model, "predict_proba"):
+        try:
+            probabilities = model.predict_proba(X_val)
+        except Exception:
+            probabilities = None
+    if probabilities is not None and type(model).__name__ in PROBA_ARGMAX_MODELS:
+        predictions = model.classes_[np.argmax(probabilities, axis=1)]
+    else:
+        predictions = model.predict(X_val)
+    return model, predictions, probabilities
+
+
+def run_cross_validation(model_type: str, params: Dict[str, Any], X, y, cv_folds: int,
+                         n_jobs: Optional[int] = None, holdout=None):
+    """Fit stratified CV folds in parallel within the CPU budget, keeping the fold models.
+
+    Out-of-fold predictions give accuracy, precision, recall, F1 and ROC AUC in
+    one pass. holdout=(X_train, y_train) fits the holdout model in the same batch.
+    Returns (fold_models, cv_metrics, holdout_model).
+    """
+    model_class = load_model_class(model_type)
+    y = np.asarray(y)
+    classes = np.unique(y)
+    splits = list(StratifiedKFold(n_splits=cv_folds, shuffle=True, random_state=42).split(X, y))
+    
+    tasks = [(X, y, train_idx, val_idx) for train_idx, val_idx in splits]
+    if holdout is not None:
+        tasks.append((holdout[0], np.asarray(holdout[1]), None, None))
+    
+    # Split the cores between concurrent fits, as /compare does
+    budget = n_jobs if n_jobs and n_jobs > 0 else CV_CPU_BUDGET
+    workers = max(1, min(budget, len(tasks)))
+    fit_params = thread_limited_params(model_type, params, max(1, budget // workers))
+    fitted = Parallel(n_jobs=workers)(
+        delayed(_fit_fold)(model_class, params, fit_params, *task) for task in tasks
+    )
+    
+    holdout_model = fitted.pop()[0] if holdout is not None else None
+    fold_models = [model for model, _, _ in fitted]
+    
+    oof_predictions = np.empty_like(y)
+    oof_probabilities = np.zeros((len(y), len(classes)))
+    has_probabilities = True
+    cv_scores = []
+    for (model, predictions, probabilities), (_, val_idx) in zip(fitted, splits):
+        oof_predictions[val_idx] = predictions
+        cv_scores.append(float(accuracy_score(y[val_idx], predictions)))
+        if probabilities is None:
+            has_probabilities = False
+        else:
+            oof_probabilities[np.ix_(val_idx, np.searchsorted(classes, model.classes_))] = probabilities
+    
+    oof_metrics = holdout_metrics(y, oof_predictions)
+    if len(classes) == 2 and has_probabilities:
+        oof_metrics["roc_auc"] = float(roc_auc_score(y, oof_probabilities[:, 1]))
+    
+    cv_metrics = {
+        "cv_scores": cv_scores,
+        "cv_mean": float(np.mean(cv_scores)),
+        "cv_std": float(np.std(cv_scores)),
+        "cv_oof": oof_metrics
+    }
+    return fold_models, cv_metrics, holdout_model
+
+
+def run_training(request: TrainRequest, progress=None):
+    """Train, evaluate and optionally store a model, returning the /train response.
+
+    progress(stage, fraction) is called as each stage starts; it may raise to abort.
+    Repeating a configuration on identical data reuses the cached result instead of refitting.
+    """
+    report = progress or (lambda stage, fraction: None)
+    
+    # Validate model type
+    if request.model_type not in AVAILABLE_MODELS:
+        raise HTTPException(status_code=400, detail=f"Unknown model type: {request.model_type}")
+    
+    # Resolve inline rows or a registered dataset; a source_path is read later, chunk by chunk
+    report("preparing", 0.0)
+    if request.source_path:
+        if request.fold_ensemble:
+            raise HTTPException(status_code=400, detail="fold_ensemble is not supported with source_path")
+        # Cross-validation would pull the whole source into memory; left at its default it is skipped
+        if request.cross_validation and "cross_validation" in request.model_fields_set:
+            raise HTTPException(status_code=400, detail="cross_validation is not supported with source_path")
+        source = resolve_source_path(request.source_path)
+        df = None
+    else:
+        df = request_frame(request)
+    
+    # Get model configuration
+    model_config = AVAILABLE_MODELS[request.model_type]
+    params = model_config["params"].copy()
+    
+    # Apply custom params if provided
+    if request.custom_params:
+        params.update(request.custom_params)
+    
+    # Look up an earlier fit of the same configuration; saving needs its model still stored
+    if df is None:
+        data_hash = f"source:{source_fingerprint(source)}"
+    else:
+        data_hash = data_fingerprint(df, request.features + [request.target])
+    settings = {
+        "features": request.features,
+        "target": request.target,
+        "model_type": request.model_type,
+        "params": params
+    }
+    if request.lean:
+        settings["lean"] = True
+    cache_key = fit_fingerprint(
+        "train", data_hash, **settings, test_size=request.test_size,
+        cross_validation=request.cross_validation, cv_folds=request.cv_folds,
+        fold_ensemble=request.fold_ensemble, epochs=request.epochs
+    )
+    cached = result_cache.get(
+        "train", cache_key,
+        usable=lambda value: request.skip_save or (
+            value["model_id"] is not None and value["model_id"] in trained_models
         )
+    )
+    
+    # The stored model can still be deleted after the lookup; then forget the entry and refit
+    cached_entry = None
+    if cached is not None and cached["model_id"] is not None:
+        try:
+            cached_entry = trained_models[cached["model_id"]]
+        except KeyError:
+            result_cache.discard(lambda value: value is cached)
+            cached = None
+    
+    if cached is not None:
+        metrics = dict(cached["metrics"])
+        feature_importance = cached["feature_importance"]
+        original_classes = cached["original_classes"]
+        data_info = cached["data_info"]
+    else:
+        memory = {} if request.lean or request.profile_memory else None
+        if df is None:
+            # Imputed, scaled float32 train/test memmaps written once per source file
+            with stage("source", request.model_type, memory):
+                materialized = materialize_source(source, request.features, request.target, request.test_size)
+            X_train, X_test = materialized["X_train"], materialized["X_test"]
+            y_train, y_test = materialized["y_train"], materialized["y_test"]
+            imputer, scaler = materialized["imputer"], materialized["scaler"]
+            label_encoder, original_classes = materialized["label_encoder"], materialized["original_classes"]
+        elif request.lean:
+            # One float32 matrix in split order; the splits are row-range views of it
+            X_scaled, y, n_train, imputer, scaler, label_encoder, original_classes = prepare_lean_training_data(
+                df, request.features, request.target, request.test_size, request.model_type, memory
+            )
+            X_train, X_test = X_scaled[:n_train], X_scaled[n_train:]
+            y_train, y_test = y[:n_train], y[n_train:]
+        else:
+            # Impute, encode and scale
+            X_scaled, y, imputer, scaler, label_encoder, original_classes = prepare_training_data(
+                df, request.features, request.target, request.model_type, memory
+            )
+            
+            # Split data
+            with stage("split", request.model_type, memory):
+                X_train, X_test, y_train, y_test = train_test_split(
+                    X_scaled, y, test_size=request.test_size, random_state=42, stratify=y
+                )
         
-        # Get model configuration
-        model_config = AVAILABLE_MODELS[request.model_type]
-        params = model_config["params"].copy()
-        
-        # Apply custom params if provided
-        if request.custom_params:
-            params.update(request.custom_params)
+        # Create and train model; CV folds are fitted in parallel with it
+        report("fitting", 0.2)
+        model = None
+        cv_metrics = None
+        if request.fold_ensemble:
+            # Folds over the training split become the model, scored on the untouched holdout
+            with cpu_scheduler.lease(request.cv_n_jobs or CV_CPU_BUDGET) as lease, stage("cv", request.model_type, memory):
+                fold_models, cv_metrics, _ = run_cross_validation(
+                    request.model_type, params, X_train, y_train, request.cv_folds, lease["cores"]
+                )
+            model = FoldEnsemble(fold_models, np.unique(y_train))
+        elif request.cross_validation and df is not None:
+            # Scores do not depend on test_size, so they are cached apart from the holdout fit
+            cv_key = fit_fingerprint("cv", data_hash, **settings, cv_folds=request.cv_folds)
+            cv_metrics = result_cache.get("cv", cv_key)
+            if cv_metrics is None:
+                try:
+                    # The holdout fit runs inside this stage, in parallel with the folds
+                    with cpu_scheduler.lease(request.cv_n_jobs or CV_CPU_BUDGET) as lease, stage("cv", request.model_type, memory):
+                        _, cv_metrics, model = run_cross_validation(
+                            request.model_type, params, X_scaled, y, request.cv_folds, lease["cores"],
+                            holdout=(X_train, y_train)
+                        )
+                    result_cache.put("cv", cv_key, cv_metrics)
+                except HTTPException:
+                    raise
+                except Exception as e:
+                    cv_metrics = {"cv_error": str(e)}
         
-        # Create and train model
-        model = model_config["class"](**params)
-        model.fit(X_train, y_train)
+        if model is None:
+            with cpu_scheduler.lease() as lease, stage("fit", request.model_type, memory):
+                model = load_model_class(request.model_type)(
+                    **thread_limited_params(request.model_type, params, lease["cores"])
+                )
+                if df is None and INCREMENTAL_UPDATES.get(request.model_type) == "partial_fit":
+                    fit_in_chunks(model, X_train, y_train, request.epochs)
+                else:
+                    # Other models read the memmap directly; the OS pages rows in as they are touched
+                    model.fit(X_train, y_train)
+                if "n_jobs" in params:
+                    model.set_params(n_jobs=params["n_jobs"])
         
         # Predictions
-        y_pred = model.predict(X_test)
-        y_pred_train = model.predict(X_train)
+        report("evaluating", 0.6)
+        with stage("predict", request.model_type, memory):
+            y_pred = predict_in_chunks(model.predict, X_test)
+            y_pred_train = predict_in_chunks(model.predict, X_train)
         
         # Calculate metrics
+        metrics_started = time.perf_counter()
         metrics = {
             "accuracy": float(accuracy_score(y_test, y_pred)),
             "precision": float(precision_score(y_test, y_pred, average='weighted', zero_division=0)),
@@ -345,22 +1565,15 @@ def train_model(request: TrainRequest):
         if len(original_classes) == 2:
             try:
                 if hasattr(model, 'predict_proba'):
-                    y_proba = model.predict_proba(X_test)[:, 1]
+                    y_proba = predict_in_chunks(model.predict_proba, X_test)[:, 1]
                     metrics["roc_auc"] = float(roc_auc_score(y_test, y_proba))
             except:
                 pass
         
-        # Cross validation if requested
-        cv_scores = None
-        if request.cross_validation:
-            try:
-                cv = StratifiedKFold(n_splits=request.cv_folds, shuffle=True, random_state=42)
-                cv_scores = cross_val_score(model_config["class"](**params), X_scaled, y, cv=cv, scoring='accuracy')
-                metrics["cv_scores"] = cv_scores.tolist()
-                metrics["cv_mean"] = float(cv_scores.mean())
-                metrics["cv_std"] = float(cv_scores.std())
-            except Exception as e:
-                metrics["cv_error"] = str(e)
+        record_stage("metrics", time.perf_counter() - metrics_started, request.model_type)
+        
+        if cv_metrics is not None:
+            metrics.update(cv_metrics)
         
         # Get feature importance if available
         feature_importance = None
@@ -377,217 +1590,1577 @@ def train_model(request: TrainRequest):
                 for f, imp in sorted(zip(request.features, importance), key=lambda x: x[1], reverse=True)
             ]
         
-        # Generate model ID
-        model_id = f"{request.model_type}_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+        data_info = {
+            "total_samples": len(df) if df is not None else len(X_train) + len(X_test),
+            "train_samples": len(X_train),
+            "test_samples": len(X_test)
+        }
+        if df is None:
+            data_info["source_path"] = request.source_path
+        if memory is not None:
+            data_info["peak_memory_mb"] = memory
+        holdout = None if request.skip_save else keep_holdout(X_test, y_test)
+    
+    # Use custom name if provided, otherwise use default model name
+    display_name = request.model_name if request.model_name else model_config["name"]
+    
+    def new_model_id():
+        # Suffixed when another fit finished in the same second
+        base_id = model_id = f"{request.model_type}_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+        suffix = 1
+        while model_id in trained_models:
+            suffix += 1
+            model_id = f"{base_id}_{suffix}"
+        return model_id
+    
+    if cached is not None:
+        # The earlier fit's stored model is the result; storing it again would count it twice
+        model_id = cached["model_id"]
+        if cached_entry is not None and request.model_name and request.model_name != cached_entry["model_name"]:
+            # Under a new name the fit is registered as its own model, sharing the fitted objects
+            model_id = new_model_id()
+            trained_models[model_id] = {**cached_entry, "model_name": display_name, "trained_at": datetime.now().isoformat()}
+            trained_models.record_history({
+                "model_id": model_id,
+                "model_type": request.model_type,
+                "model_name": display_name,
+                "accuracy": metrics["accuracy"],
+                "trained_at": datetime.now().isoformat()
+            })
+        elif cached_entry is not None:
+            display_name = cached_entry["model_name"]
+    else:
+        model_id = new_model_id()
+    
+    # Store model only if skip_save is False
+    report("saving", 0.95)
+    if not request.skip_save and cached is None:
+        trained_models[model_id] = {
+            "model": model,
+            "scaler": scaler,
+            "imputer": imputer,
+            "label_encoder": label_encoder,
+            "model_type": request.model_type,
+            "model_name": display_name,
+            "features": request.features,
+            "target": request.target,
+            "original_classes": original_classes,
+            "metrics": metrics,
+            "feature_importance": feature_importance,
+            "params": params,
+            "trained_at": datetime.now().isoformat(),
+            "data_shape": {"samples": data_info["total_samples"], "features": len(request.features)},
+            "pipeline": compile_pipeline(request.features, imputer, scaler),
+            "holdout": holdout
+        }
+    
+        # Add to history
+        trained_models.record_history({
+            "model_id": model_id,
+            "model_type": request.model_type,
+            "model_name": display_name,
+            "accuracy": metrics["accuracy"],
+            "trained_at": datetime.now().isoformat()
+        })
+    
+    if cached is None:
+        result_cache.put("train", cache_key, {
+            "model_id": model_id if not request.skip_save else None,
+            "metrics": metrics,
+            "feature_importance": feature_importance,
+            "original_classes": original_classes,
+            "data_info": data_info
+        })
+    
+    return {
+        "success": True,
+        "model_id": model_id if not request.skip_save else None,
+        "model_saved": not request.skip_save,
+        "model_name": display_name,
+        "model_type_name": model_config["name"],
+        "metrics": metrics,
+        "feature_importance": feature_importance,
+        "cached": cached is not None,
+        "data_info": {
+            **data_info,
+            "features_count": len(request.features),
+            "classes": original_classes
+        }
+    }
+
+
+@app.post("/indicators")
+def indicators(request: IndicatorsRequest = Depends(ingest_body(IndicatorsRequest))):
+    """Compute indicator features from raw OHLCV bars for every ticker in one pass
+    
+    The same computation runs for any train/predict/compare request that sets
+    indicators, so clients can send bars instead of precomputed feature rows.
+    """
+    try:
+        df = request_frame(request)
+        options = request.indicators
+        if request.latest_only:
+            if options.date_column is not None and options.date_column in df.columns:
+                df = df.iloc[np.argsort(pd.to_datetime(df[options.date_column]).to_numpy(), kind="stable")]
+            df = df.groupby(options.ticker_column, sort=False).tail(1) if options.ticker_column else df.tail(1)
+        
+        tickers = df[options.ticker_column].nunique() if options.ticker_column else 1
+        if request.save_as_dataset:
+            return {"success": True, "rows": len(df), "tickers": tickers, "dataset": register_dataset(df, request.name)}
+        
+        return {
+            "success": True,
+            "rows": len(df),
+            "tickers": tickers,
+            "columns": [str(c) for c in df.columns],
+            "data": df.astype(object).where(df.notna(), None).to_dict("records")
+        }
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.post("/train")
+def train_model(request: TrainRequest = Depends(ingest_body(TrainRequest))):
+    """Train a machine learning model"""
+    try:
+        return run_training(request)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+class JobCancelled(Exception):
+    pass
+
+
+def _job_view(job: Dict[str, Any]) -> Dict[str, Any]:
+    """Public status of a job, with elapsed time computed on read"""
+    view = {k: v for k, v in job.items() if k not in ("request", "cancel_event")}
+    if job["started_at"]:
+        end = job["finished_ts"] or time.time()
+        view["elapsed"] = end - job["started_ts"]
+    else:
+        view["elapsed"] = 0.0
+    view.pop("started_ts")
+    view.pop("finished_ts")
+    return view
+
+
+def _job_worker():
+    """Run queued jobs in priority order until the process exits"""
+    while True:
+        _, _, job_id = job_queue.get()
+        with jobs_lock:
+            job = jobs.get(job_id)
+            if job is None or job["status"] != "queued":
+                continue
+            job.update({"status": "running", "started_at": datetime.now().isoformat(), "started_ts": time.time()})
+        
+        def progress(stage, fraction):
+            if job["cancel_event"].is_set():
+                raise JobCancelled()
+            job.update({"stage": stage, "progress": fraction})
+        
+        try:
+            result = run_training(job["request"], progress)
+            job.update({"status": "completed", "stage": "done", "progress": 1.0, "result": result})
+        except JobCancelled:
+            job.update({"status": "cancelled"})
+        except HTTPException as e:
+            job.update({"status": "failed", "error": e.detail})
+        except Exception as e:
+            job.update({"status": "failed", "error": str(e)})
+        finally:
+            job.update({"finished_at": datetime.now().isoformat(), "finished_ts": time.time()})
+            job["request"] = None
+            _prune_jobs()
+
+
+def _prune_jobs():
+    """Forget the oldest finished jobs beyond JOB_HISTORY_LIMIT"""
+    with jobs_lock:
+        finished = [job_id for job_id, job in jobs.items() if job["status"] in ("completed", "failed", "cancelled")]
+        for job_id in finished[:max(0, len(finished) - JOB_HISTORY_LIMIT)]:
+            del jobs[job_id]
+
+
+def _ensure_job_workers():
+    with jobs_lock:
+        while len(job_workers) < JOB_WORKERS:
+            worker = threading.Thread(target=_job_worker, name=f"job-worker-{len(job_workers)}", daemon=True)
+            worker.start()
+            job_workers.append(worker)
+
+
+@app.post("/jobs/train")
+def submit_training_job(request: TrainRequest = Depends(ingest_body(TrainRequest)), priority: int = 0):
+    """Queue a training job and return its id immediately; higher priority runs first"""
+    if request.model_type not in AVAILABLE_MODELS:
+        raise HTTPException(status_code=400, detail=f"Unknown model type: {request.model_type}")
+    
+    _ensure_job_workers()
+    
+    with jobs_lock:
+        queued = sum(1 for job in jobs.values() if job["status"] == "queued")
+        if queued >= JOB_QUEUE_DEPTH:
+            raise HTTPException(status_code=429, detail=f"Job queue is full ({JOB_QUEUE_DEPTH} queued jobs)")
+        
+        job_id = f"job_{uuid.uuid4().hex[:12]}"
+        jobs[job_id] = {
+            "job_id": job_id,
+            "type": "train",
+            "model_type": request.model_type,
+            "priority": priority,
+            "status": "queued",
+            "stage": "queued",
+            "progress": 0.0,
+            "created_at": datetime.now().isoformat(),
+            "started_at": None,
+            "finished_at": None,
+            "started_ts": None,
+            "finished_ts": None,
+            "result": None,
+            "error": None,
+            "request": request,
+            "cancel_event": threading.Event()
+        }
+        job_queue.put((-priority, time.monotonic(), job_id))
+    
+    return {"success": True, "job_id": job_id, "status": "queued", "queue_position": queued + 1}
+
+
+@app.get("/jobs")
+def list_jobs():
+    """List queued, running and recently finished jobs"""
+    with jobs_lock:
+        return {"jobs": [_job_view(job) for job in jobs.values()]}
+
+
+@app.get("/jobs/{job_id}")
+def get_job(job_id: str):
+    """Get a job's status, stage, progress and result"""
+    with jobs_lock:
+        if job_id not in jobs:
+            raise HTTPException(status_code=404, detail=f"Job not found: {job_id}")
+        return _job_view(jobs[job_id])
+
+
+@app.delete("/jobs/{job_id}")
+def cancel_job(job_id: str):
+    """Cancel a queued or running job, or forget a finished one.
+
+    A running job stops at its next stage boundary; an estimator's fit in
+    progress is not interrupted.
+    """
+    with jobs_lock:
+        if job_id not in jobs:
+            raise HTTPException(status_code=404, detail=f"Job not found: {job_id}")
+        
+        job = jobs[job_id]
+        if job["status"] == "queued":
+            job.update({"status": "cancelled", "finished_at": datetime.now().isoformat(), "request": None})
+        elif job["status"] == "running":
+            job["cancel_event"].set()
+        else:
+            del jobs[job_id]
+            return {"success": True, "message": f"Job {job_id} removed"}
+    
+    action = "cancelled" if job["status"] == "cancelled" else "cancelling"
+    return {"success": True, "message": f"Job {job_id} {action}", "status": job["status"]}
+
+
+def _predict_scaled(model_data: Dict[str, Any], X_scaled):
+    """Predictions (decoded labels) and class probabilities for an already scaled matrix"""
+    predictions, probabilities = predict_arrays(model_data, X_scaled)
+    return predictions.tolist(), probabilities.tolist() if probabilities is not None else None
+
+
+def compile_pipeline(features: List[str], imputer, scaler) -> Optional[Dict[str, Any]]:
+    """Fold the fitted median imputer and standard scaler into one affine transform.
+
+    Stored as plain arrays so the entry still pickles without custom classes.
+    Returns None when the imputer dropped columns and the shapes no longer line up.
+    """
+    fill = np.asarray(imputer.statistics_, dtype=np.float64)
+    mean = np.asarray(scaler.mean_ if scaler.mean_ is not None else np.zeros(len(features)), dtype=np.float64)
+    scale = np.asarray(scaler.scale_ if scaler.scale_ is not None else np.ones(len(features)), dtype=np.float64)
+    if not (len(fill) == len(mean) == len(scale) == len(features)):
+        return None
+    
+    inv_scale = 1.0 / scale
+    return {
+        "features": list(features),
+        "inv_scale": inv_scale,
+        "offset": -mean * inv_scale,
+        "fill_scaled": (fill - mean) * inv_scale
+    }
+
+
+def apply_pipeline(pipeline: Dict[str, Any], X: np.ndarray) -> np.ndarray:
+    """Impute and scale a raw float matrix whose columns follow pipeline["features"]"""
+    X_scaled = X * pipeline["inv_scale"] + pipeline["offset"]
+    missing = np.isnan(X_scaled)
+    if missing.any():
+        X_scaled[missing] = np.broadcast_to(pipeline["fill_scaled"], X_scaled.shape)[missing]
+    return X_scaled
+
+
+def _model_pipeline(model_data: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """Compiled pipeline for a stored model, compiling it for entries saved before it existed"""
+    if "pipeline" not in model_data:
+        model_data["pipeline"] = compile_pipeline(model_data["features"], model_data["imputer"], model_data["scaler"])
+    return model_data["pipeline"]
+
+
+class PredictBatcher:
+    """Merges concurrent predictions for one model into a single predict call.
+
+    The first caller becomes the leader and keeps predicting whatever has queued
+    up until the queue is empty, so a lone request pays no extra latency.
+    """
+    
+    def __init__(self, model_data: Dict[str, Any], window: float):
+        self.model_data = model_data
+        self.window = window
+        
+        # Thread-pool dispatch costs more than a few rows of inference; predict serially
+        # through a shallow copy that shares the fitted state
+        self.model = model_data["model"]
+        if getattr(self.model, "n_jobs", None) not in (None, 1) and type(self.model).__module__.startswith("sklearn."):
+            self.model = copy.copy(self.model)
+            self.model.n_jobs = 1
+
+        self.lock = threading.Lock()
+        self.pending = []
+        self.running = False
+    
+    def predict(self, X_scaled: np.ndarray):
+        item = {"X": X_scaled, "done": threading.Event(), "result": None, "error": None}
+        with self.lock:
+            self.pending.append(item)
+            leader = not self.running
+            self.running = True
+        
+        if leader:
+            if self.window:
+                time.sleep(self.window)
+            while True:
+                with self.lock:
+                    batch, self.pending = self.pending, []
+                    if not batch:
+                        self.running = False
+                        break
+                self._run(batch)
+        
+        item["done"].wait()
+        if item["error"] is not None:
+            raise item["error"]
+        return item["result"]
+    
+    def _run(self, batch):
+        try:
+            X = batch[0]["X"] if len(batch) == 1 else np.vstack([item["X"] for item in batch])
+            predictions, probabilities = predict_arrays(self.model_data, X, self.model)
+            start = 0
+            for item in batch:
+                end = start + len(item["X"])
+                item["result"] = (
+                    predictions[start:end],
+                    probabilities[start:end] if probabilities is not None else None
+                )
+                start = end
+        except Exception as e:
+            for item in batch:
+                item["error"] = e
+        finally:
+            for item in batch:
+                item["done"].set()
+
+
+def _predict_batcher(model_id: str, model_data: Dict[str, Any]) -> PredictBatcher:
+    with predict_batchers_lock:
+        batcher = predict_batchers.get(model_id)
+        if batcher is None or batcher.model_data is not model_data:
+            batcher = PredictBatcher(model_data, PREDICT_BATCH_WINDOW_MS / 1000.0)
+            predict_batchers[model_id] = batcher
+        return batcher
+
+
+def _forget_predict_batcher(model_id: str):
+    """Drop a batcher so it stops holding a deleted or evicted model in memory"""
+    with predict_batchers_lock:
+        predict_batchers.pop(model_id, None)
+
+
+def model_input_features(features: List[str], model_data: Dict[str, Any]) -> List[str]:
+    """The requested feature columns in the order the model was trained on.
+
+    Raises a 400 when they are not the model's features, since the imputer,
+    scaler and model all read columns by position.
+    """
+    trained = list(model_data["features"])
+    if len(features) != len(trained) or set(features) != set(trained):
+        raise HTTPException(status_code=400, detail=f"Features must be the model's features: {trained}")
+    return trained
+
+
+def _fast_predict(request: PredictRequest, model_data: Dict[str, Any], features: List[str]):
+    """Predict inline rows through the compiled pipeline, or None if the request doesn't qualify.
+
+    features are the input columns in training order (see model_input_features).
+    """
+    if request._frame is not None or request.dataset_id or not request.data or request.indicators is not None:
+        return None
+    if len(request.data) > FAST_PREDICT_MAX_ROWS:
+        return None
+    
+    pipeline = _model_pipeline(model_data)
+    if pipeline is None:
+        return None
+    
+    missing_features = [f for f in features if not any(f in row for row in request.data)]
+    if missing_features:
+        return None
+    
+    try:
+        with stage("frame", model_data["model_type"]):
+            X = np.array([[row.get(f) for f in features] for row in request.data], dtype=np.float64)
+    except (TypeError, ValueError):
+        # Non-numeric cells: leave them to the pandas path and its error messages
+        return None
+    observe_rows(len(X))
+    
+    with stage("preprocess", model_data["model_type"]):
+        X_scaled = apply_pipeline(pipeline, X)
+    with stage("predict", model_data["model_type"]):
+        predictions, probabilities = _predict_batcher(request.model_id, model_data).predict(X_scaled)
+    return predictions.tolist(), probabilities.tolist() if probabilities is not None else None
+
+
+def _preprocessing_key(model_data: Dict[str, Any]):
+    """Models with equal keys impute and scale their input identically"""
+    imputer = model_data["imputer"]
+    scaler = model_data["scaler"]
+    return (
+        tuple(model_data["features"]),
+        np.asarray(imputer.statistics_).tobytes(),
+        np.asarray(scaler.mean_).tobytes(),
+        np.asarray(scaler.scale_).tobytes()
+    )
+
+
+@app.post("/predict")
+def predict(request: PredictRequest = Depends(ingest_body(PredictRequest))):
+    """Make predictions using a trained model"""
+    try:
+        if request.model_id not in trained_models:
+            raise HTTPException(status_code=404, detail=f"Model not found: {request.model_id}")
+        
+        model_data = trained_models[request.model_id]
+        features = model_input_features(request.features, model_data)
+        
+        # Small inline requests skip pandas entirely
+        fast = _fast_predict(request, model_data, features)
+        if fast is not None:
+            predictions, probabilities = fast
+            return {
+                "success": True,
+                "predictions": predictions,
+                "probabilities": probabilities,
+                "model_id": request.model_id,
+                "model_name": model_data["model_name"]
+            }
+        
+        scaler = model_data["scaler"]
+        imputer = model_data["imputer"]
+        
+        # Resolve inline rows or a registered dataset
+        df = request_frame(request)
+        
+        # Validate features
+        missing_features = [f for f in features if f not in df.columns]
+        if missing_features:
+            raise HTTPException(status_code=400, detail=f"Missing features: {missing_features}")
+        
+        # Prepare features
+        X = df[features].copy()
+        
+        # Handle missing values
+        with stage("impute", model_data["model_type"]):
+            X = pd.DataFrame(imputer.transform(X), columns=features)
+        
+        # Scale features
+        with stage("scale", model_data["model_type"]):
+            X_scaled = scaler.transform(X)
+        
+        # Make predictions
+        with stage("predict", model_data["model_type"]):
+            predictions, probabilities = _predict_scaled(model_data, X_scaled)
+        
+        return {
+            "success": True,
+            "predictions": predictions,
+            "probabilities": probabilities,
+            "model_id": request.model_id,
+            "model_name": model_data["model_name"]
+        }
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+def _compare_fit(views: Dict[str, np.ndarray], model_type: str, n_threads: int, chunked: bool = False):
+    """Fit one model on the shared train/test split and return its holdout metrics"""
+    started = time.perf_counter()
+    model = load_model_class(model_type)(**thread_limited_params(model_type, AVAILABLE_MODELS[model_type]["params"], n_threads))
+    if chunked and INCREMENTAL_UPDATES.get(model_type) == "partial_fit":
+        fit_in_chunks(model, views["X_train"], views["y_train"], 1)
+    else:
+        model.fit(views["X_train"], views["y_train"])
+    return {
+        **holdout_metrics(views["y_test"], predict_in_chunks(model.predict, views["X_test"])),
+        "fit_time": time.perf_counter() - started
+    }
+
+
+def run_model_comparison(model_types: List[str], X_train, X_test, y_train, y_test,
+                         max_workers: int, timeout: Optional[float], chunked: bool = False,
+                         cores: Optional[int] = None):
+    """Generator yielding each model's comparison result as soon as its fit finishes.
+
+    Every model fits in its own process so a slow one can be terminated at the
+    timeout; the split is placed in shared memory once and attached by workers.
+    chunked trains partial_fit models chunk by chunk, as for source_path data.
+    cores (default COMPARE_CPU_BUDGET) caps concurrent fits and is split between them.
+    """
+    known = []
+    for index, model_type in enumerate(model_types):
+        if model_type in AVAILABLE_MODELS:
+            known.append((index, model_type))
+        else:
+            yield {"index": index, "model_type": model_type, "error": f"Unknown model type: {model_type}"}
+    
+    if not known:
+        return
+    
+    cores = cores or COMPARE_CPU_BUDGET
+    max_workers = max(1, min(max_workers, len(known), cores))
+    n_threads = max(1, cores // max_workers)
+    arrays = {"X_train": X_train, "X_test": X_test, "y_train": y_train, "y_test": y_test}
+    tasks = [(_compare_fit, (model_type, n_threads, chunked)) for _, model_type in known]
+    
+    for position, result in run_in_processes(tasks, arrays, max_workers, timeout):
+        index, model_type = known[position]
+        yield {
+            "index": index,
+            "model_type": model_type,
+            "model_name": AVAILABLE_MODELS[model_type]["name"],
+            **result
+        }
+
+
+def cached_model_comparison(request: CompareModelsRequest, data_hash: str, X_train, X_test, y_train, y_test,
+                            max_workers: int, timeout: Optional[float]):
+    """run_model_comparison that answers repeated models from the result cache and fits the rest"""
+    keys = {}
+    pending = []
+    for index, model_type in enumerate(request.models):
+        if model_type in AVAILABLE_MODELS:
+            keys[index] = fit_fingerprint(
+                "compare", data_hash, features=request.features, target=request.target,
+                model_type=model_type, params=AVAILABLE_MODELS[model_type]["params"], test_size=request.test_size
+            )
+            cached = result_cache.get("compare", keys[index])
+            if cached is not None:
+                yield {"index": index, **cached, "cached": True}
+                continue
+        pending.append(index)
+    
+    if not pending:
+        return
+    
+    # Fewer workers than the budget need fewer cores; the rest stay free for other requests
+    results = leased(min(max_workers, COMPARE_CPU_BUDGET), lambda cores: run_model_comparison(
+        [request.models[i] for i in pending], X_train, X_test, y_train, y_test, max_workers, timeout,
+        chunked=bool(request.source_path), cores=cores
+    ))
+    for result in results:
+        index = pending[result["index"]]
+        if "error" not in result:
+            record_stage("fit", result["fit_time"], result["model_type"], endpoint="/compare")
+            result_cache.put("compare", keys[index], {k: v for k, v in result.items() if k != "index"})
+        yield {**result, "index": index}
+
+
+@app.post("/predict/batch")
+def predict_batch(request: BatchPredictRequest = Depends(ingest_body(BatchPredictRequest))):
+    """Predict the same rows with many models in one call.
+
+    Models whose feature list and fitted imputer/scaler match share a single
+    preprocessing pass; the models themselves run concurrently on the
+    cores of a scheduler lease, so a large batch cannot crowd out training.
+    """
+    try:
+        # Resolve inline rows or a registered dataset
+        df = request_frame(request)
+        
+        results = {}
+        groups = {}
+        for model_id in request.model_ids:
+            model_data = trained_models.get(model_id)
+            if model_data is None:
+                results[model_id] = {"model_id": model_id, "error": f"Model not found: {model_id}"}
+                continue
+            
+            missing_features = [f for f in model_data["features"] if f not in df.columns]
+            if missing_features:
+                results[model_id] = {
+                    "model_id": model_id,
+                    "model_name": model_data["model_name"],
+                    "error": f"Missing features: {missing_features}"
+                }
+                continue
+            
+            groups.setdefault(_preprocessing_key(model_data), []).append((model_id, model_data))
+        
+        # Impute and scale once per group
+        tasks = []
+        for members in groups.values():
+            _, first = members[0]
+            features = first["features"]
+            with stage("impute", first["model_type"]):
+                X = pd.DataFrame(first["imputer"].transform(df[features]), columns=features)
+            with stage("scale", first["model_type"]):
+                X_scaled = first["scaler"].transform(X)
+            tasks.extend((model_id, model_data, X_scaled) for model_id, model_data in members)
+        
+        def run(task):
+            model_id, model_data, X_scaled = task
+            try:
+                predictions, probabilities = _predict_scaled(model_data, X_scaled)
+                return {
+                    "model_id": model_id,
+                    "model_name": model_data["model_name"],
+                    "predictions": predictions,
+                    "probabilities": probabilities
+                }
+            except Exception as e:
+                return {"model_id": model_id, "model_name": model_data["model_name"], "error": str(e)}
+        
+        if tasks:
+            with cpu_scheduler.lease(len(tasks)) as lease, stage("predict"):
+                with ThreadPoolExecutor(max_workers=min(len(tasks), lease["cores"])) as executor:
+                    for result in executor.map(run, tasks):
+                        results[result["model_id"]] = result
+        
+        return {
+            "success": True,
+            "results": [results[model_id] for model_id in dict.fromkeys(request.model_ids)],
+            "rows": len(df),
+            "preprocessing_groups": len(groups)
+        }
+    
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+def decoded_classes(model_data: Dict[str, Any]) -> List[Any]:
+    """Original labels in the model's predict_proba column order"""
+    classes = model_data["model"].classes_
+    if model_data["label_encoder"]:
+        classes = model_data["label_encoder"].inverse_transform(classes)
+    return np.asarray(classes).tolist()
+
+
+def rank_rows(scores: np.ndarray, top_k: Optional[int], threshold: Optional[float]):
+    """Row indices by descending score, filtered by threshold and cut to top_k, and the count passing the threshold"""
+    order = np.argsort(-scores, kind="stable")
+    if threshold is not None:
+        order = order[scores[order] >= threshold]
+    matched = len(order)
+    if top_k is not None:
+        order = order[:max(top_k, 0)]
+    return order, matched
+
+
+@app.post("/score-universe")
+def score_universe(request: ScoreUniverseRequest = Depends(ingest_body(ScoreUniverseRequest))):
+    """Score a ticker-keyed feature matrix with one or more models and rank rows by class probability.
+
+    Each model predicts every row in one call, and models with the same
+    preprocessing share one impute/scale pass. With several models an
+    ensemble ranking averages their probabilities for the ranking class.
+    """
+    try:
+        # Resolve inline rows, a registered dataset or a binary body
+        df = request_frame(request)
+        if request.ticker_column not in df.columns:
+            raise HTTPException(status_code=400, detail=f"Ticker column not found: {request.ticker_column}")
+        tickers = df[request.ticker_column].to_numpy()
+        
+        results = {}
+        groups = {}
+        for model_id in dict.fromkeys(request.model_ids):
+            model_data = trained_models.get(model_id)
+            if model_data is None:
+                results[model_id] = {"model_id": model_id, "error": f"Model not found: {model_id}"}
+                continue
+            if not hasattr(model_data["model"], "predict_proba"):
+                results[model_id] = {
+                    "model_id": model_id,
+                    "model_name": model_data["model_name"],
+                    "error": "Model has no class probabilities to rank by"
+                }
+                continue
+            
+            missing_features = [f for f in model_data["features"] if f not in df.columns]
+            if missing_features:
+                results[model_id] = {
+                    "model_id": model_id,
+                    "model_name": model_data["model_name"],
+                    "error": f"Missing features: {missing_features}"
+                }
+                continue
+            
+            groups.setdefault(_preprocessing_key(model_data), []).append((model_id, model_data))
+        
+        ensemble = {}
+        for members in groups.values():
+            _, first = members[0]
+            features = first["features"]
+            with stage("preprocess", first["model_type"]):
+                pipeline = _model_pipeline(first)
+                if pipeline is not None:
+                    X_scaled = apply_pipeline(pipeline, df[features].to_numpy(dtype=np.float64, na_value=np.nan))
+                else:
+                    X_scaled = first["scaler"].transform(
+                        pd.DataFrame(first["imputer"].transform(df[features]), columns=features)
+                    )
+            
+            for model_id, model_data in members:
+                classes = decoded_classes(model_data)
+                rank_class = request.rank_class if request.rank_class is not None else classes[-1]
+                if rank_class not in classes:
+                    results[model_id] = {
+                        "model_id": model_id,
+                        "model_name": model_data["model_name"],
+                        "error": f"Class {rank_class!r} not among the model's classes {classes}"
+                    }
+                    continue
+                
+                try:
+                    with stage("predict", model_data["model_type"]):
+                        predictions, probabilities = predict_arrays(model_data, X_scaled)
+                except Exception as e:
+                    results[model_id] = {"model_id": model_id, "model_name": model_data["model_name"], "error": str(e)}
+                    continue
+                
+                scores = probabilities[:, classes.index(rank_class)]
+                order, matched = rank_rows(scores, request.top_k, request.threshold)
+                rows = [
+                    {"rank": rank, "ticker": ticker, "probability": score, "prediction": prediction}
+                    for rank, (ticker, score, prediction) in enumerate(zip(
+                        tickers[order].tolist(), scores[order].tolist(), np.asarray(predictions)[order].tolist()
+                    ), start=1)
+                ]
+                if request.include_probabilities:
+                    for row, row_probabilities in zip(rows, probabilities[order].tolist()):
+                        row["probabilities"] = dict(zip(map(str, classes), row_probabilities))
+                
+                results[model_id] = {
+                    "model_id": model_id,
+                    "model_name": model_data["model_name"],
+                    "rank_class": rank_class,
+                    "matched": matched,
+                    "rows": rows
+                }
+                ensemble.setdefault(rank_class, []).append(scores)
+        
+        response = {
+            "success": True,
+            "results": [results[model_id] for model_id in dict.fromkeys(request.model_ids)],
+            "universe": len(df),
+            "preprocessing_groups": len(groups)
+        }
+        
+        # Average the models that ranked by the same class
+        if len(ensemble) == 1 and len(next(iter(ensemble.values()))) > 1:
+            rank_class, members = next(iter(ensemble.items()))
+            scores = np.mean(members, axis=0)
+            order, matched = rank_rows(scores, request.top_k, request.threshold)
+            response["ensemble"] = {
+                "rank_class": rank_class,
+                "models": len(members),
+                "matched": matched,
+                "rows": [
+                    {"rank": rank, "ticker": ticker, "probability": score}
+                    for rank, (ticker, score) in enumerate(zip(tickers[order].tolist(), scores[order].tolist()), start=1)
+                ]
+            }
+        return response
+    
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+# Live predictions: clients subscribe to tickers over /ws/live and push bars (or a
+# feed posts them to /live/bars); each ticker keeps incremental indicator state and
+# every subscriber gets the new bar's predictions from its own models
+LIVE_QUEUE_SIZE = int(os.environ.get("LIVE_QUEUE_SIZE", "256"))  # Per connection; a slow client loses the oldest
+
+
+def _json_number(value):
+    """NaN and infinities as null, since JSON has no spelling for them"""
+    if isinstance(value, float) and not np.isfinite(value):
+        return None
+    return value
+
+
+def live_prediction(model_id: str, row: Dict[str, Any]) -> Dict[str, Any]:
+    """One model's prediction for a live row, through the model's shared predict batcher"""
+    model_data = trained_models.get(model_id)
+    if model_data is None:
+        return {"model_id": model_id, "error": f"Model not found: {model_id}"}
+    features = model_data["features"]
+    missing_features = [f for f in features if f not in row]
+    if missing_features:
+        return {"model_id": model_id, "model_name": model_data["model_name"], "error": f"Missing features: {missing_features}"}
+    
+    X = np.array([[row[f] if row[f] is not None else np.nan for f in features]], dtype=np.float64)
+    pipeline = _model_pipeline(model_data)
+    if pipeline is not None:
+        X_scaled = apply_pipeline(pipeline, X)
+    else:
+        X_scaled = model_data["scaler"].transform(
+            pd.DataFrame(model_data["imputer"].transform(pd.DataFrame(X, columns=features)), columns=features)
+        )
+    predictions, probabilities = _predict_batcher(model_id, model_data).predict(X_scaled)
+    result = {
+        "model_id": model_id,
+        "model_name": model_data["model_name"],
+        "prediction": np.asarray(predictions).tolist()[0]
+    }
+    if probabilities is not None:
+        result["probabilities"] = dict(zip(map(str, decoded_classes(model_data)), probabilities[0].tolist()))
+    return result
+
+
+class LiveSubscriber:
+    """A connection's outbox; hub threads hand messages to the connection's event loop"""
+    
+    def __init__(self, loop):
+        self.loop = loop
+        self.queue = asyncio.Queue(maxsize=LIVE_QUEUE_SIZE)
+        self.dropped = 0
+    
+    def send(self, message: Dict[str, Any]):
+        self.loop.call_soon_threadsafe(self.put, message)
+    
+    def put(self, message: Dict[str, Any]):
+        if self.queue.full():
+            self.queue.get_nowait()
+            self.dropped += 1
+        self.queue.put_nowait(message)
+
+
+class LiveHub:
+    """Live indicator state per subscribed ticker, shared by every subscriber of that ticker.
+    
+    A bar updates its ticker's state once; each model any subscriber asked for
+    predicts once, and every subscriber is sent its own models' results. A
+    ticker's bars are processed one at a time, so messages stay in bar order.
+    """
+    
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.tickers = {}
+        self.bars = 0
+    
+    def subscribe(self, subscriber: LiveSubscriber, ticker: str, model_ids: List[str],
+                  history: Optional[List[Dict[str, Any]]] = None) -> Dict[str, Any]:
+        """Register interest in a ticker; history seeds its state if nobody has yet"""
+        with self.lock:
+            entry = self.tickers.setdefault(ticker, {
+                "state": LiveIndicatorState(), "lock": threading.Lock(), "subscribers": {}, "row": None
+            })
+        with entry["lock"]:
+            if history and entry["state"].bars == 0:
+                for bar in history:
+                    entry["row"] = entry["state"].update(bar)
+            entry["subscribers"][subscriber] = list(dict.fromkeys(model_ids))
+            message = {"type": "subscribed", "ticker": ticker, "bars": entry["state"].bars}
+            if entry["row"] is not None:
+                message["latest"] = self._messages(ticker, entry, [subscriber])[subscriber]
+            return message
+    
+    def unsubscribe(self, subscriber: LiveSubscriber, ticker: Optional[str] = None):
+        """Drop one subscription, or all of a connection's; tickers nobody watches lose their state"""
+        with self.lock:
+            for name in [ticker] if ticker is not None else list(self.tickers):
+                entry = self.tickers.get(name)
+                if entry is None:
+                    continue
+                entry["subscribers"].pop(subscriber, None)
+                if not entry["subscribers"]:
+                    del self.tickers[name]
+    
+    def publish(self, ticker: str, bar: Dict[str, Any]) -> bool:
+        """Apply a new bar and push predictions to the ticker's subscribers; False if nobody subscribes"""
+        with self.lock:
+            entry = self.tickers.get(ticker)
+        if entry is None:
+            return False
+        with entry["lock"]:
+            entry["row"] = entry["state"].update(bar)
+            self.bars += 1
+            for subscriber, message in self._messages(ticker, entry, list(entry["subscribers"])).items():
+                subscriber.send(message)
+        return True
+    
+    def _messages(self, ticker, entry, subscribers):
+        """Each subscriber's message for the ticker's latest row, predicting every requested model once"""
+        row = entry["row"]
+        indicators = {name: _json_number(row[name]) for name in INDICATOR_COLUMNS}
+        predictions = {}
+        messages = {}
+        for subscriber in subscribers:
+            model_ids = entry["subscribers"][subscriber]
+            for model_id in model_ids:
+                if model_id not in predictions:
+                    try:
+                        predictions[model_id] = live_prediction(model_id, row)
+                    except Exception as e:
+                        predictions[model_id] = {"model_id": model_id, "error": str(e)}
+            messages[subscriber] = {
+                "type": "prediction",
+                "ticker": ticker,
+                "date": row.get("date"),
+                "bars": entry["state"].bars,
+                "indicators": indicators,
+                "results": [predictions[model_id] for model_id in model_ids]
+            }
+        return messages
+    
+    def stats(self) -> Dict[str, Any]:
+        with self.lock:
+            return {
+                "tickers": len(self.tickers),
+                "subscriptions": sum(len(entry["subscribers"]) for entry in self.tickers.values()),
+                "bars_processed": self.bars
+            }
+
+
+live_hub = LiveHub()
+
+
+def handle_live_message(subscriber: LiveSubscriber, message: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """Apply one client message; returns the reply, if any, for that client"""
+    kind = message.get("type")
+    ticker = message.get("ticker")
+    if kind in ("subscribe", "unsubscribe", "bar") and not isinstance(ticker, str):
+        return {"type": "error", "detail": f"{kind} needs a ticker"}
+    if kind == "subscribe":
+        model_ids = message.get("model_ids") or []
+        if not isinstance(model_ids, list) or not model_ids:
+            return {"type": "error", "ticker": ticker, "detail": "subscribe needs model_ids"}
+        return live_hub.subscribe(subscriber, ticker, model_ids, message.get("bars"))
+    if kind == "unsubscribe":
+        live_hub.unsubscribe(subscriber, ticker)
+        return {"type": "unsubscribed", "ticker": ticker}
+    if kind == "bar":
+        if not live_hub.publish(ticker, message.get("bar") or {}):
+            return {"type": "error", "ticker": ticker, "detail": f"Not subscribed to {ticker}"}
+        return None
+    return {"type": "error", "detail": f"Unknown message type: {kind}"}
+
+
+@app.websocket("/ws/live")
+async def live_socket(websocket: WebSocket):
+    """Live predictions over a WebSocket.
+    
+    Client messages (JSON):
+      {"type": "subscribe", "ticker": ..., "model_ids": [...], "bars": [optional history]}
+      {"type": "bar", "ticker": ..., "bar": {"date", "open", "high", "low", "close", "volume"}}
+      {"type": "unsubscribe", "ticker": ...}
+    Every bar of a subscribed ticker, from any client or /live/bars, is answered
+    with a {"type": "prediction"} message carrying the bar's indicators and the
+    subscriber's model results.
+    """
+    await websocket.accept()
+    subscriber = LiveSubscriber(asyncio.get_running_loop())
+    
+    async def forward():
+        while True:
+            await websocket.send_json(await subscriber.queue.get())
+    
+    sender = asyncio.create_task(forward())
+    try:
+        while True:
+            text = await websocket.receive_text()
+            try:
+                message = json.loads(text)
+                reply = await run_in_threadpool(handle_live_message, subscriber, message)
+            except Exception as e:
+                reply = {"type": "error", "detail": str(e)}
+            if reply is not None:
+                subscriber.put(reply)
+    except WebSocketDisconnect:
+        pass
+    finally:
+        sender.cancel()
+        live_hub.unsubscribe(subscriber)
+
+
+class LiveBarsRequest(BaseModel):
+    bars: List[Dict[str, Any]]  # In time order; each carries its ticker
+    ticker_column: str = "ticker"
+
+
+@app.post("/live/bars")
+def publish_live_bars(request: LiveBarsRequest):
+    """Feed new bars (e.g. from a market data poller) to every live subscriber of their tickers"""
+    try:
+        published = 0
+        for bar in request.bars:
+            published += live_hub.publish(str(bar.get(request.ticker_column)), bar)
+        return {"success": True, "published": published, "ignored": len(request.bars) - published}
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.get("/live")
+def live_stats():
+    """Live subscription counts"""
+    return live_hub.stats()
+
+
+@app.post("/compare")
+def compare_models(request: CompareModelsRequest = Depends(ingest_body(CompareModelsRequest))):
+    """Compare multiple models on the same dataset, fitting them in parallel"""
+    try:
+        if request.source_path:
+            # Workers map the materialized train/test files instead of copying them
+            source = resolve_source_path(request.source_path)
+            with stage("source"):
+                materialized = materialize_source(source, request.features, request.target, request.test_size)
+            X_train, X_test = materialized["X_train"], materialized["X_test"]
+            y_train, y_test = materialized["y_train"], materialized["y_test"]
+            data_hash = f"source:{source_fingerprint(source)}"
+            total_samples = materialized["rows"]
+        else:
+            # Resolve inline rows or a registered dataset
+            df = request_frame(request)
+            data_hash = data_fingerprint(df, request.features + [request.target])
+            total_samples = len(df)
+            
+            # Impute, encode and scale
+            if request.lean:
+                X_scaled, y, n_train, _, _, _, _ = prepare_lean_training_data(
+                    df, request.features, request.target, request.test_size
+                )
+                X_train, X_test = X_scaled[:n_train], X_scaled[n_train:]
+                y_train, y_test = y[:n_train], y[n_train:]
+                data_hash = f"lean:{data_hash}"
+            else:
+                X_scaled, y, _, _, _, _ = prepare_training_data(df, request.features, request.target)
+                
+                # Split data
+                with stage("split"):
+                    X_train, X_test, y_train, y_test = train_test_split(
+                        X_scaled, y, test_size=request.test_size, random_state=42, stratify=y
+                    )
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    
+    data_info = {
+        "total_samples": total_samples,
+        "train_samples": len(X_train),
+        "test_samples": len(X_test)
+    }
+    max_workers = request.max_workers or COMPARE_CPU_BUDGET
+    timeout = request.timeout if request.timeout is not None else COMPARE_MODEL_TIMEOUT
+    results = cached_model_comparison(request, data_hash, X_train, X_test, y_train, y_test, max_workers, timeout)
+    
+    if not request.stream:
+        try:
+            results = [{k: v for k, v in result.items() if k != "index"} for result in results]
+        except HTTPException:
+            raise
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=str(e))
+        
+        # Sort by accuracy
+        results.sort(key=lambda x: x.get("accuracy", 0), reverse=True)
+        
+        return {"success": True, "results": results, "data_info": data_info}
+    
+    def stream_results():
+        yield json.dumps({"event": "start", "models": request.models, "data_info": data_info}) + "\n"
+        collected = []
+        try:
+            for result in results:
+                collected.append(result)
+                yield json.dumps({"event": "result", **result}) + "\n"
+        except Exception as e:
+            yield json.dumps({"event": "error", "detail": str(e)}) + "\n"
+        
+        collected.sort(key=lambda x: x.get("accuracy", 0), reverse=True)
+        yield json.dumps({"event": "done", "ranking": [r["model_type"] for r in collected if "error" not in r]}) + "\n"
+    
+    return StreamingResponse(stream_results(), media_type="application/x-ndjson")
+
+
+def _score_feature_subset(model_class, params, X_train, X_test, y_train, y_test, columns):
+    """Fit on a column subset of the cached matrices and return holdout metrics"""
+    model = model_class(**params)
+    model.fit(X_train[:, columns], y_train)
+    return holdout_metrics(y_test, model.predict(X_test[:, columns]))
+
+
+def _model_importances(model):
+    """Per-feature importance from a fitted model, or None if it exposes none"""
+    if hasattr(model, 'feature_importances_'):
+        return np.asarray(model.feature_importances_, dtype=float)
+    if hasattr(model, 'coef_'):
+        return np.abs(model.coef_).mean(axis=0) if len(model.coef_.shape) > 1 else np.abs(model.coef_)
+    return None
+
+
+def run_feature_selection(request: FeatureSelectionRequest, X_train, X_test, y_train, y_test,
+                          data_hash: Optional[str] = None, n_jobs: Optional[int] = None):
+    """Generator yielding progress events for a feature selection run.
+
+    Candidates are scored by slicing columns of the already imputed and scaled
+    matrices, so each candidate costs one fit instead of a full /train call.
+    With data_hash, subsets scored before on the same data come from the result cache.
+    n_jobs overrides request.n_jobs, e.g. with the cores of a lease.
+    """
+    n_jobs = n_jobs or request.n_jobs
+    model_config = AVAILABLE_MODELS[request.model_type]
+    model_class = load_model_class(request.model_type)
+    base_params = model_config["params"].copy()
+    if request.custom_params:
+        base_params.update(request.custom_params)
+    
+    # Candidates already run in parallel, so keep each candidate fit single-threaded
+    params = thread_limited_params(request.model_type, base_params, 1) if n_jobs != 1 else base_params.copy()
+    
+    features = request.features
+    index = {f: i for i, f in enumerate(features)}
+    parallel = Parallel(n_jobs=n_jobs)
+    
+    def subset_key(subset):
+        return fit_fingerprint(
+            "subset", data_hash, features=list(subset), target=request.target,
+            model_type=request.model_type, params=base_params, test_size=request.test_size
+        )
+    
+    def score_subsets(subsets):
+        results = [None] * len(subsets)
+        if data_hash is not None:
+            results = [result_cache.get("subset", subset_key(subset)) for subset in subsets]
+        pending = [i for i, result in enumerate(results) if result is None]
+        scored = parallel(
+            delayed(_score_feature_subset)(
+                model_class, params, X_train, X_test, y_train, y_test, [index[f] for f in subsets[i]]
+            )
+            for i in pending
+        )
+        for i, metrics in zip(pending, scored):
+            results[i] = metrics
+            if data_hash is not None:
+                result_cache.put("subset", subset_key(subsets[i]), metrics)
+        return results
+    
+    best = {"score": -1.0, "features": [], "step": 0, "metrics": None}
+    
+    def track_best(step, subset, score, metrics):
+        if score > best["score"]:
+            best.update({"score": score, "features": list(subset), "step": step, "metrics": metrics})
+    
+    if request.method == "forward":
+        max_features = min(request.max_features or len(features), len(features))
+        selected = []
+        remaining = list(features)
+        current_score = None
         
-        # Use custom name if provided, otherwise use default model name
-        display_name = request.model_name if request.model_name else model_config["name"]
+        for step in range(1, max_features + 1):
+            results = score_subsets([selected + [f] for f in remaining])
+            candidates = sorted(zip(remaining, results), key=lambda x: x[1]["accuracy"], reverse=True)
+            feature, metrics = candidates[0]
+            score = metrics["accuracy"]
+            
+            if current_score is not None and score - current_score <= request.min_improvement:
+                yield {"event": "stopped", "step": step, "reason": "no_improvement",
+                       "best_candidate": {"feature": feature, "score": score}}
+                break
+            
+            improvement = score - current_score if current_score is not None else score
+            selected.append(feature)
+            remaining.remove(feature)
+            current_score = score
+            track_best(step, selected, score, metrics)
+            
+            yield {
+                "event": "step",
+                "step": step,
+                "added": feature,
+                "features": list(selected),
+                "score": score,
+                "improvement": improvement,
+                "metrics": metrics,
+                "candidates": [{"feature": f, "score": m["accuracy"]} for f, m in candidates]
+            }
+    
+    elif request.method == "backward":
+        selected = list(features)
+        metrics = score_subsets([selected])[0]
+        current_score = metrics["accuracy"]
+        track_best(0, selected, current_score, metrics)
+        yield {"event": "step", "step": 0, "removed": None, "features": list(selected),
+               "score": current_score, "metrics": metrics}
         
-        # Store model only if skip_save is False
-        if not request.skip_save:
-            trained_models[model_id] = {
-                "model": model,
-                "scaler": scaler,
-                "imputer": imputer,
-                "label_encoder": label_encoder,
-                "model_type": request.model_type,
-                "model_name": display_name,
-                "features": request.features,
-                "target": request.target,
-                "original_classes": original_classes,
+        step = 0
+        while len(selected) > max(request.min_features, 1):
+            step += 1
+            results = score_subsets([[f for f in selected if f != drop] for drop in selected])
+            candidates = sorted(zip(selected, results), key=lambda x: x[1]["accuracy"], reverse=True)
+            feature, metrics = candidates[0]
+            score = metrics["accuracy"]
+            
+            if score < current_score:
+                yield {"event": "stopped", "step": step, "reason": "no_improvement",
+                       "best_candidate": {"feature": feature, "score": score}}
+                break
+            
+            improvement = score - current_score
+            selected.remove(feature)
+            current_score = score
+            track_best(step, selected, score, metrics)
+            
+            yield {
+                "event": "step",
+                "step": step,
+                "removed": feature,
+                "features": list(selected),
+                "score": score,
+                "improvement": improvement,
                 "metrics": metrics,
-                "feature_importance": feature_importance,
-                "params": params,
-                "trained_at": datetime.now().isoformat(),
-                "data_shape": {"samples": len(df), "features": len(request.features)}
+                "candidates": [{"feature": f, "score": m["accuracy"]} for f, m in candidates]
             }
+    
+    else:
+        # Recursive elimination: one fit per step ranks features and scores the subset.
+        # The fits run one at a time, so each gets the whole lease. Models without
+        # importances or coefficients (k-NN, RBF SVMs, ...) are ranked by permutation
+        # importance on a sample of the training rows, never on the scored holdout.
+        fit_params = thread_limited_params(request.model_type, base_params, n_jobs)
+        ranking_rows = keep_holdout(X_train, y_train)
+        scorer = _permutation_scorer("accuracy")
+        selected = list(features)
+        step = 0
+        while True:
+            columns = [index[f] for f in selected]
+            with threadpool_limits(limits=n_jobs if n_jobs > 0 else None):
+                model = model_class(**fit_params)
+                model.fit(X_train[:, columns], y_train)
+                metrics = holdout_metrics(y_test, model.predict(X_test[:, columns]))
+            score = metrics["accuracy"]
+            importances = _model_importances(model)
+            importance_source = "model"
+            if importances is None:
+                _, drops = permutation_scores(
+                    model, ranking_rows["X"][:, columns], ranking_rows["y"], scorer, 3, max(n_jobs, 1), 42
+                )
+                importances = np.array([d.mean() for d in drops])
+                importance_source = "permutation"
             
-            # Add to history
-            model_history.append({
-                "model_id": model_id,
-                "model_type": request.model_type,
-                "model_name": display_name,
-                "accuracy": metrics["accuracy"],
-                "trained_at": datetime.now().isoformat()
-            })
-        
-        return {
-            "success": True,
-            "model_id": model_id if not request.skip_save else None,
-            "model_saved": not request.skip_save,
-            "model_name": display_name,
-            "model_type_name": model_config["name"],
-            "metrics": metrics,
-            "feature_importance": feature_importance,
-            "data_info": {
-                "total_samples": len(df),
-                "train_samples": len(X_train),
-                "test_samples": len(X_test),
-                "features_count": len(request.features),
-                "classes": original_classes
+            ranking = sorted(zip(selected, importances), key=lambda x: x[1])
+            removed = ranking[0][0] if len(selected) > max(request.min_features, 1) else None
+            track_best(step, selected, score, metrics)
+            
+            yield {
+                "event": "step",
+                "step": step,
+                "features": list(selected),
+                "score": score,
+                "metrics": metrics,
+                "removed": removed,
+                "importance_source": importance_source,
+                "ranking": [{"feature": f, "importance": float(imp)} for f, imp in reversed(ranking)]
             }
-        }
-        
+            
+            if removed is None:
+                break
+            selected.remove(removed)
+            step += 1
+    
+    yield {"event": "done", "best": best}
+
+
+@app.post("/feature-selection")
+def feature_selection(request: FeatureSelectionRequest = Depends(ingest_body(FeatureSelectionRequest))):
+    """Forward, backward or recursive feature selection on a single preprocessed matrix"""
+    if request.model_type not in AVAILABLE_MODELS:
+        raise HTTPException(status_code=400, detail=f"Unknown model type: {request.model_type}")
+    
+    if request.method not in ("forward", "backward", "recursive"):
+        raise HTTPException(status_code=400, detail=f"Unknown selection method: {request.method}")
+    
+    if not request.features:
+        raise HTTPException(status_code=400, detail="At least one feature is required")
+    
+    try:
+        # Preprocess once; every candidate subset is a column slice of these arrays
+        df = request_frame(request)
+        X_scaled, y, _, _, _, _ = prepare_training_data(df, request.features, request.target)
+        data_hash = data_fingerprint(df, request.features + [request.target])
+        X_train, X_test, y_train, y_test = train_test_split(
+            X_scaled, y, test_size=request.test_size, random_state=42, stratify=y
+        )
+        y_train = np.asarray(y_train)
+        y_test = np.asarray(y_test)
     except HTTPException:
         raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+    
+    start_event = {
+        "event": "start",
+        "method": request.method,
+        "model_type": request.model_type,
+        "features_count": len(request.features),
+        "train_samples": len(X_train),
+        "test_samples": len(X_test)
+    }
+    events = leased(request.n_jobs, lambda cores: run_feature_selection(
+        request, X_train, X_test, y_train, y_test, data_hash, n_jobs=cores
+    ))
+    
+    if not request.stream:
+        try:
+            events = list(events)
+        except HTTPException:
+            raise
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=str(e))
+        return {
+            "success": True,
+            **{k: v for k, v in start_event.items() if k != "event"},
+            "steps": [event for event in events if event["event"] == "step"],
+            "best": events[-1]["best"]
+        }
+    
+    def stream_events():
+        yield json.dumps(start_event) + "\n"
+        try:
+            for event in events:
+                yield json.dumps(event) + "\n"
+        except Exception as e:
+            yield json.dumps({"event": "error", "detail": str(e)}) + "\n"
+    
+    return StreamingResponse(stream_events(), media_type="application/x-ndjson")
 
 
-@app.post("/predict")
-def predict(request: PredictRequest):
-    """Make predictions using a trained model"""
+@app.post("/backtest")
+def backtest(request: BacktestRequest = Depends(ingest_body(BacktestRequest))):
+    """Walk-forward evaluation over a date column with expanding or rolling training windows"""
+    if request.model_type not in AVAILABLE_MODELS:
+        raise HTTPException(status_code=400, detail=f"Unknown model type: {request.model_type}")
+    
+    if request.mode not in ("expanding", "rolling"):
+        raise HTTPException(status_code=400, detail=f"Unknown backtest mode: {request.mode}")
+    
+    if request.train_periods < 1 or request.test_periods < 1 or request.gap < 0 or (request.step is not None and request.step < 1):
+        raise HTTPException(status_code=400, detail="train_periods, test_periods and step must be positive and gap non-negative")
+    
     try:
-        if request.model_id not in trained_models:
-            raise HTTPException(status_code=404, detail=f"Model not found: {request.model_id}")
-        
-        model_data = trained_models[request.model_id]
-        model = model_data["model"]
-        scaler = model_data["scaler"]
-        imputer = model_data["imputer"]
-        label_encoder = model_data["label_encoder"]
-        
-        # Convert data to DataFrame
-        df = pd.DataFrame(request.data)
-        
-        # Validate features
-        missing_features = [f for f in request.features if f not in df.columns]
-        if missing_features:
-            raise HTTPException(status_code=400, detail=f"Missing features: {missing_features}")
-        
-        # Prepare features
-        X = df[request.features].copy()
-        
-        # Handle missing values
-        X = pd.DataFrame(imputer.transform(X), columns=request.features)
-        
-        # Scale features
-        X_scaled = scaler.transform(X)
-        
-        # Make predictions
-        predictions = model.predict(X_scaled)
-        
-        # Get probabilities if available
-        probabilities = None
-        if hasattr(model, 'predict_proba'):
-            probabilities = model.predict_proba(X_scaled).tolist()
+        df = request_frame(request)
+        missing = [c for c in request.features + [request.target, request.date_column] if c not in df.columns]
+        if missing:
+            raise HTTPException(status_code=400, detail=f"Missing columns: {missing}")
         
-        # Decode labels if needed
-        if label_encoder:
-            predictions = label_encoder.inverse_transform(predictions)
+        # Order rows by date; drop rows without a label or date
+        dates = pd.to_datetime(df[request.date_column], errors="coerce")
+        mask = (df[request.target].notna() & dates.notna()).to_numpy()
+        order = np.argsort(dates.to_numpy()[mask], kind="stable")
+        dates = dates.to_numpy()[mask][order]
+        X = df[request.features].to_numpy(dtype=float)[mask][order]
+        target = df[request.target][mask].iloc[order]
         
-        return {
-            "success": True,
-            "predictions": predictions.tolist(),
-            "probabilities": probabilities,
-            "model_id": request.model_id,
-            "model_name": model_data["model_name"]
-        }
+        # Labels are encoded once over all rows; fill values and scaling are fitted per window
+        label_encoder = None
+        if target.dtype == 'object' or isinstance(target.iloc[0], str):
+            label_encoder = LabelEncoder()
+            y = label_encoder.fit_transform(target)
+        else:
+            y = target.to_numpy()
         
+        windows = backtest_windows(
+            dates, request.mode, request.train_periods, request.test_periods,
+            request.step or request.test_periods, request.gap
+        )
     except HTTPException:
         raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+    
+    if not windows:
+        raise HTTPException(status_code=400, detail="Not enough distinct dates for one training and test window")
+    
+    start_event = {
+        "event": "start",
+        "model_type": request.model_type,
+        "mode": request.mode,
+        "windows": len(windows),
+        "rows": len(y),
+        "first_date": pd.Timestamp(dates[0]).isoformat(),
+        "last_date": pd.Timestamp(dates[-1]).isoformat(),
+        "classes": label_encoder.classes_.tolist() if label_encoder else np.unique(y).tolist()
+    }
+    events = leased(request.n_jobs, lambda cores: run_backtest(request, X, y, windows, n_jobs=cores))
+    
+    if not request.stream:
+        try:
+            events = list(events)
+        except HTTPException:
+            raise
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=str(e))
+        return {
+            "success": True,
+            **{k: v for k, v in start_event.items() if k != "event"},
+            "results": events[:-1],
+            "summary": {k: v for k, v in events[-1].items() if k != "event"}
+        }
+    
+    def stream_events():
+        yield json.dumps(start_event) + "\n"
+        try:
+            for event in events:
+                yield json.dumps(event) + "\n"
+        except Exception as e:
+            yield json.dumps({"event": "error", "detail": str(e)}) + "\n"
+    
+    return StreamingResponse(stream_events(), media_type="application/x-ndjson")
 
 
-@app.post("/compare")
-def compare_models(request: CompareModelsRequest):
-    """Compare multiple models on the same dataset"""
+@app.post("/tune")
+def tune_model(request: TuneRequest = Depends(ingest_body(TuneRequest))):
+    """Search a model's hyperparameters with successive halving and save the best config"""
+    if request.model_type not in AVAILABLE_MODELS:
+        raise HTTPException(status_code=400, detail=f"Unknown model type: {request.model_type}")
+    
+    if request.method not in ("halving", "hyperband"):
+        raise HTTPException(status_code=400, detail=f"Unknown search method: {request.method}")
+    
+    if request.resource not in ("rows", "estimators"):
+        raise HTTPException(status_code=400, detail=f"Unknown resource: {request.resource}")
+    
+    count_param = ESTIMATOR_COUNT_PARAMS.get(request.model_type, "n_estimators")
+    if request.resource == "estimators" and count_param not in AVAILABLE_MODELS[request.model_type]["params"]:
+        raise HTTPException(status_code=400, detail=f"{request.model_type} has no estimator count to use as the resource")
+    
+    if request.metric not in ("accuracy", "precision", "recall", "f1_score"):
+        raise HTTPException(status_code=400, detail=f"Unknown metric: {request.metric}")
+    
+    if request.eta < 2 or request.n_candidates < 1 or request.max_estimators < 1:
+        raise HTTPException(status_code=400, detail="eta must be at least 2, n_candidates and max_estimators positive")
+    
+    validate_search_space(request.search_space or SEARCH_SPACES.get(request.model_type, {}))
+    deadline = time.monotonic() + (request.time_budget if request.time_budget is not None else TUNE_TIME_BUDGET)
+    
     try:
-        # Convert data to DataFrame
-        df = pd.DataFrame(request.data)
-        
-        # Validate features and target
-        missing_features = [f for f in request.features if f not in df.columns]
-        if missing_features:
-            raise HTTPException(status_code=400, detail=f"Missing features: {missing_features}")
-        
-        if request.target not in df.columns:
-            raise HTTPException(status_code=400, detail=f"Target column not found: {request.target}")
-        
-        # Prepare features and target
-        X = df[request.features].copy()
-        y = df[request.target].copy()
-        
-        # Handle missing values
-        imputer = SimpleImputer(strategy='median')
-        X = pd.DataFrame(imputer.fit_transform(X), columns=request.features)
-        
-        # Remove rows where target is null
-        mask = y.notna()
-        X = X[mask]
-        y = y[mask]
-        
-        # Encode target if needed
-        label_encoder = None
-        if y.dtype == 'object' or isinstance(y.iloc[0], str):
-            label_encoder = LabelEncoder()
-            y = label_encoder.fit_transform(y)
-        
-        # Scale features
-        scaler = StandardScaler()
-        X_scaled = scaler.fit_transform(X)
-        
-        # Split data
-        X_train, X_test, y_train, y_test = train_test_split(
+        # Trials never see the final test rows: they fit and score inside the training split
+        df = request_frame(request)
+        X_scaled, y, _, _, _, _ = prepare_training_data(df, request.features, request.target)
+        X_train, _, y_train, _ = train_test_split(
             X_scaled, y, test_size=request.test_size, random_state=42, stratify=y
         )
+        X_fit, X_val, y_fit, y_val = train_test_split(
+            X_train, y_train, test_size=request.validation_size, random_state=42, stratify=y_train
+        )
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    
+    start_event = {
+        "event": "start",
+        "model_type": request.model_type,
+        "method": request.method,
+        "resource": request.resource,
+        "tuning_samples": len(X_fit),
+        "validation_samples": len(X_val)
+    }
+    
+    def events():
+        searched = None
+        # The lease is released once the search ends, before the refit takes its own
+        wanted = min(request.max_workers or COMPARE_CPU_BUDGET, COMPARE_CPU_BUDGET)
+        search = leased(wanted, lambda cores: run_tuning(request, X_fit, y_fit, X_val, y_val, deadline, cores))
+        for event in search:
+            if event["event"] == "searched":
+                searched = event
+            else:
+                yield event
         
-        results = []
-        
-        for model_type in request.models:
-            if model_type not in AVAILABLE_MODELS:
-                results.append({
-                    "model_type": model_type,
-                    "error": f"Unknown model type: {model_type}"
-                })
-                continue
-            
-            try:
-                model_config = AVAILABLE_MODELS[model_type]
-                model = model_config["class"](**model_config["params"])
-                model.fit(X_train, y_train)
-                
-                y_pred = model.predict(X_test)
-                
-                accuracy = float(accuracy_score(y_test, y_pred))
-                precision = float(precision_score(y_test, y_pred, average='weighted', zero_division=0))
-                recall = float(recall_score(y_test, y_pred, average='weighted', zero_division=0))
-                f1 = float(f1_score(y_test, y_pred, average='weighted', zero_division=0))
-                
-                results.append({
-                    "model_type": model_type,
-                    "model_name": model_config["name"],
-                    "accuracy": accuracy,
-                    "precision": precision,
-                    "recall": recall,
-                    "f1_score": f1
-                })
-                
-            except Exception as e:
-                results.append({
-                    "model_type": model_type,
-                    "model_name": model_config["name"],
-                    "error": str(e)
-                })
-        
-        # Sort by accuracy
-        results.sort(key=lambda x: x.get("accuracy", 0), reverse=True)
+        best = searched["best"]
+        if best is None:
+            raise ValueError("No trial finished within the time budget")
         
+        # Refit the winner like /train so it is stored as a regular model. Every field
+        # the two requests share is passed on, so the refit sees the same rows the trials did
+        shared = {name: getattr(request, name) for name in TrainRequest.model_fields if name in TuneRequest.model_fields}
+        train_request = TrainRequest(**{**shared, "custom_params": best["params"]})
+        train_request._frame = request._frame
+        trained = run_training(train_request)
+        yield {
+            "event": "done",
+            "trials": searched["trials"],
+            "timed_out": searched["timed_out"],
+            "best": best,
+            "model_id": trained["model_id"],
+            "metrics": trained["metrics"]
+        }
+    
+    if not request.stream:
+        try:
+            results = list(events())
+        except HTTPException:
+            raise
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=str(e))
+        done = results[-1]
         return {
             "success": True,
-            "results": results,
-            "data_info": {
-                "total_samples": len(df),
-                "train_samples": len(X_train),
-                "test_samples": len(X_test)
-            }
+            **{k: v for k, v in start_event.items() if k != "event"},
+            "trials": [event for event in results if event["event"] == "trial"],
+            **{k: v for k, v in done.items() if k not in ("event", "trials")}
         }
-        
-    except HTTPException:
-        raise
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+    
+    def stream_events():
+        yield json.dumps(start_event) + "\n"
+        try:
+            for event in events():
+                yield json.dumps(event) + "\n"
+        except Exception as e:
+            yield json.dumps({"event": "error", "detail": str(e)}) + "\n"
+    
+    return StreamingResponse(stream_events(), media_type="application/x-ndjson")
 
 
 @app.get("/feature-importance/{model_id}")
@@ -609,61 +3182,460 @@ def get_feature_importance(model_id: str, top_n: int = 20):
     }
 
 
+# Scaled holdout rows kept with each trained model for permutation importance
+PERMUTATION_HOLDOUT_ROWS = int(os.environ.get("PERMUTATION_HOLDOUT_ROWS", "5000"))
+
+
+def keep_holdout(X_test, y_test) -> Dict[str, np.ndarray]:
+    """A copy of (at most PERMUTATION_HOLDOUT_ROWS of) the scaled test split and its encoded labels"""
+    rows = np.arange(len(y_test))
+    if len(rows) > PERMUTATION_HOLDOUT_ROWS:
+        rows = np.sort(np.random.default_rng(42).choice(rows, PERMUTATION_HOLDOUT_ROWS, replace=False))
+    return {"X": np.array(X_test[rows]), "y": np.array(np.asarray(y_test)[rows])}
+
+
+def _permutation_scorer(scoring: str):
+    if scoring == "accuracy":
+        return lambda model, X, y: accuracy_score(y, model.predict(X))
+    if scoring == "f1":
+        return lambda model, X, y: f1_score(y, model.predict(X), average="weighted", zero_division=0)
+    if scoring == "roc_auc":
+        return lambda model, X, y: roc_auc_score(y, model.predict_proba(X)[:, 1])
+    raise HTTPException(status_code=400, detail=f"Unknown scoring: {scoring} (use accuracy, f1 or roc_auc)")
+
+
+def permutation_scores(model, X: np.ndarray, y: np.ndarray, scorer, n_repeats: int, n_jobs: int, seed: int):
+    """Baseline score and each column's score drops when that column is shuffled.
+    
+    Columns are dealt out to n_jobs threads. Each thread shuffles columns of its
+    own working copy of X in place and puts them back afterwards, so the matrix
+    is copied once per thread rather than once per feature or repeat. Each
+    column's shuffles come from its own seed, so results do not depend on n_jobs.
+    """
+    baseline = scorer(model, X, y)
+    
+    def run(columns):
+        work = np.array(X, copy=True)
+        drops = {}
+        for column in columns:
+            original = work[:, column].copy()
+            rng = np.random.default_rng([seed, column])
+            drops[column] = []
+            for _ in range(n_repeats):
+                work[:, column] = original[rng.permutation(len(original))]
+                drops[column].append(baseline - scorer(model, work, y))
+            work[:, column] = original
+        return drops
+    
+    n_jobs = max(1, min(n_jobs, X.shape[1]))
+    drops = {}
+    with ThreadPoolExecutor(max_workers=n_jobs) as executor:
+        for part in executor.map(run, [list(range(X.shape[1]))[i::n_jobs] for i in range(n_jobs)]):
+            drops.update(part)
+    return baseline, [np.asarray(drops[column]) for column in range(X.shape[1])]
+
+
+@app.get("/feature-importance/{model_id}/permutation")
+def get_permutation_importance(model_id: str, n_repeats: int = 5, scoring: str = "accuracy",
+                               sample: Optional[int] = None, top_n: int = 20, n_jobs: Optional[int] = None,
+                               seed: int = 42):
+    """Permutation importance on the holdout rows stored at training time, for any model type
+    
+    sample scores a random subset of the holdout for a faster estimate. Results
+    are cached per model until it is retrained or updated.
+    """
+    try:
+        if model_id not in trained_models:
+            raise HTTPException(status_code=404, detail=f"Model not found: {model_id}")
+        model_data = trained_models[model_id]
+        holdout = model_data.get("holdout")
+        if holdout is None:
+            raise HTTPException(status_code=400, detail="No holdout stored for this model; retrain it to get one")
+        if n_repeats < 1:
+            raise HTTPException(status_code=400, detail="n_repeats must be at least 1")
+        scorer = _permutation_scorer(scoring)
+        if scoring == "roc_auc" and (len(np.unique(holdout["y"])) != 2 or not hasattr(model_data["model"], "predict_proba")):
+            raise HTTPException(status_code=400, detail="roc_auc needs a binary model with predict_proba")
+        
+        X, y = holdout["X"], holdout["y"]
+        if sample is not None and sample < len(y):
+            rows = np.sort(np.random.default_rng(seed).choice(len(y), sample, replace=False))
+            X, y = X[rows], y[rows]
+        
+        cache_key = fit_fingerprint(
+            "permutation", model_id, trained_at=model_data["trained_at"], updates=len(model_data.get("updates", [])),
+            n_repeats=n_repeats, scoring=scoring, rows=len(y), seed=seed
+        )
+        cached = result_cache.get("permutation", cache_key)
+        if cached is None:
+            started = time.perf_counter()
+            with cpu_scheduler.lease(n_jobs) as lease, stage("permutation", model_data["model_type"]):
+                # Threads split the features, so each prediction runs single-threaded
+                model = model_data["model"]
+                if getattr(model, "n_jobs", None) not in (None, 1):
+                    model = copy.copy(model)
+                    model.n_jobs = 1
+                baseline, drops = permutation_scores(model, X, y, scorer, n_repeats, lease["cores"], seed)
+            importance = sorted(
+                (
+                    {"feature": feature, "importance": float(drop.mean()), "std": float(drop.std())}
+                    for feature, drop in zip(model_data["features"], drops)
+                ),
+                key=lambda item: item["importance"], reverse=True
+            )
+            cached = {
+                "model_id": model_id,
+                "baseline_score": float(baseline),
+                "feature_importance": importance,
+                "seconds": time.perf_counter() - started
+            }
+            result_cache.put("permutation", cache_key, cached)
+            hit = False
+        else:
+            hit = True
+        
+        return {
+            "model_id": model_id,
+            "model_name": model_data["model_name"],
+            "scoring": scoring,
+            "baseline_score": cached["baseline_score"],
+            "rows": int(len(y)),
+            "n_repeats": n_repeats,
+            "feature_importance": cached["feature_importance"][:top_n],
+            "compute_seconds": cached["seconds"],
+            "cached": hit
+        }
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+def update_preprocessing_stats(imputer, scaler, X_new: np.ndarray):
+    """Fold new raw rows into a fitted median imputer and StandardScaler in place.
+
+    Medians have no exact running form, so fill values become a count-weighted
+    blend of the stored and the new medians; the scaler's mean and variance
+    are updated exactly with partial_fit.
+    """
+    seen = np.broadcast_to(np.asarray(scaler.n_samples_seen_, dtype=float), (X_new.shape[1],))
+    counts = (~np.isnan(X_new)).sum(axis=0)
+    if counts.any():
+        new_medians = np.nan_to_num(pd.DataFrame(X_new).median().to_numpy(), nan=0.0)
+        old = np.asarray(imputer.statistics_, dtype=float)
+        blended = (seen * old + counts * new_medians) / np.maximum(seen + counts, 1)
+        imputer.statistics_ = np.where(np.isnan(old), new_medians, np.where(counts > 0, blended, old))
+    scaler.partial_fit(imputer.transform(X_new))
+
+
+def continue_boosting(model_type: str, model, X_scaled, y, rounds: int, n_threads: Optional[int] = None):
+    """Copy of a fitted booster with rounds more trees grown on the new rows.
+
+    xgboost and lightgbm go through their native train APIs so a batch holding
+    only one class does not redefine the model's classes. n_threads caps the
+    booster's threads for this update only.
+    """
+    if model_type == "xgboost":
+        xgboost = importlib.import_module("xgboost")
+        params = model.get_xgb_params()
+        if n_threads:
+            params["n_jobs"] = n_threads
+        booster = xgboost.train(
+            params, xgboost.DMatrix(X_scaled, label=y),
+            num_boost_round=rounds, xgb_model=model.get_booster()
+        )
+    elif model_type == "lightgbm":
+        lightgbm = importlib.import_module("lightgbm")
+        params = {k: v for k, v in model.booster_.params.items() if k not in ("num_iterations", "n_estimators")}
+        if n_threads:
+            params["num_threads"] = n_threads
+        booster = lightgbm.train(
+            params, lightgbm.Dataset(X_scaled, label=y),
+            num_boost_round=rounds, init_model=model.booster_
+        )
+    else:
+        if len(np.unique(y)) < 2:
+            raise HTTPException(status_code=400, detail="CatBoost updates need rows of at least two classes")
+        params = {**model.get_params(), "iterations": rounds, "class_names": list(model.classes_)}
+        if n_threads:
+            params["thread_count"] = n_threads
+        updated = load_model_class(model_type)(**params)
+        updated.fit(X_scaled, y, init_model=model)
+        return updated
+    
+    updated = copy.deepcopy(model)
+    updated._Booster = booster
+    return updated
+
+
+def _rescale_holdout(holdout, old_scaler, scaler):
+    """The stored holdout moved from the old scaler's space to the updated one's"""
+    if holdout is None or scaler is old_scaler:
+        return holdout
+    return {"X": scaler.transform(old_scaler.inverse_transform(holdout["X"])), "y": holdout["y"]}
+
+
+def _update_metrics(model, X_scaled, y):
+    metrics = holdout_metrics(y, model.predict(X_scaled))
+    if len(np.unique(y)) == 2 and hasattr(model, "predict_proba"):
+        try:
+            metrics["roc_auc"] = float(roc_auc_score(y, model.predict_proba(X_scaled)[:, 1]))
+        except Exception:
+            pass
+    return metrics
+
+
+@app.post("/models/{model_id}/update")
+def update_model(model_id: str, request: ModelUpdateRequest = Depends(ingest_body(ModelUpdateRequest))):
+    """Fold new labelled rows into a trained model without retraining on the full history"""
+    try:
+        if model_id not in trained_models:
+            raise HTTPException(status_code=404, detail=f"Model not found: {model_id}")
+        
+        model_data = trained_models[model_id]
+        method = INCREMENTAL_UPDATES.get(model_data["model_type"])
+        if method is None or isinstance(model_data["model"], FoldEnsemble):
+            raise HTTPException(
+                status_code=400,
+                detail=f"{model_data['model_name']} does not support incremental updates; retrain it with /train"
+            )
+        
+        if not 0 <= request.eval_size < 1 or request.boost_rounds < 1:
+            raise HTTPException(status_code=400, detail="eval_size must be in [0, 1) and boost_rounds positive")
+        
+        # New rows in arrival order, labelled with the model's target
+        df = request_frame(request)
+        features, target = model_data["features"], model_data["target"]
+        missing = [c for c in features + [target] if c not in df.columns]
+        if missing:
+            raise HTTPException(status_code=400, detail=f"Missing columns: {missing}")
+        df = df[df[target].notna()]
+        if df.empty:
+            raise HTTPException(status_code=400, detail="No labelled rows to update with")
+        
+        X_new = df[features].to_numpy(dtype=float)
+        y_new = df[target]
+        if model_data["label_encoder"] is not None:
+            unseen = sorted(set(y_new) - set(model_data["label_encoder"].classes_), key=str)
+            if unseen:
+                raise HTTPException(status_code=400, detail=f"Labels not seen in training: {unseen}")
+            y_new = model_data["label_encoder"].transform(y_new)
+        else:
+            y_new = y_new.to_numpy()
+            unseen = sorted(set(y_new.tolist()) - set(np.asarray(model_data["model"].classes_).tolist()))
+            if unseen:
+                raise HTTPException(status_code=400, detail=f"Labels not seen in training: {unseen}")
+        
+        # The latest rows are held out so old and new model are scored on unseen bars
+        n_eval = int(len(y_new) * request.eval_size)
+        split = len(y_new) - n_eval
+        X_fit, y_fit = X_new[:split], y_new[:split]
+        X_eval, y_eval = (X_new[split:], y_new[split:]) if n_eval else (X_new, y_new)
+        
+        # Work on copies so concurrent predictions keep using the stored model until the swap
+        started = time.perf_counter()
+        old_model, old_imputer, old_scaler = model_data["model"], model_data["imputer"], model_data["scaler"]
+        with stage("metrics", model_data["model_type"]):
+            metrics_before = _update_metrics(old_model, old_scaler.transform(old_imputer.transform(X_eval)), y_eval)
+        
+        # Trees keep their split thresholds, so boosters default to the original preprocessing
+        update_preprocessing = request.update_preprocessing
+        if update_preprocessing is None:
+            update_preprocessing = method == "partial_fit"
+        imputer, scaler = old_imputer, old_scaler
+        if update_preprocessing:
+            imputer, scaler = copy.deepcopy(old_imputer), copy.deepcopy(old_scaler)
+            with stage("scale", model_data["model_type"]):
+                update_preprocessing_stats(imputer, scaler, X_fit)
+        X_fit_scaled = scaler.transform(imputer.transform(X_fit))
+        
+        with cpu_scheduler.lease() as lease, stage("fit", model_data["model_type"]):
+            if method == "partial_fit":
+                model = copy.deepcopy(old_model)
+                model.partial_fit(X_fit_scaled, y_fit)
+            else:
+                model = continue_boosting(
+                    model_data["model_type"], old_model, X_fit_scaled, y_fit, request.boost_rounds, lease["cores"]
+                )
+        
+        with stage("metrics", model_data["model_type"]):
+            metrics_after = _update_metrics(model, scaler.transform(imputer.transform(X_eval)), y_eval)
+        
+        update = {
+            "updated_at": datetime.now().isoformat(),
+            "method": method,
+            "rows": int(split),
+            "eval_rows": int(len(y_eval)),
+            "eval_in_sample": n_eval == 0,
+            "preprocessing_updated": update_preprocessing,
+            "metrics_before": metrics_before,
+            "metrics_after": metrics_after,
+            "delta": {k: metrics_after[k] - metrics_before[k] for k in metrics_after if k in metrics_before}
+        }
+        trained_models[model_id] = {
+            **model_data,
+            "model": model,
+            "imputer": imputer,
+            "scaler": scaler,
+            "data_shape": {**model_data["data_shape"], "samples": model_data["data_shape"]["samples"] + int(split)},
+            "updates": model_data.get("updates", []) + [update],
+            "pipeline": compile_pipeline(features, imputer, scaler),
+            "holdout": _rescale_holdout(model_data.get("holdout"), old_scaler, scaler)
+        }
+        
+        # Predictions must not come from the old estimator, nor /train hits from its metrics
+        _forget_predict_batcher(model_id)
+        result_cache.discard(lambda value: isinstance(value, dict) and value.get("model_id") == model_id)
+        
+        return {
+            "success": True,
+            "model_id": model_id,
+            **update,
+            "update_seconds": time.perf_counter() - started
+        }
+    
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
 @app.delete("/models/{model_id}")
 def delete_model(model_id: str):
-    """Delete a trained model"""
+    """Delete a trained model; a saved copy stays on disk but is served again only after /load-model"""
     if model_id not in trained_models:
         raise HTTPException(status_code=404, detail=f"Model not found: {model_id}")
     
-    del trained_models[model_id]
+    try:
+        del trained_models[model_id]
+    except KeyError:
+        raise HTTPException(status_code=404, detail=f"Model not found: {model_id}")
     return {"success": True, "message": f"Model {model_id} deleted"}
 
 
 @app.get("/history")
 def get_training_history():
     """Get training history"""
-    return {"history": model_history}
+    return {"history": trained_models.history()}
+
+
+def _bulk_model_io(action, model_ids: List[str]) -> Dict[str, Any]:
+    """Run action(model_id) on MODEL_IO_WORKERS threads; file reads, writes and (de)compression release the GIL"""
+    started = time.perf_counter()
+    
+    def run(model_id):
+        try:
+            action(model_id)
+            return model_id, None
+        except Exception as e:
+            return model_id, str(e)
+    
+    done, errors = [], {}
+    with ThreadPoolExecutor(max_workers=max(1, min(MODEL_IO_WORKERS, len(model_ids)))) as executor:
+        for model_id, error in executor.map(run, model_ids):
+            if error is None:
+                done.append(model_id)
+            else:
+                errors[model_id] = error
+    return {"models": done, "errors": errors, "seconds": time.perf_counter() - started}
+
+
+def _saved_bytes(model_id: str) -> int:
+    paths = [trained_models.path(model_id, ext) for ext in ("joblib", *NATIVE_MODEL_FORMATS.values())]
+    return sum(os.path.getsize(path) for path in paths if os.path.exists(path))
+
+
+def load_saved_models() -> Dict[str, Any]:
+    """Make saved models resident, newest first, stopping before the memory budget would overflow"""
+    candidates = [model_id for model_id in trained_models.saved_ids() if not trained_models.is_resident(model_id)]
+    candidates.sort(key=lambda model_id: os.path.getmtime(trained_models.path(model_id)), reverse=True)
+    
+    room = trained_models.budget_bytes - trained_models.resident_bytes()
+    selected = []
+    for model_id in candidates:
+        size = _saved_bytes(model_id)
+        if size > room:
+            break
+        selected.append(model_id)
+        room -= size
+    
+    # Loading is explicit, so deleted models' saved copies come back too
+    result = _bulk_model_io(trained_models.reload, selected)
+    result["skipped"] = len(candidates) - len(selected)
+    return result
 
 
 @app.post("/save-model/{model_id}")
-def save_model(model_id: str):
+def save_model(model_id: str, compress: Optional[str] = None):
     """Save a trained model to disk"""
     if model_id not in trained_models:
         raise HTTPException(status_code=404, detail=f"Model not found: {model_id}")
     
     try:
-        model_data = trained_models[model_id]
-        
-        # Create models directory if not exists
-        os.makedirs("saved_models", exist_ok=True)
-        
-        # Save model
-        filepath = f"saved_models/{model_id}.joblib"
-        joblib.dump(model_data, filepath)
+        compress = parse_compress(MODEL_COMPRESS if compress is None else compress)
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"Invalid compress: {compress} (use a level or <codec>:<level>)")
+    
+    try:
+        # Save model and its listing metadata
+        filepath = trained_models.save(model_id, compress)
         
-        return {"success": True, "filepath": filepath}
+        return {"success": True, "filepath": filepath, "bytes": _saved_bytes(model_id)}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.post("/save-all")
+def save_all_models(compress: Optional[str] = None):
+    """Save every resident model to disk in parallel"""
+    try:
+        compress = parse_compress(MODEL_COMPRESS if compress is None else compress)
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"Invalid compress: {compress} (use a level or <codec>:<level>)")
+    
+    try:
+        result = _bulk_model_io(lambda model_id: trained_models.save(model_id, compress), list(trained_models))
+        return {"success": not result["errors"], **result}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.post("/load-all")
+def load_all_models():
+    """Load saved models from disk in parallel, newest first, up to the memory budget"""
+    try:
+        result = load_saved_models()
+        return {"success": not result["errors"], **result}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
 @app.post("/load-model/{model_id}")
-def load_model(model_id: str):
-    """Load a saved model from disk"""
+def load_model(model_id: str, force: bool = False):
+    """Load a saved model from disk, re-reading it if the files changed since it was loaded"""
     try:
-        filepath = f"saved_models/{model_id}.joblib"
-        if not os.path.exists(filepath):
+        filepath = trained_models.path(model_id)
+        if filepath is None or not os.path.exists(filepath):
             raise HTTPException(status_code=404, detail=f"Saved model not found: {filepath}")
         
-        model_data = joblib.load(filepath)
-        trained_models[model_id] = model_data
+        reloaded = trained_models.reload(model_id, force=force)
         
-        return {"success": True, "model_id": model_id}
+        return {"success": True, "model_id": model_id, "reloaded": reloaded}
     except HTTPException:
         raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
+MODULE_LOAD_SECONDS = time.perf_counter() - MODULE_LOAD_STARTED
+
+
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8000)
+    if WEB_WORKERS > 1:
+        # Each worker imports the app itself; the shared registry keeps their models in sync
+        module = os.path.splitext(os.path.basename(__file__))[0]
+        uvicorn.run(f"{module}:app", host="0.0.0.0", port=8000, workers=WEB_WORKERS,
+                    app_dir=os.path.dirname(os.path.abspath(__file__)))
+    else:
+        uvicorn.run(app, host="0.0.0.0", port=8000)
@@ -0,0 +1,640 @@
+"""Trained model storage: the in-memory store with disk spill and the shared registry"""
+
+import copy
+import json
+import os
+import re
+import sys
+import threading
+import time
+import uuid
+from collections import OrderedDict, deque
+from collections.abc import MutableMapping
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+import joblib
+import numpy as np
+import pandas as pd
+
+try:
+    import fcntl  # POSIX only; locks the shared model registry across worker processes
+except ImportError:
+    fcntl = None
+
+
+# Boosters are written in their library's own format next to the pickle
+NATIVE_MODEL_FORMATS = {"xgboost": "ubj", "lightgbm": "lgbm", "catboost": "cbm"}
+# Entry fields kept in the JSON sidecar instead of the pickle when they are plain JSON
+SIDECAR_FIELDS = ("metrics", "feature_importance", "params", "data_shape", "updates")
+
+
+def atomic_write(path: str, write):
+    """Call write(tmp_path) and move the result over path, so readers see the old or new file, never a partial one"""
+    # Hidden and keeping the extension, which some writers use to pick a format
+    directory, name = os.path.split(path)
+    tmp_path = os.path.join(directory, f".{os.getpid()}-{uuid.uuid4().hex}-{name}")
+    try:
+        write(tmp_path)
+        with open(tmp_path, "rb+") as f:
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def _dump_json(value, path: str):
+    with open(path, "w") as f:
+        json.dump(value, f)
+
+
+# Bytes per sklearn tree node record (child ids, feature, threshold, impurity, sample counts)
+TREE_NODE_BYTES = 64
+
+
+def estimate_size(value, _seen: Optional[set] = None) -> int:
+    """Approximate bytes a model entry holds, without serializing it.
+
+    Arrays count their buffers, sklearn trees their node records and values,
+    and boosters the size of their trees; other objects are walked through
+    their attributes and containers. Shared objects are counted once.
+    """
+    seen = set() if _seen is None else _seen
+    if id(value) in seen:
+        return 0
+    seen.add(id(value))
+    
+    if isinstance(value, np.ndarray):
+        if value.dtype == object:
+            return value.nbytes + sum(estimate_size(item, seen) for item in value.ravel())
+        return value.nbytes
+    if isinstance(value, (pd.DataFrame, pd.Series)):
+        return int(np.sum(value.memory_usage(index=True, deep=True)))
+    if isinstance(value, (str, bytes, bytearray)):
+        return sys.getsizeof(value)
+    if isinstance(value, dict):
+        return sys.getsizeof(value) + sum(estimate_size(k, seen) + estimate_size(v, seen) for k, v in value.items())
+    if isinstance(value, (list, tuple, set, frozenset, deque)):
+        return sys.getsizeof(value) + sum(estimate_size(item, seen) for item in value)
+    if isinstance(value, type):
+        return 0
+    
+    library = type(value).__module__.split(".")[0]
+    name = type(value).__name__
+    if library == "sklearn" and name == "Tree":
+        return value.node_count * TREE_NODE_BYTES + value.value.nbytes
+    if library == "xgboost" and name == "Booster":
+        return len(value.save_raw())
+    if library == "lightgbm" and name == "Booster":
+        # The C++ booster is opaque; its text dump tracks the tree count and depth
+        return len(value.model_to_string())
+    if library == "catboost" and hasattr(value, "get_leaf_values") and value.is_fitted():
+        # Leaf values (one per class for multiclass) plus one weight per leaf
+        leaves = int(np.sum(value.get_tree_leaf_counts()))
+        return value.get_leaf_values().nbytes + leaves * 8 + estimate_size(vars(value), seen)
+    if hasattr(value, "__dict__"):
+        return sys.getsizeof(value) + estimate_size(vars(value), seen)
+    return sys.getsizeof(value)
+
+
+def parse_compress(value) -> Any:
+    """joblib's compress argument from a MODEL_COMPRESS style string"""
+    value = str(value).strip()
+    if ":" in value:
+        codec, level = value.split(":", 1)
+        return (codec, int(level))
+    return int(value or 0)
+
+
+def _is_plain_json(value) -> bool:
+    try:
+        return json.loads(json.dumps(value)) == value
+    except (TypeError, ValueError):
+        return False
+
+
+def _native_library(model_type: str, model) -> Optional[str]:
+    """The booster library whose native format can store this estimator, if any"""
+    library = type(model).__module__.split(".")[0]
+    return library if library == model_type and library in NATIVE_MODEL_FORMATS else None
+
+
+def dump_native_model(library: str, model, path: str) -> Dict[str, Any]:
+    """Write a fitted booster in its native format; returns what to pickle in its place"""
+    shell = {"native": library, "class": type(model), "params": model.get_params()}
+    if library == "lightgbm":
+        # The sklearn wrapper keeps fitted state (classes, objective) outside the booster
+        model.booster_.save_model(path)
+        state = copy.copy(model)
+        state._Booster = None
+        shell["state"] = state
+    elif library == "catboost":
+        model.save_model(path, format="cbm")
+    else:
+        model.save_model(path)
+    return shell
+
+
+def load_native_model(shell: Dict[str, Any], path: str):
+    """Rebuild an estimator written by dump_native_model"""
+    if shell["native"] == "lightgbm":
+        import lightgbm
+        model = shell["state"]
+        model._Booster = lightgbm.Booster(model_file=path)
+        return model
+    model = shell["class"](**shell["params"])
+    if shell["native"] == "catboost":
+        model.load_model(path, format="cbm")
+    else:
+        model.load_model(path)
+    return model
+
+
+def model_summary(model_id: str, model_data: Dict[str, Any]) -> Dict[str, Any]:
+    """Listing metadata for a trained model; also written next to saved models as JSON"""
+    return {
+        "id": model_id,
+        "model_type": model_data["model_type"],
+        "model_name": model_data["model_name"],
+        "features": model_data["features"],
+        "target": model_data["target"],
+        "metrics": model_data["metrics"],
+        "trained_at": model_data["trained_at"]
+    }
+
+
+class ModelStore(MutableMapping):
+    """Trained models held in memory up to a byte budget, backed by saved_models/.
+
+    When the budget is exceeded the least recently (lru) or least frequently
+    (lfu) used models are written to disk and dropped from memory; looking one
+    up again loads it back transparently. Victims are chosen under the lock but
+    written outside it, and are served from memory until their file is done.
+    Large files are loaded with mmap_mode so cold loads avoid reading the whole
+    file up front. Deleting a model removes its spill files; an explicitly
+    saved copy stays on disk, but only reload() serves it again.
+    
+    With shared=True the directory is a registry for several worker processes:
+    every model is written on creation, and manifest.json lists the live models
+    with a version each, bumped under a file lock on every change. Workers
+    re-read the manifest when it changes (checked at most every poll_seconds),
+    dropping resident models that were replaced or deleted elsewhere. Model
+    files are always memory-mapped so workers share one copy in the page cache.
+    
+    on_drop(model_id) is called whenever a resident model leaves memory, so
+    callers can release anything they built around it.
+    """
+    
+    def __init__(self, directory: str, budget_bytes: float, policy: str = "lru", mmap_min_bytes: float = 0,
+                 shared: bool = False, poll_seconds: float = 1.0, compress: Any = 0, on_drop=None):
+        self.directory = directory
+        self.compress = compress
+        self.budget_bytes = budget_bytes
+        self.policy = policy
+        self.mmap_min_bytes = 0 if shared else mmap_min_bytes
+        self.shared = shared
+        self.poll_seconds = poll_seconds
+        self._resident = OrderedDict()
+        self._sizes = {}
+        self._hits = {}
+        self._spilled = set()  # Written by eviction rather than /save-model
+        self._spilling = {}  # Evicted models whose spill file is being written -> (model_data, size)
+        self._deleted = set()  # Deleted models whose saved files remain on disk
+        self._history = []
+        self._manifest = {"version": 0, "models": {}, "history": []}
+        self._manifest_stamp = None  # (inode, mtime) of the manifest file last read
+        self._manifest_checked = 0.0
+        self._versions = {}  # Manifest version of each resident model
+        self._stamps = {}  # Newest file mtime each resident model was read or written at
+        self._lock = threading.RLock()
+        self._spill_done = threading.Condition(self._lock)
+        self._on_drop = on_drop
+    
+    def _dropped(self, model_id):
+        if self._on_drop is not None:
+            self._on_drop(model_id)
+    
+    def path(self, model_id: str, ext: str = "joblib") -> Optional[str]:
+        if not isinstance(model_id, str) or not re.fullmatch(r"[\w.-]+", model_id):
+            return None
+        return os.path.join(self.directory, f"{model_id}.{ext}")
+    
+    def _on_disk(self, model_id: str) -> bool:
+        path = self.path(model_id)
+        return path is not None and os.path.exists(path)
+    
+    def _loadable(self, model_id: str) -> bool:
+        """Whether a lookup may load the model's files; a deleted model's saved copy is not served"""
+        if self.shared:
+            # Every shared model is listed on creation, so an unlisted file was deleted
+            return model_id in self._manifest["models"] and self._on_disk(model_id)
+        return model_id not in self._deleted and self._on_disk(model_id)
+    
+    def __contains__(self, model_id):
+        if not isinstance(model_id, str):
+            return False
+        self.refresh()
+        with self._lock:
+            if model_id in self._resident or model_id in self._spilling or model_id in self._manifest["models"]:
+                return True
+        return self._loadable(model_id)
+    
+    def __getitem__(self, model_id):
+        self.refresh()
+        with self._lock:
+            if model_id in self._resident:
+                self._resident.move_to_end(model_id)
+                self._hits[model_id] += 1
+                return self._resident[model_id]
+            if model_id in self._spilling:
+                return self._spilling[model_id][0]
+            version = self._manifest["models"].get(model_id, {}).get("version")
+        
+        if not self._loadable(model_id):
+            raise KeyError(model_id)
+        
+        stamp = self._file_stamp(model_id)
+        model_data, size = self._read(model_id)
+        victims = []
+        with self._lock:
+            if model_id not in self._resident:
+                victims = self._insert(model_id, model_data, size)
+                self._versions[model_id] = version
+                self._stamps[model_id] = stamp
+            model_data = self._resident.get(model_id, model_data)
+        self._spill(victims)
+        return model_data
+    
+    def __setitem__(self, model_id, model_data):
+        size = estimate_size(model_data)
+        if self.shared:
+            # Publish the file before the manifest entry that points other workers at it
+            self._write(model_id, model_data)
+            manifest = self._update_manifest(lambda m: m["models"].__setitem__(model_id, {
+                **m["models"].get(model_id, {}),
+                "version": m["version"] + 1,
+                "updated_at": datetime.now().isoformat()
+            }))
+            with self._lock:
+                victims = self._insert(model_id, model_data, size)
+                self._versions[model_id] = manifest["models"][model_id]["version"]
+            self._dropped(model_id)
+            self._spill(victims)
+            return
+        
+        with self._lock:
+            # A replaced entry must not resurface from an older spill file, and an
+            # explicitly saved one must not go stale on disk
+            self._await_spill(model_id)
+            self._stamps.pop(model_id, None)
+            self._deleted.discard(model_id)
+            saved = model_id not in self._spilled and self._on_disk(model_id)
+            if model_id in self._spilled:
+                self._remove_files(model_id)
+        if saved:
+            self._write(model_id, model_data)
+        with self._lock:
+            victims = self._insert(model_id, model_data, size)
+        self._spill(victims)
+    
+    def __delitem__(self, model_id):
+        if self.shared:
+            # Deleting from the registry removes the model for every worker
+            listed = []
+            
+            def remove(manifest):
+                listed.append(manifest["models"].pop(model_id, None))
+            
+            self._update_manifest(remove)
+            with self._lock:
+                found = self._drop(model_id) or listed[0] is not None
+                if not (listed[0] or {}).get("saved"):
+                    self._remove_files(model_id)
+            if not found:
+                raise KeyError(model_id)
+            return
+        
+        with self._lock:
+            self._await_spill(model_id)
+            found = self._resident.pop(model_id, None) is not None
+            self._sizes.pop(model_id, None)
+            self._hits.pop(model_id, None)
+            self._stamps.pop(model_id, None)
+            if model_id in self._spilled:
+                self._remove_files(model_id)
+                found = True
+            elif self._loadable(model_id):
+                # Keep the saved copy for reload(), but stop lookups from loading it
+                self._deleted.add(model_id)
+                found = True
+        self._dropped(model_id)
+        if not found:
+            raise KeyError(model_id)
+    
+    def __iter__(self):
+        self.refresh()
+        with self._lock:
+            return iter(list(self._resident))
+    
+    def __len__(self):
+        with self._lock:
+            return len(self._resident)
+    
+    def _insert(self, model_id, model_data, size) -> List[tuple]:
+        """Make a model resident under the lock; returns the evicted models _spill must write"""
+        self._resident[model_id] = model_data
+        self._resident.move_to_end(model_id)
+        self._sizes[model_id] = size
+        self._hits[model_id] = self._hits.get(model_id, 0) + 1
+        
+        victims = []
+        while self.resident_bytes() > self.budget_bytes and len(self._resident) > 1:
+            candidates = [mid for mid in self._resident if mid != model_id]
+            if self.policy == "lfu":
+                victim = min(candidates, key=lambda mid: self._hits[mid])
+            else:
+                victim = candidates[0]
+            if self._evict(victim):
+                victims.append(victim)
+        return victims
+    
+    def _evict(self, model_id) -> bool:
+        """Drop a resident model; returns True when it has no file yet and must be spilled"""
+        model_data = self._resident.pop(model_id)
+        size = self._sizes.pop(model_id)
+        self._hits.pop(model_id)
+        self._stamps.pop(model_id, None)
+        self._dropped(model_id)
+        if self._on_disk(model_id):
+            return False
+        self._spilling[model_id] = (model_data, size)
+        return True
+    
+    def _spill(self, victims: List[str]):
+        """Write evicted models' files outside the lock; a failed write makes the model resident again"""
+        for model_id in victims:
+            model_data, size = self._spilling[model_id]
+            try:
+                self._write(model_id, model_data)
+            except BaseException:
+                with self._lock:
+                    self._resident[model_id] = model_data
+                    self._sizes[model_id] = size
+                    self._hits[model_id] = 1
+                    del self._spilling[model_id]
+                    self._spill_done.notify_all()
+                raise
+            with self._lock:
+                self._spilled.add(model_id)
+                del self._spilling[model_id]
+                self._spill_done.notify_all()
+    
+    def _await_spill(self, model_id):
+        """Wait, holding the lock, until an evicted model's spill file is written"""
+        while model_id in self._spilling:
+            self._spill_done.wait()
+    
+    def _write(self, model_id, model_data, compress=None):
+        """Write the pickled entry, a native booster file when possible, and the JSON sidecar"""
+        os.makedirs(self.directory, exist_ok=True)
+        compress = self.compress if compress is None else compress
+        payload = dict(model_data)
+        sidecar = model_summary(model_id, model_data)
+        
+        # Plain-JSON fields live only in the sidecar, so the pickle holds just the fitted objects
+        stored = {"fields": {}, "metrics": False, "native": None, "compress": compress}
+        for field in SIDECAR_FIELDS:
+            if field in payload and _is_plain_json(payload[field]):
+                value = payload.pop(field)
+                if field == "metrics":
+                    stored["metrics"] = True
+                else:
+                    stored["fields"][field] = value
+        
+        library = _native_library(payload["model_type"], payload["model"])
+        if library is not None:
+            stored["native"] = NATIVE_MODEL_FORMATS[library]
+            shells = []
+            atomic_write(self.path(model_id, stored["native"]),
+                         lambda path: shells.append(dump_native_model(library, payload["model"], path)))
+            payload["model"] = shells[0]
+        
+        atomic_write(self.path(model_id), lambda path: joblib.dump(payload, path, compress=compress))
+        atomic_write(self.path(model_id, "json"), lambda path: _dump_json({**sidecar, "stored": stored}, path))
+        with self._lock:
+            self._stamps[model_id] = self._file_stamp(model_id)
+    
+    def _read(self, model_id):
+        """Load a model written by _write (or an older single-file save); returns it and its size on disk"""
+        path = self.path(model_id)
+        sidecar = self._read_sidecar(model_id) or {}
+        stored = sidecar.get("stored") or {"fields": {}, "metrics": False, "native": None, "compress": 0}
+        size = os.path.getsize(path)
+        mmap_mode = "r" if size >= self.mmap_min_bytes and not stored["compress"] else None
+        model_data = joblib.load(path, mmap_mode=mmap_mode)
+        
+        model_data.update(stored["fields"])
+        if stored["metrics"]:
+            model_data["metrics"] = sidecar["metrics"]
+        if stored["native"]:
+            native_path = self.path(model_id, stored["native"])
+            model_data["model"] = load_native_model(model_data["model"], native_path)
+            size += os.path.getsize(native_path)
+        return model_data, size
+    
+    def _file_stamp(self, model_id) -> Optional[int]:
+        """Newest mtime (ns) among a model's files, or None when it has none"""
+        stamps = []
+        for ext in ("joblib", "json", *NATIVE_MODEL_FORMATS.values()):
+            try:
+                stamps.append(os.stat(self.path(model_id, ext)).st_mtime_ns)
+            except FileNotFoundError:
+                pass
+        return max(stamps) if stamps else None
+    
+    def _read_sidecar(self, model_id) -> Optional[Dict[str, Any]]:
+        try:
+            with open(self.path(model_id, "json")) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+    
+    def _remove_files(self, model_id):
+        for ext in ("joblib", "json", *NATIVE_MODEL_FORMATS.values()):
+            path = self.path(model_id, ext)
+            if os.path.exists(path):
+                os.remove(path)
+        self._spilled.discard(model_id)
+    
+    def _drop(self, model_id) -> bool:
+        """Forget a resident model without touching its files"""
+        found = self._resident.pop(model_id, None) is not None
+        self._sizes.pop(model_id, None)
+        self._hits.pop(model_id, None)
+        self._versions.pop(model_id, None)
+        self._stamps.pop(model_id, None)
+        self._dropped(model_id)
+        return found
+    
+    @contextmanager
+    def _manifest_lock(self):
+        """Exclusive lock across worker processes around a manifest read-modify-write"""
+        os.makedirs(self.directory, exist_ok=True)
+        with open(os.path.join(self.directory, "manifest.lock"), "a") as lock_file:
+            if fcntl is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+    
+    def _manifest_path(self) -> str:
+        return os.path.join(self.directory, "manifest.json")
+    
+    def _read_manifest(self):
+        """The manifest and the (inode, mtime) stamp it was read at; empty if none was written yet"""
+        try:
+            with open(self._manifest_path()) as f:
+                stat = os.fstat(f.fileno())
+                return json.load(f), (stat.st_ino, stat.st_mtime_ns)
+        except FileNotFoundError:
+            return {"version": 0, "models": {}, "history": []}, None
+    
+    def _update_manifest(self, change) -> Dict[str, Any]:
+        """Apply change(manifest) under the lock and publish the result as the next version"""
+        with self._manifest_lock():
+            manifest, _ = self._read_manifest()
+            change(manifest)
+            manifest["version"] += 1
+            atomic_write(self._manifest_path(), lambda path: _dump_json(manifest, path))
+            manifest, stamp = self._read_manifest()
+        with self._lock:
+            self._adopt(manifest, stamp)
+        return manifest
+    
+    def _adopt(self, manifest: Dict[str, Any], stamp):
+        """Switch to a newer manifest, dropping resident models it replaced or removed"""
+        if manifest["version"] < self._manifest["version"]:
+            return
+        self._manifest = manifest
+        self._manifest_stamp = stamp
+        for model_id in list(self._resident):
+            entry = manifest["models"].get(model_id)
+            if entry is None or entry["version"] != self._versions.get(model_id):
+                self._drop(model_id)
+    
+    def refresh(self, force: bool = False):
+        """Pick up other workers' changes to the shared registry"""
+        if not self.shared:
+            return
+        now = time.monotonic()
+        if not force and now - self._manifest_checked < self.poll_seconds:
+            return
+        self._manifest_checked = now
+        try:
+            stat = os.stat(self._manifest_path())
+            stamp = (stat.st_ino, stat.st_mtime_ns)
+        except FileNotFoundError:
+            stamp = None
+        if stamp is None or stamp == self._manifest_stamp:
+            return
+        manifest, stamp = self._read_manifest()
+        with self._lock:
+            self._adopt(manifest, stamp)
+    
+    def record_history(self, entry: Dict[str, Any]):
+        """Append to the training history, which the registry shares between workers"""
+        if self.shared:
+            self._update_manifest(lambda m: m["history"].append(entry))
+        else:
+            with self._lock:
+                self._history.append(entry)
+    
+    def history(self) -> List[Dict[str, Any]]:
+        if self.shared:
+            self.refresh(force=True)
+            return list(self._manifest["history"])
+        with self._lock:
+            return list(self._history)
+    
+    def save(self, model_id: str, compress=None) -> str:
+        """Persist a model explicitly so deleting it from memory keeps the file"""
+        model_data = self[model_id]
+        with self._lock:
+            self._await_spill(model_id)
+        self._write(model_id, model_data, compress)
+        with self._lock:
+            self._spilled.discard(model_id)
+        if self.shared:
+            self._update_manifest(lambda m: m["models"].get(model_id, {}).__setitem__("saved", True))
+        return self.path(model_id)
+    
+    def reload(self, model_id: str, force: bool = False) -> bool:
+        """Re-read a model whose files changed on disk since it became resident.
+
+        With force the files are read even when unchanged. A deleted model's
+        saved copy is served again. Returns whether they were read; raises
+        KeyError when the model has no files.
+        """
+        self.refresh()
+        with self._lock:
+            self._await_spill(model_id)
+        if not self._on_disk(model_id):
+            raise KeyError(model_id)
+        if self.shared and model_id not in self._manifest["models"]:
+            self._update_manifest(lambda m: m["models"].setdefault(model_id, {
+                "version": m["version"] + 1,
+                "updated_at": datetime.now().isoformat(),
+                "saved": True
+            }))
+        stamp = self._file_stamp(model_id)
+        with self._lock:
+            self._deleted.discard(model_id)
+            known = self._stamps.get(model_id)
+            if model_id in self._resident and not force and known is not None and stamp <= known:
+                self._resident.move_to_end(model_id)
+                return False
+            version = self._manifest["models"].get(model_id, {}).get("version")
+        
+        model_data, size = self._read(model_id)
+        with self._lock:
+            self._drop(model_id)
+            victims = self._insert(model_id, model_data, size)
+            self._versions[model_id] = version
+            self._stamps[model_id] = stamp
+        self._spill(victims)
+        return True
+    
+    def is_resident(self, model_id: str) -> bool:
+        with self._lock:
+            return model_id in self._resident
+    
+    def resident_bytes(self) -> int:
+        with self._lock:
+            return sum(self._sizes.values())
+    
+    def saved_ids(self) -> List[str]:
+        """Ids of every model with a file in the store directory"""
+        if not os.path.isdir(self.directory):
+            return []
+        return sorted(
+            f[:-len(".joblib")] for f in os.listdir(self.directory)
+            if f.endswith(".joblib") and not f.startswith(".")
+        )
+    
+    def saved_summary(self, model_id: str) -> Dict[str, Any]:
+        """Listing metadata for a model on disk, from its JSON sidecar when present"""
+        sidecar = self._read_sidecar(model_id)
+        if sidecar is not None:
+            sidecar.pop("stored", None)
+            return sidecar
+        
+        # Files saved before sidecars existed: unpickle once and write one
+        model_data = joblib.load(self.path(model_id))
+        summary = model_summary(model_id, model_data)
+        atomic_write(self.path(model_id, "json"), lambda path: _dump_json(summary, path))
+        return summary
@@ -0,0 +1,231 @@
+"""CPU core leases for training work and process-parallel fits over shared arrays"""
+
+import mmap
+import multiprocessing
+import threading
+import time
+from contextlib import contextmanager
+from multiprocessing import shared_memory
+from multiprocessing.connection import wait
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+from fastapi import HTTPException
+from threadpoolctl import threadpool_limits
+
+
+class CoreScheduler:
+    """Leases cores to training work so concurrent requests never ask for more than exist.
+
+    Leases are granted first come, first served: a request gets up to the
+    cores it asked for from those free, and waits while none are. Models are
+    fitted with n_jobs/thread_count set to the lease, and the process-wide
+    BLAS/OpenMP limit follows the smallest active lease, since threadpoolctl
+    limits cannot be set per thread. A request still waiting after
+    lease_timeout seconds is refused with a 503.
+    """
+    
+    def __init__(self, total: int, reserved: int, lease_max: Optional[int] = None, lease_timeout: float = 300):
+        self.total = max(1, total)
+        self.capacity = max(1, self.total - reserved)
+        self.lease_max = min(lease_max or self.capacity, self.capacity)
+        self.lease_timeout = lease_timeout
+        self.free = self.capacity
+        self.active = []
+        self.queue = []
+        self.granted = 0
+        self.timeouts = 0
+        self._condition = threading.Condition()
+        self._blas_limit = None
+    
+    def _apply_thread_limits(self):
+        limit = min(self.active) if self.active else self.total
+        if limit != self._blas_limit:
+            threadpool_limits(limits=limit)
+            self._blas_limit = limit
+    
+    @contextmanager
+    def lease(self, cores: Optional[int] = None, timeout: Optional[float] = None):
+        """Hold up to cores (default lease_max) for the block; yields {"cores": granted}"""
+        wanted = max(1, min(cores if cores and cores > 0 else self.lease_max, self.capacity))
+        deadline = time.monotonic() + (self.lease_timeout if timeout is None else timeout)
+        ticket = object()
+        with self._condition:
+            self.queue.append(ticket)
+            try:
+                while self.queue[0] is not ticket or self.free < 1:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self.timeouts += 1
+                        raise HTTPException(status_code=503, detail="No CPU cores became free for this request")
+                    self._condition.wait(remaining)
+            finally:
+                self.queue.remove(ticket)
+                self._condition.notify_all()
+            granted = min(wanted, self.free)
+            self.free -= granted
+            self.active.append(granted)
+            self.granted += 1
+            self._apply_thread_limits()
+        
+        try:
+            yield {"cores": granted}
+        finally:
+            with self._condition:
+                self.free += granted
+                self.active.remove(granted)
+                self._apply_thread_limits()
+                self._condition.notify_all()
+    
+    def stats(self) -> Dict[str, Any]:
+        with self._condition:
+            return {
+                "total_cores": self.total,
+                "capacity": self.capacity,
+                "reserved_for_predict": self.total - self.capacity,
+                "lease_max": self.lease_max,
+                "leased": self.capacity - self.free,
+                "active_leases": len(self.active),
+                "waiting": len(self.queue),
+                "granted": self.granted,
+                "timeouts": self.timeouts
+            }
+
+
+def _share_array(array: np.ndarray, blocks: List[shared_memory.SharedMemory]):
+    """Copy an array into a new shared memory block and return its attach spec.
+
+    A whole memory-mapped file is not copied; workers map the same file.
+    """
+    if isinstance(array, np.memmap) and isinstance(array.base, mmap.mmap) and array.flags.c_contiguous:
+        return {
+            "path": array.filename,
+            "offset": array.offset,
+            "shape": array.shape,
+            "dtype": array.dtype.str
+        }
+    array = np.ascontiguousarray(array)
+    shm = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+    np.ndarray(array.shape, dtype=array.dtype, buffer=shm.buf)[...] = array
+    blocks.append(shm)
+    return {
+        "name": shm.name,
+        "shape": array.shape,
+        "dtype": array.dtype.str
+    }
+
+
+def _attach_array(spec: Dict[str, Any]):
+    if "path" in spec:
+        return None, np.memmap(spec["path"], dtype=np.dtype(spec["dtype"]), mode="r",
+                               offset=spec["offset"], shape=spec["shape"])
+    
+    # Workers share the parent's resource tracker, so the parent's unlink covers this attach too
+    shm = shared_memory.SharedMemory(name=spec["name"])
+    return shm, np.ndarray(spec["shape"], dtype=np.dtype(spec["dtype"]), buffer=shm.buf)
+
+
+def thread_limited_params(model_type: str, params: Dict[str, Any], n_threads: int):
+    """Cap a model's own parallelism so concurrent fits stay within the CPU budget"""
+    params = params.copy()
+    if "n_jobs" in params:
+        params["n_jobs"] = n_threads
+    if model_type == "catboost":
+        params["thread_count"] = n_threads
+    return params
+
+
+def _process_worker(task, args, arrays: Dict[str, Any], conn):
+    """Attach the shared arrays, run task(views, *args) and send its result dict back over conn"""
+    attached = []
+    views = {}
+    try:
+        for key, spec in arrays.items():
+            shm, views[key] = _attach_array(spec)
+            if shm is not None:
+                attached.append(shm)
+        result = task(views, *args)
+    except Exception as e:
+        result = {"error": str(e)}
+    
+    views.clear()
+    for shm in attached:
+        shm.close()
+    conn.send(result)
+    conn.close()
+
+
+def run_in_processes(tasks: List[Any], arrays: Dict[str, np.ndarray], max_workers: int,
+                     timeout: Optional[float] = None, deadline: Optional[float] = None):
+    """Generator yielding (index, result) as each (task, args) finishes in its own process.
+
+    The arrays are placed in shared memory once and attached by every worker.
+    A task still running after timeout seconds, or at the time.monotonic()
+    deadline, is terminated; tasks not started by the deadline are skipped.
+    Both come back as {"error": ...} results, as do crashed workers.
+    Workers start from a fork server (spawned where there is none), never by
+    forking the service itself, so they inherit none of its threads or locks;
+    tasks must therefore be module-level functions.
+    """
+    pending = list(enumerate(tasks))
+    if not pending:
+        return
+    max_workers = max(1, min(max_workers, len(pending)))
+    
+    if "forkserver" in multiprocessing.get_all_start_methods():
+        ctx = multiprocessing.get_context("forkserver")
+        # The server imports the tasks' modules once, so each worker starts with them loaded
+        ctx.set_forkserver_preload(sorted({task.__module__ for task, _ in tasks} - {"__main__"}))
+    else:
+        ctx = multiprocessing.get_context("spawn")
+    blocks = []
+    running = {}  # receiving connection -> (process, index, started)
+    
+    try:
+        specs = {
+            key: _share_array(array if isinstance(array, np.memmap) else np.asarray(array), blocks)
+            for key, array in arrays.items()
+        }
+        
+        while pending or running:
+            if deadline is not None and time.monotonic() >= deadline:
+                for index, _ in pending:
+                    yield index, {"error": "Time budget exhausted before start"}
+                pending = []
+            
+            while pending and len(running) < max_workers:
+                index, (task, args) = pending.pop(0)
+                receiver, sender = ctx.Pipe(duplex=False)
+                process = ctx.Process(target=_process_worker, args=(task, args, specs, sender))
+                process.start()
+                sender.close()
+                running[receiver] = (process, index, time.monotonic())
+            
+            for receiver in wait(list(running), timeout=0.1):
+                process, index, _ = running.pop(receiver)
+                try:
+                    result = receiver.recv()
+                except EOFError:
+                    process.join()
+                    result = {"error": f"Worker exited with code {process.exitcode}"}
+                receiver.close()
+                process.join()
+                yield index, result
+            
+            now = time.monotonic()
+            for receiver, (process, index, started) in list(running.items()):
+                timed_out = timeout and now - started > timeout
+                if timed_out or (deadline is not None and now >= deadline):
+                    process.terminate()
+                    process.join()
+                    receiver.close()
+                    del running[receiver]
+                    yield index, {"error": f"Timed out after {timeout:g}s" if timed_out else "Time budget exhausted"}
+    finally:
+        for receiver, (process, _, _) in running.items():
+            process.terminate()
+            process.join()
+            receiver.close()
+        for shm in blocks:
+            shm.close()
+            shm.unlink()
@@ -0,0 +1,62 @@
+import os
+import sys
+from collections import OrderedDict
+
+# The service reads its settings at import: two cores, none held back for /predict,
+# and a short lease wait so a saturated scheduler answers 503 quickly
+os.environ.setdefault("CPU_TOTAL", "2")
+os.environ.setdefault("PREDICT_RESERVED_CORES", "0")
+os.environ.setdefault("CPU_LEASE_TIMEOUT", "1")
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+import pandas as pd
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+
+
+@pytest.fixture(autouse=True)
+def workdir(tmp_path, monkeypatch):
+    """Run each test in its own directory, with saved_models/ and saved_datasets/ empty and a fresh model store"""
+    monkeypatch.chdir(tmp_path)
+    main.result_cache.clear()
+    monkeypatch.setattr(main, "datasets", OrderedDict())
+    monkeypatch.setattr(main, "trained_models", main.ModelStore(
+        main.MODELS_DIR,
+        main.MODEL_MEMORY_BUDGET_MB * 1024 * 1024,
+        on_drop=main._forget_predict_batcher
+    ))
+    yield tmp_path
+
+
+@pytest.fixture
+def client():
+    return TestClient(main.app)
+
+
+@pytest.fixture
+def rows():
+    rng = np.random.default_rng(0)
+    df = pd.DataFrame(rng.normal(size=(300, 3)), columns=["a", "b", "c"])
+    df["y"] = np.where(df["a"] + rng.normal(scale=0.5, size=len(df)) > 0, "up", "down")
+    return df.to_dict("records")
+
+
+@pytest.fixture
+def bars():
+    rng = np.random.default_rng(3)
+    n = 300
+    close = 100 * np.exp(np.cumsum(rng.normal(0, 0.02, n)))
+    open_ = close * np.exp(rng.normal(0, 0.005, n))
+    return pd.DataFrame({
+        "ticker": "A",
+        "date": pd.date_range("2020-01-01", periods=n).astype(str),
+        "open": open_,
+        "high": np.maximum(open_, close) * (1 + rng.random(n) * 0.01),
+        "low": np.minimum(open_, close) * (1 - rng.random(n) * 0.01),
+        "close": close,
+        "volume": rng.integers(0, 1_000_000, n).astype(float)
+    })
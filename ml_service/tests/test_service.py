@@ -0,0 +1,444 @@
+import io
+import json
+import os
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+from joblib import Parallel
+from sklearn.linear_model import LogisticRegression
+from sklearn.model_selection import StratifiedKFold, cross_val_score, train_test_split
+
+import main
+
+
+FEATURES = ["a", "b", "c"]
+
+
+def train_body(rows, **overrides):
+    return {
+        "data": rows,
+        "features": FEATURES,
+        "target": "y",
+        "model_type": "logistic_regression",
+        "cross_validation": False,
+        **overrides
+    }
+
+
+def model_entry(client, rows, **overrides):
+    """Train a model through the API and return its id and stored entry"""
+    model_id = client.post("/train", json=train_body(rows, **overrides)).json()["model_id"]
+    return model_id, main.trained_models[model_id]
+
+
+def test_train_then_predict(client, rows):
+    response = client.post("/train", json=train_body(rows))
+    assert response.status_code == 200
+    model_id = response.json()["model_id"]
+    
+    response = client.post("/predict", json={"model_id": model_id, "features": FEATURES, "data": rows[:5]})
+    assert response.status_code == 200
+    body = response.json()
+    assert len(body["predictions"]) == 5
+    assert set(body["predictions"]) <= {"up", "down"}
+    assert np.allclose(np.sum(body["probabilities"], axis=1), 1.0)
+
+
+def test_predict_reorders_features(client, rows):
+    model_id, _ = model_entry(client, rows)
+    
+    # A few rows take the compiled fast path, many rows the pandas path
+    for sample in (rows[:5], rows[:200]):
+        expected = client.post("/predict", json={"model_id": model_id, "features": FEATURES, "data": sample}).json()
+        shuffled = client.post("/predict", json={"model_id": model_id, "features": ["c", "a", "b"], "data": sample}).json()
+        assert np.allclose(expected["probabilities"], shuffled["probabilities"])
+    
+    response = client.post("/predict", json={"model_id": model_id, "features": ["a", "b"], "data": rows[:5]})
+    assert response.status_code == 400
+
+
+def test_cache_hit_after_skip_save(client, rows):
+    skipped = client.post("/train", json=train_body(rows, skip_save=True)).json()
+    assert skipped["model_id"] not in main.trained_models
+    
+    # The skip_save fit left no stored model, so the first saving request fits and stores one
+    first = client.post("/train", json=train_body(rows)).json()
+    assert first["model_id"] in main.trained_models
+    
+    second = client.post("/train", json=train_body(rows)).json()
+    assert second["cached"] is True
+    assert second["model_id"] == first["model_id"]
+    assert len(main.trained_models) == 1
+
+
+def test_eviction_and_reload(client, rows, tmp_path):
+    _, entry = model_entry(client, rows)
+    store = main.ModelStore(str(tmp_path / "store"), budget_bytes=1)
+    
+    store["first"] = entry
+    store["second"] = entry
+    assert not store.is_resident("first")
+    assert (tmp_path / "store" / "first.joblib").exists()
+    
+    # Looking the evicted model up loads it back from disk
+    reloaded = store["first"]
+    assert store.is_resident("first")
+    assert not store.is_resident("second")
+    X = np.random.default_rng(1).normal(size=(10, 3))
+    assert np.array_equal(reloaded["model"].predict(X), entry["model"].predict(X))
+
+
+def test_load_model_rereads_changed_files(client, rows):
+    model_id, entry = model_entry(client, rows)
+    client.post(f"/save-model/{model_id}")
+    assert client.post(f"/load-model/{model_id}").json()["reloaded"] is False
+    
+    # Another process rewrites the saved files
+    other = main.ModelStore(main.MODELS_DIR, budget_bytes=1e9)
+    other[model_id] = {**entry, "model_name": "renamed"}
+    assert client.post(f"/load-model/{model_id}").json()["reloaded"] is True
+    assert main.trained_models[model_id]["model_name"] == "renamed"
+    assert client.post(f"/load-model/{model_id}?force=true").json()["reloaded"] is True
+
+
+def test_registry_is_shared_between_stores(client, rows, tmp_path):
+    _, entry = model_entry(client, rows)
+    directory = str(tmp_path / "registry")
+    first = main.ModelStore(directory, budget_bytes=1e9, shared=True, poll_seconds=0)
+    second = main.ModelStore(directory, budget_bytes=1e9, shared=True, poll_seconds=0)
+    
+    first["shared_model"] = entry
+    assert "shared_model" in second
+    assert second["shared_model"]["features"] == FEATURES
+    
+    first.record_history({"model_id": "shared_model"})
+    assert second.history() == [{"model_id": "shared_model"}]
+    
+    del first["shared_model"]
+    assert "shared_model" not in second
+    assert not second.is_resident("shared_model")
+
+
+def test_lease_timeout_returns_503(client, rows):
+    scheduler = main.cpu_scheduler
+    with scheduler.lease(scheduler.capacity):
+        response = client.post("/train", json=train_body(rows))
+    assert response.status_code == 503
+    assert scheduler.stats()["leased"] == 0
+    
+    assert client.post("/train", json=train_body(rows)).status_code == 200
+
+
+def test_live_state_matches_batch_indicators(bars):
+    batch = main.compute_indicators(bars, main.IndicatorOptions())
+    state = main.LiveIndicatorState()
+    live = pd.DataFrame([state.update(bar) for bar in bars.to_dict("records")])
+    
+    for column in main.INDICATOR_COLUMNS:
+        expected = batch[column].to_numpy(dtype=float)
+        actual = live[column].to_numpy(dtype=float)
+        assert np.array_equal(np.isnan(expected), np.isnan(actual)), column
+        finite = np.isfinite(expected)
+        assert np.allclose(actual[finite], expected[finite], rtol=1e-8, atol=1e-8), column
+
+
+def test_tune_promotes_full_tree_budget(client, rows):
+    body = train_body(rows, model_type="xgboost", n_candidates=4, eta=2, max_estimators=60,
+                      early_stopping_rounds=5, stream=False)
+    response = client.post("/tune", json=body)
+    assert response.status_code == 200
+    result = response.json()
+    
+    # Every rung refits with the full tree cap; only the winner carries its early-stopped count
+    assert all(trial["params"]["n_estimators"] == 60 for trial in result["trials"])
+    assert result["best"]["params"]["n_estimators"] == result["best"]["estimators"]
+    assert main.trained_models[result["model_id"]]["model"].get_params()["n_estimators"] == result["best"]["estimators"]
+
+
+def test_source_training_splits_by_class(client, rows, monkeypatch):
+    # A rare class split across several chunks still gets its share of the holdout
+    monkeypatch.setattr(main, "SOURCE_CHUNK_ROWS", 64)
+    df = pd.DataFrame(rows)
+    df["y"] = np.where(np.arange(len(df)) % 10 == 0, "rare", df["y"])
+    os.makedirs(main.SOURCE_ROOT)
+    df.to_csv(os.path.join(main.SOURCE_ROOT, "bars.csv"), index=False)
+    
+    body = train_body([], source_path="bars.csv", model_type="sgd_classifier")
+    del body["data"], body["cross_validation"]
+    first = client.post("/train", json=body).json()
+    assert first["data_info"]["test_samples"] == 60
+    assert "cv_error" not in first["metrics"]
+    # Confusion matrix rows follow the encoded (sorted) labels
+    held_out = dict(zip(sorted(first["data_info"]["classes"]), np.sum(first["metrics"]["confusion_matrix"], axis=1)))
+    assert held_out["rare"] == 6
+    
+    # More passes over the chunks are a different fit, not a cache hit
+    again = client.post("/train", json={**body, "epochs": 3}).json()
+    assert again["cached"] is False
+    
+    response = client.post("/train", json={**body, "cross_validation": True})
+    assert response.status_code == 400
+
+
+def npz_body(columns, **fields):
+    buffer = io.BytesIO()
+    np.savez(buffer, __request__=np.array(json.dumps(fields)), **columns)
+    return buffer.getvalue()
+
+
+def test_npz_body_with_string_columns(client, rows):
+    df = pd.DataFrame(rows)
+    columns = {name: df[name].to_numpy() for name in FEATURES}
+    fields = {"features": FEATURES, "target": "y", "model_type": "logistic_regression", "cross_validation": False}
+    
+    # Fixed-width unicode labels train like the JSON rows do
+    body = npz_body({**columns, "y": df["y"].to_numpy(dtype=str)}, **fields)
+    response = client.post("/train", content=body, headers={"content-type": "application/x-npz"})
+    assert response.status_code == 200
+    assert sorted(response.json()["data_info"]["classes"]) == ["down", "up"]
+    
+    # Object arrays would need pickle and are refused by name
+    body = npz_body({**columns, "y": df["y"].to_numpy(dtype=object)}, **fields)
+    response = client.post("/train", content=body, headers={"content-type": "application/x-npz"})
+    assert response.status_code == 400
+    assert "'y'" in response.json()["detail"]
+
+
+def test_feature_selection_candidates_fit_single_threaded(rows, monkeypatch):
+    fitted = []
+    monkeypatch.setattr(main, "Parallel", lambda n_jobs: Parallel(n_jobs=n_jobs, backend="threading"))
+    monkeypatch.setattr(main, "_score_feature_subset", lambda model_class, params, *args: fitted.append(params) or {"accuracy": 0.5})
+    
+    # CatBoost caps its threads with thread_count, not n_jobs
+    request = main.FeatureSelectionRequest(data=rows, features=FEATURES, target="y", model_type="catboost", max_features=1)
+    X = np.zeros((10, 3))
+    list(main.run_feature_selection(request, X, X, np.zeros(10), np.zeros(10), n_jobs=2))
+    assert fitted and all(params["thread_count"] == 1 for params in fitted)
+
+
+def test_recursive_selection_ranks_models_without_importances(client, rows):
+    body = train_body(rows, model_type="knn", method="recursive", min_features=1, stream=False)
+    response = client.post("/feature-selection", json=body)
+    assert response.status_code == 200
+    result = response.json()
+    
+    # k-NN has no importances, so each step ranks by permutation and drops one feature
+    steps = result["steps"]
+    assert [len(s["features"]) for s in steps] == [3, 2, 1]
+    assert all(s["importance_source"] == "permutation" for s in steps)
+    assert "a" in result["best"]["features"]
+
+
+def test_compare_fits_models_in_worker_processes(client, rows):
+    body = {"data": rows, "features": FEATURES, "target": "y", "models": ["logistic_regression", "decision_tree", "unknown"]}
+    results = {r["model_type"]: r for r in client.post("/compare", json=body).json()["results"]}
+    
+    assert results["unknown"]["error"].startswith("Unknown model type")
+    trained = client.post("/train", json=train_body(rows)).json()
+    assert results["logistic_regression"]["accuracy"] == trained["metrics"]["accuracy"]
+    assert "error" not in results["decision_tree"]
+    
+    # A worker past its timeout is terminated and reported, not waited for
+    response = client.post("/compare", json={**body, "models": ["mlp"], "timeout": 0.01})
+    assert response.json()["results"][0]["error"].startswith("Timed out")
+
+
+def test_spill_writes_happen_outside_the_lock(client, rows, tmp_path):
+    _, entry = model_entry(client, rows)
+    store = main.ModelStore(str(tmp_path / "store"), budget_bytes=1)
+    store["first"] = entry
+    
+    # Hold the spill write of "first" open while other threads use the store
+    writing, release = threading.Event(), threading.Event()
+    write = store._write
+    
+    def slow_write(model_id, model_data, compress=None):
+        writing.set()
+        release.wait(5)
+        write(model_id, model_data, compress)
+    
+    store._write = slow_write
+    evicting = threading.Thread(target=store.__setitem__, args=("second", entry))
+    evicting.start()
+    assert writing.wait(5)
+    
+    assert store.is_resident("second")
+    assert store["first"] is entry  # Served from memory until its file is written
+    release.set()
+    evicting.join(5)
+    assert (tmp_path / "store" / "first.joblib").exists()
+
+
+def test_deleted_saved_model_needs_an_explicit_load(client, rows):
+    model_id, _ = model_entry(client, rows)
+    client.post(f"/save-model/{model_id}")
+    assert client.delete(f"/models/{model_id}").status_code == 200
+    
+    predict = {"model_id": model_id, "features": FEATURES, "data": rows[:5]}
+    assert client.post("/predict", json=predict).status_code == 404
+    assert client.delete(f"/models/{model_id}").status_code == 404
+    
+    assert client.post(f"/load-model/{model_id}").status_code == 200
+    assert client.post("/predict", json=predict).status_code == 200
+
+
+def test_cache_hit_with_new_name_or_deleted_model(client, rows):
+    first = client.post("/train", json=train_body(rows, model_name="first")).json()
+    
+    # A cache hit under another name registers the fit as its own model
+    renamed = client.post("/train", json=train_body(rows, model_name="second")).json()
+    assert renamed["cached"] is True
+    assert renamed["model_id"] != first["model_id"]
+    assert main.trained_models[renamed["model_id"]]["model_name"] == "second"
+    assert main.trained_models[first["model_id"]]["model_name"] == "first"
+    
+    # A cached model deleted behind the cache's back is refitted, not a 500
+    store = main.trained_models
+    del store[first["model_id"]]
+    again = client.post("/train", json=train_body(rows, model_name="first")).json()
+    assert again["cached"] is False
+    assert again["model_id"] in store
+
+
+def test_predict_batch_runs_within_a_lease(client, rows, monkeypatch):
+    first, _ = model_entry(client, rows)
+    second, _ = model_entry(client, rows, model_type="decision_tree")
+    
+    leases = []
+    lease = main.cpu_scheduler.lease
+    monkeypatch.setattr(main.cpu_scheduler, "lease", lambda cores=None, timeout=None: leases.append(cores) or lease(cores, timeout))
+    body = {"model_ids": [first, second, "missing"], "data": rows[:20]}
+    results = client.post("/predict/batch", json=body).json()["results"]
+    
+    # Both models run under one lease sized to the batch; the unknown id is reported in place
+    assert leases == [2]
+    assert [len(r.get("predictions", [])) for r in results] == [20, 20, 0]
+    assert results[2]["error"] == "Model not found: missing"
+
+
+def test_dataset_registry_serves_training(client, rows):
+    uploaded = client.post("/datasets", json={"data": rows, "name": "bars"}).json()
+    dataset_id = uploaded["dataset_id"]
+    assert client.post("/datasets", json={"data": rows}).json()["dataset_id"] == dataset_id
+    
+    inline = client.post("/train", json=train_body(rows, skip_save=True)).json()
+    by_id = train_body(None, dataset_id=dataset_id, skip_save=True)
+    assert client.post("/train", json=by_id).json()["metrics"] == inline["metrics"]
+    
+    # Dropped from memory, the dataset is read back from its file
+    main.datasets.clear()
+    main.result_cache.clear()
+    assert client.post("/train", json=by_id).json()["metrics"]["accuracy"] == inline["metrics"]["accuracy"]
+    
+    assert client.delete(f"/datasets/{dataset_id}").status_code == 200
+    assert client.post("/train", json=by_id).status_code == 404
+
+
+def test_training_job_runs_in_the_background(client, rows, monkeypatch):
+    job_id = client.post("/jobs/train", json=train_body(rows)).json()["job_id"]
+    deadline = time.monotonic() + 30
+    while (job := client.get(f"/jobs/{job_id}").json())["finished_at"] is None:
+        assert time.monotonic() < deadline
+        time.sleep(0.05)
+    
+    assert job["status"] == "completed"
+    assert job["progress"] == 1.0
+    assert job["result"]["model_id"] in main.trained_models
+    
+    # Finished jobs are forgotten on delete; a full queue refuses new work
+    assert client.delete(f"/jobs/{job_id}").status_code == 200
+    assert client.get(f"/jobs/{job_id}").status_code == 404
+    monkeypatch.setattr(main, "JOB_QUEUE_DEPTH", 0)
+    assert client.post("/jobs/train", json=train_body(rows)).status_code == 429
+
+
+def test_parallel_cross_validation_matches_sequential_folds(client, rows):
+    body = train_body(rows, cross_validation=True, cv_folds=4, cv_n_jobs=2, skip_save=True)
+    metrics = client.post("/train", json=body).json()["metrics"]
+    
+    X, y, _, _, _, _ = main.prepare_training_data(pd.DataFrame(rows), FEATURES, "y")
+    model = LogisticRegression(**main.AVAILABLE_MODELS["logistic_regression"]["params"])
+    expected = cross_val_score(model, X, y, cv=StratifiedKFold(n_splits=4, shuffle=True, random_state=42))
+    assert np.allclose(metrics["cv_scores"], expected)
+    assert metrics["cv_oof"]["accuracy"] > 0.5
+    
+    # The holdout model fitted alongside the folds is the one a plain fit produces
+    plain = client.post("/train", json=train_body(rows, skip_save=True)).json()["metrics"]
+    assert metrics["accuracy"] == plain["accuracy"]
+
+
+def test_backtest_windows_never_train_on_later_dates(client, bars, rows):
+    df = pd.DataFrame(rows).assign(date=bars["date"].iloc[::-1].to_numpy())  # Rows arrive newest first
+    body = train_body(df.to_dict("records"), mode="rolling", train_periods=100, test_periods=50, gap=5, stream=False)
+    result = client.post("/backtest", json=body).json()
+    
+    assert result["windows"] == 4
+    for window in result["results"]:
+        assert window["train_samples"] == 100
+        assert window["train_end"] < window["test_start"]
+        assert (pd.Timestamp(window["test_start"]) - pd.Timestamp(window["train_end"])).days == 6
+    assert sum(window["test_samples"] for window in result["results"]) == 195
+    
+    # Parallel window fits give the same results as one at a time
+    sequential = client.post("/backtest", json={**body, "n_jobs": 1}).json()
+    assert [w["metrics"] for w in sequential["results"]] == [w["metrics"] for w in result["results"]]
+
+
+def test_update_adds_trees_without_refitting(client, rows):
+    model_id, entry = model_entry(client, rows[:200], model_type="xgboost")
+    rounds = entry["model"].get_booster().num_boosted_rounds()
+    
+    response = client.post(f"/models/{model_id}/update", json={"data": rows[200:], "boost_rounds": 5})
+    assert response.status_code == 200
+    update = response.json()
+    assert update["method"] == main.INCREMENTAL_UPDATES["xgboost"]
+    assert update["rows"] == 80 and update["eval_rows"] == 20
+    
+    updated = main.trained_models[model_id]
+    assert updated["model"].get_booster().num_boosted_rounds() == rounds + 5
+    assert updated["data_shape"]["samples"] == 280
+    assert len(updated["updates"]) == 1
+    
+    # Labels the model never saw, and models with no incremental path, are refused
+    unseen = [{**row, "y": "flat"} for row in rows[:10]]
+    assert client.post(f"/models/{model_id}/update", json={"data": unseen}).status_code == 400
+    linear_id, _ = model_entry(client, rows, model_type="logistic_regression")
+    assert client.post(f"/models/{linear_id}/update", json={"data": rows}).status_code == 400
+
+
+def test_lean_pipeline_matches_the_standard_split(client, rows):
+    df = pd.DataFrame(rows)
+    df.loc[::7, "b"] = np.nan
+    X, y, n_train, _, _, _, _ = main.prepare_lean_training_data(df, FEATURES, "y", 0.2)
+    assert X.dtype == np.float32 and X.flags.c_contiguous
+    
+    # The same rows land in each split as the float64 pipeline, in the same order
+    X_full, y_full, _, _, _, _ = main.prepare_training_data(df, FEATURES, "y")
+    X_train, X_test, y_train, _ = train_test_split(X_full, y_full, test_size=0.2, random_state=42, stratify=y_full)
+    assert n_train == len(X_train)
+    assert np.allclose(X[:n_train], X_train, atol=1e-5) and np.allclose(X[n_train:], X_test, atol=1e-5)
+    assert np.array_equal(y[:n_train], y_train)
+    
+    records = df.astype(object).where(df.notna(), None).to_dict("records")
+    lean = client.post("/train", json=train_body(records, lean=True, skip_save=True)).json()
+    assert lean["data_info"]["train_samples"] == n_train
+    assert {"split", "impute", "scale", "fit"} <= set(lean["data_info"]["peak_memory_mb"])
+
+
+def test_permutation_importance_for_any_model(client, rows):
+    model_id, _ = model_entry(client, rows, model_type="knn")
+    url = f"/feature-importance/{model_id}/permutation"
+    
+    first = client.get(url, params={"n_jobs": 2}).json()
+    assert first["feature_importance"][0]["feature"] == "a"
+    assert first["rows"] == 60 and first["cached"] is False
+    assert client.get(url, params={"n_jobs": 2}).json()["cached"] is True
+    
+    # Each column's shuffles come from its own seed, so the thread count does not change the result
+    main.result_cache.clear()
+    single = client.get(url, params={"n_jobs": 1}).json()
+    assert single["feature_importance"] == first["feature_importance"]
+    
+    assert client.get(url, params={"scoring": "nope"}).status_code == 400
@@ -0,0 +1,279 @@
+"""Hyperparameter search: search spaces, successive halving and Hyperband over process-parallel trials"""
+
+import importlib
+import time
+from typing import Any, Dict, List
+
+import numpy as np
+from fastapi import HTTPException
+from sklearn.model_selection import train_test_split
+
+from estimators import (
+    AVAILABLE_MODELS, EARLY_STOPPING_MODELS, ESTIMATOR_COUNT_PARAMS, holdout_metrics, load_model_class
+)
+from scheduler import run_in_processes, thread_limited_params
+
+
+# Default /tune search spaces: a list is a set of choices, a dict a range ({"low", "high", "log", "int"})
+SEARCH_SPACES = {
+    "random_forest": {
+        "n_estimators": [50, 100, 200, 400],
+        "max_depth": [None, 5, 10, 20],
+        "min_samples_leaf": [1, 2, 5, 10],
+        "max_features": ["sqrt", "log2", None]
+    },
+    "extra_trees": {
+        "n_estimators": [50, 100, 200, 400],
+        "max_depth": [None, 5, 10, 20],
+        "min_samples_leaf": [1, 2, 5, 10],
+        "max_features": ["sqrt", "log2", None]
+    },
+    "gradient_boosting": {
+        "n_estimators": [50, 100, 200],
+        "learning_rate": {"low": 0.01, "high": 0.3, "log": True},
+        "max_depth": {"low": 2, "high": 6, "int": True},
+        "subsample": {"low": 0.6, "high": 1.0}
+    },
+    "adaboost": {
+        "n_estimators": [50, 100, 200],
+        "learning_rate": {"low": 0.01, "high": 1.0, "log": True}
+    },
+    "bagging": {
+        "n_estimators": [10, 25, 50, 100],
+        "max_samples": {"low": 0.5, "high": 1.0},
+        "max_features": {"low": 0.5, "high": 1.0}
+    },
+    "decision_tree": {
+        "max_depth": [None, 3, 5, 10, 20],
+        "min_samples_leaf": [1, 2, 5, 10, 20],
+        "criterion": ["gini", "entropy"]
+    },
+    "logistic_regression": {"C": {"low": 1e-3, "high": 1e2, "log": True}},
+    "ridge_classifier": {"alpha": {"low": 1e-3, "high": 1e2, "log": True}},
+    "sgd_classifier": {
+        "alpha": {"low": 1e-6, "high": 1e-2, "log": True},
+        "penalty": ["l2", "l1", "elasticnet"],
+        "loss": ["hinge", "log_loss", "modified_huber"]
+    },
+    "svm": {
+        "C": {"low": 1e-2, "high": 1e2, "log": True},
+        "gamma": {"low": 1e-4, "high": 1.0, "log": True}
+    },
+    "svm_linear": {"C": {"low": 1e-2, "high": 1e2, "log": True}},
+    "knn": {
+        "n_neighbors": {"low": 3, "high": 50, "int": True},
+        "weights": ["uniform", "distance"]
+    },
+    "naive_bayes": {"var_smoothing": {"low": 1e-11, "high": 1e-5, "log": True}},
+    "mlp": {
+        "hidden_layer_sizes": [[50], [100], [100, 50], [200, 100]],
+        "alpha": {"low": 1e-5, "high": 1e-2, "log": True},
+        "learning_rate_init": {"low": 1e-4, "high": 1e-2, "log": True}
+    },
+    "lda": {"solver": ["svd", "lsqr"]},
+    "qda": {"reg_param": {"low": 0.0, "high": 1.0}},
+    "xgboost": {
+        "learning_rate": {"low": 0.01, "high": 0.3, "log": True},
+        "max_depth": {"low": 2, "high": 10, "int": True},
+        "subsample": {"low": 0.6, "high": 1.0},
+        "colsample_bytree": {"low": 0.6, "high": 1.0},
+        "min_child_weight": {"low": 1, "high": 10, "log": True}
+    },
+    "lightgbm": {
+        "learning_rate": {"low": 0.01, "high": 0.3, "log": True},
+        "num_leaves": {"low": 8, "high": 128, "log": True, "int": True},
+        "max_depth": [-1, 4, 6, 8],
+        "subsample": {"low": 0.6, "high": 1.0},
+        "subsample_freq": [1],
+        "colsample_bytree": {"low": 0.6, "high": 1.0}
+    },
+    "catboost": {
+        "learning_rate": {"low": 0.01, "high": 0.3, "log": True},
+        "depth": {"low": 4, "high": 10, "int": True},
+        "l2_leaf_reg": {"low": 1.0, "high": 10.0, "log": True}
+    }
+}
+
+
+def sample_params(space: Dict[str, Any], rng: np.random.Generator) -> Dict[str, Any]:
+    """One random configuration from a search space"""
+    params = {}
+    for name, spec in space.items():
+        if isinstance(spec, list):
+            params[name] = spec[int(rng.integers(len(spec)))]
+            continue
+        low, high = spec["low"], spec["high"]
+        if spec.get("log"):
+            value = float(np.exp(rng.uniform(np.log(low), np.log(high))))
+        else:
+            value = float(rng.uniform(low, high))
+        params[name] = int(round(value)) if spec.get("int") else value
+    return params
+
+
+def validate_search_space(space: Dict[str, Any]):
+    for name, spec in space.items():
+        if isinstance(spec, list):
+            if not spec:
+                raise HTTPException(status_code=400, detail=f"Search space for {name} has no choices")
+        elif isinstance(spec, dict) and "low" in spec and "high" in spec:
+            if spec["low"] > spec["high"] or (spec.get("log") and spec["low"] <= 0):
+                raise HTTPException(status_code=400, detail=f"Invalid range for {name}: {spec}")
+        else:
+            raise HTTPException(status_code=400, detail=f"Search space for {name} must be a list or a low/high range")
+
+
+def halving_schedule(n_candidates: int, min_resource: int, max_resource: int, eta: int) -> List[tuple]:
+    """(configs, resource) per rung of one successive halving bracket, ending at max_resource"""
+    rungs = 1
+    while (rungs < 32 and n_candidates // eta ** rungs >= 1
+           and max_resource / eta ** rungs >= min_resource):
+        rungs += 1
+    return [
+        (max(1, n_candidates // eta ** rung), max(1, int(max_resource / eta ** (rungs - 1 - rung))))
+        for rung in range(rungs)
+    ]
+
+
+def hyperband_brackets(min_resource: int, max_resource: int, eta: int) -> List[List[tuple]]:
+    """Hyperband: from many configs on a small resource down to a few on the full resource"""
+    s_max = 0
+    while max_resource / eta ** (s_max + 1) >= min_resource:
+        s_max += 1
+    brackets = []
+    for s in range(s_max, -1, -1):
+        n_candidates = int(np.ceil((s_max + 1) / (s + 1) * eta ** s))
+        brackets.append(halving_schedule(n_candidates, int(max_resource / eta ** s), max_resource, eta))
+    return brackets
+
+
+def _tune_trial(views: Dict[str, np.ndarray], model_type: str, params: Dict[str, Any],
+                n_rows: int, n_threads: int, early_stopping_rounds: int):
+    """Fit one config on the first n_rows of the tuning rows and score it on the validation rows"""
+    started = time.perf_counter()
+    X_fit, y_fit = views["X_fit"][:n_rows], views["y_fit"][:n_rows]
+    X_val, y_val = views["X_val"], views["y_val"]
+    model = load_model_class(model_type)(**thread_limited_params(model_type, params, n_threads))
+    
+    # Boosters stop on their own held-out rows, so the validation score stays unbiased;
+    # the tree count reached is kept for the final fit
+    estimators = None
+    if early_stopping_rounds:
+        X_stop, y_stop = views["X_stop"], views["y_stop"]
+    if early_stopping_rounds and model_type == "xgboost":
+        model.set_params(early_stopping_rounds=early_stopping_rounds)
+        model.fit(X_fit, y_fit, eval_set=[(X_stop, y_stop)], verbose=False)
+        estimators = int(model.best_iteration) + 1
+    elif early_stopping_rounds and model_type == "lightgbm":
+        lightgbm = importlib.import_module("lightgbm")
+        model.fit(X_fit, y_fit, eval_set=[(X_stop, y_stop)],
+                  callbacks=[lightgbm.early_stopping(early_stopping_rounds, verbose=False)])
+        estimators = int(model.best_iteration_) or None
+    elif early_stopping_rounds and model_type == "catboost":
+        model.fit(X_fit, y_fit, eval_set=(X_stop, y_stop), early_stopping_rounds=early_stopping_rounds, verbose=False)
+        estimators = int(model.get_best_iteration()) + 1
+    else:
+        model.fit(X_fit, y_fit)
+    
+    return {
+        "metrics": holdout_metrics(y_val, model.predict(X_val)),
+        "estimators": estimators,
+        "fit_time": time.perf_counter() - started
+    }
+
+
+def run_tuning(request, X_fit, y_fit, X_val, y_val, deadline: float, cores: int):
+    """Generator of trial and rung events for a halving or Hyperband search, then the winner.
+
+    request is the /tune TuneRequest. Every trial runs in its own process so the
+    search stops exactly at the deadline; the last event is
+    {"event": "searched", "best": trial or None}. cores caps concurrent trials
+    and is split between them. Early-stopped boosters keep max_estimators as
+    they are promoted; the trees a trial used are reported as its "estimators"
+    and only the winner's params carry that count into the final fit.
+    """
+    space = request.search_space or SEARCH_SPACES.get(request.model_type, {})
+    base_params = AVAILABLE_MODELS[request.model_type]["params"].copy()
+    if request.custom_params:
+        base_params.update(request.custom_params)
+    
+    count_param = ESTIMATOR_COUNT_PARAMS.get(request.model_type, "n_estimators")
+    early_stopping_rounds = request.early_stopping_rounds if request.model_type in EARLY_STOPPING_MODELS else 0
+    arrays = {}
+    if early_stopping_rounds:
+        base_params[count_param] = request.max_estimators
+        X_fit, X_stop, y_fit, y_stop = train_test_split(
+            X_fit, y_fit, test_size=request.validation_size, random_state=request.seed, stratify=y_fit
+        )
+        arrays.update({"X_stop": X_stop, "y_stop": np.asarray(y_stop)})
+    
+    if request.resource == "rows":
+        max_resource = len(y_fit)
+        min_resource = request.min_resource or min(max_resource, max(100, 20 * len(np.unique(y_fit))))
+    else:
+        max_resource = request.max_estimators
+        min_resource = request.min_resource or max(1, max_resource // request.eta ** 3)
+    min_resource = max(1, min(min_resource, max_resource))
+    
+    if request.method == "hyperband":
+        brackets = hyperband_brackets(min_resource, max_resource, request.eta)
+    else:
+        brackets = [halving_schedule(request.n_candidates, min_resource, max_resource, request.eta)]
+    
+    rng = np.random.default_rng(request.seed)
+    arrays.update({"X_fit": X_fit, "y_fit": np.asarray(y_fit), "X_val": X_val, "y_val": np.asarray(y_val)})
+    max_workers = min(request.max_workers or cores, cores)
+    trials = []
+    
+    for bracket, schedule in enumerate(brackets):
+        candidates = [{**base_params, **sample_params(space, rng)} for _ in range(schedule[0][0])]
+        for rung, (n_configs, resource) in enumerate(schedule):
+            candidates = candidates[:n_configs]
+            workers = max(1, min(max_workers, len(candidates)))
+            n_threads = max(1, cores // workers)
+            
+            tasks = []
+            for params in candidates:
+                if request.resource == "estimators":
+                    params = {**params, count_param: resource}
+                n_rows = resource if request.resource == "rows" else len(y_fit)
+                tasks.append((_tune_trial, (request.model_type, params, n_rows, n_threads, early_stopping_rounds)))
+            
+            finished = []
+            for position, result in run_in_processes(tasks, arrays, workers, deadline=deadline):
+                trial = {
+                    "trial": len(trials),
+                    "bracket": bracket,
+                    "rung": rung,
+                    "resource": resource,
+                    "params": tasks[position][1][1],
+                    **result
+                }
+                if "error" not in result:
+                    trial["score"] = result["metrics"][request.metric]
+                    finished.append(trial)
+                trials.append(trial)
+                yield {"event": "trial", **trial}
+            
+            # Promote the best 1/eta of this rung to the next, larger resource
+            finished.sort(key=lambda t: t["score"], reverse=True)
+            candidates = [t["params"] for t in finished]
+            yield {
+                "event": "rung",
+                "bracket": bracket,
+                "rung": rung,
+                "resource": resource,
+                "scored": len(finished),
+                "best_score": finished[0]["score"] if finished else None
+            }
+            if time.monotonic() >= deadline or not candidates:
+                break
+        if time.monotonic() >= deadline:
+            break
+    
+    # The winner is the best config among those evaluated on the largest resource reached
+    scored = [t for t in trials if "score" in t]
+    best = max(scored, key=lambda t: (t["resource"], t["score"])) if scored else None
+    if best and best["estimators"]:
+        best = {**best, "params": {**best["params"], count_param: best["estimators"]}}
+    yield {"event": "searched", "trials": len(trials), "timed_out": time.monotonic() >= deadline, "best": best}